@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark the serial and concurrent cdc data files discovery of
+:meth:`rds_to_datalake.incremental_load_orchestration.CDCTracker.prepare_glue_job_input`
+against a moto S3 stand-in.
+
+Moto runs in process, so we add an artificial latency to each ``ListObjectsV2``
+call to simulate the S3 round trip. It also compares the number of
+``ListObjectsV2`` calls of a repeated tick with and without the listing index.
+
+Usage::
+
+    python -m benchmarks.bench_cdc_discovery
+"""
+
+import typing as T
+import time
+from datetime import datetime, timedelta, timezone
+
+import moto
+from s3pathlib import S3Path
+from boto_session_manager import BotoSesManager
+
+from rds_to_datalake.incremental_load_orchestration import (
+    datetime_to_s3_key,
+    TableTracker,
+    CDCTracker,
+)
+
+n_tables = 50
+n_files_per_table = 2000
+list_latency = 0.03  # seconds per ListObjectsV2 call
+max_workers = 16
+
+bucket = "my-bucket"
+epoch = datetime(2023, 1, 1, tzinfo=timezone.utc)
+table_list = [f"table_{str(ith).zfill(3)}" for ith in range(1, 1 + n_tables)]
+
+
+def create_test_data(bsm: BotoSesManager, s3dir_dms_output_database: S3Path):
+    for table in table_list:
+        s3dir_table = s3dir_dms_output_database.joinpath("public", table)
+        for ith in range(1, 1 + n_files_per_table):
+            key = datetime_to_s3_key(epoch + timedelta(seconds=ith))
+            bsm.s3_client.put_object(
+                Bucket=bucket,
+                Key=f"{s3dir_table.key}/{key}.parquet",
+                Body=b"",
+            )
+
+
+def new_cdc_tracker(
+    s3dir_dms_output_database: S3Path,
+    s3path_listing_index: T.Optional[S3Path] = None,
+) -> CDCTracker:
+    return CDCTracker(
+        s3path_tracker=S3Path(f"s3://{bucket}/tracker.json"),
+        s3dir_glue_job_input=S3Path(f"s3://{bucket}/glue_job_input/").to_dir(),
+        s3dir_dms_output_database=s3dir_dms_output_database,
+        glue_job_name="my-glue-job",
+        s3path_listing_index=s3path_listing_index,
+        table_tracker_list=[
+            TableTracker(
+                table=table,
+                epoch_processed_time_str=epoch.isoformat(),
+                last_processed_time_str=epoch.isoformat(),
+            )
+            for table in table_list
+        ],
+        last_glue_job_run_sequence_id=0,
+    )
+
+
+def main():
+    with moto.mock_aws():
+        bsm = BotoSesManager(region_name="us-east-1")
+        bsm.s3_client.create_bucket(Bucket=bucket)
+        s3dir_dms_output_database = S3Path(f"s3://{bucket}/dms/").to_dir()
+        print(f"create {n_tables} x {n_files_per_table} cdc data files ...")
+        create_test_data(bsm, s3dir_dms_output_database)
+
+        n_list_calls = [0]
+
+        def before_list(**kwargs):
+            n_list_calls[0] += 1
+            time.sleep(list_latency)
+
+        bsm.s3_client.meta.events.register(
+            "before-call.s3.ListObjectsV2",
+            before_list,
+        )
+
+        results = dict()
+        for workers in [1, max_workers]:
+            cdc_tracker = new_cdc_tracker(s3dir_dms_output_database)
+            start = time.perf_counter()
+            glue_job_input = cdc_tracker.prepare_glue_job_input(
+                bsm=bsm,
+                max_workers=workers,
+            )
+            elapsed = time.perf_counter() - start
+            results[workers] = glue_job_input
+            print(f"max_workers = {workers:>2}, elapsed = {elapsed:.3f} seconds")
+
+        assert results[1] == results[max_workers]
+        print("serial and concurrent discovery produce the same glue job input")
+
+        s3path_listing_index = S3Path(f"s3://{bucket}/listing_index.json")
+        for listing_index in [None, s3path_listing_index]:
+            cdc_tracker = new_cdc_tracker(
+                s3dir_dms_output_database,
+                s3path_listing_index=listing_index,
+            )
+            cdc_tracker.prepare_glue_job_input(bsm=bsm, max_workers=max_workers)
+            n_list_calls[0] = 0
+            start = time.perf_counter()
+            cdc_tracker.prepare_glue_job_input(bsm=bsm, max_workers=max_workers)
+            elapsed = time.perf_counter() - start
+            print(
+                f"repeated tick, listing index = {listing_index is not None}, "
+                f"list calls = {n_list_calls[0]}, elapsed = {elapsed:.3f} seconds"
+            )
+
+
+if __name__ == "__main__":
+    main()
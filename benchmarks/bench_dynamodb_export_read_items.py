@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark the serial and concurrent
+:meth:`rds_to_datalake.vendor.aws_dynamodb_export_to_s3.Export.read_items`
+against a moto S3 stand-in.
+
+Moto runs in process, so we add an artificial latency to each ``GetObject``
+call to simulate the S3 round trip.
+
+Usage::
+
+    python -m benchmarks.bench_dynamodb_export_read_items
+"""
+
+import time
+import json
+import gzip
+import base64
+import hashlib
+import random
+
+import moto
+from boto_session_manager import BotoSesManager
+
+from rds_to_datalake.vendor.dynamodb_json import ItemDecoder
+from rds_to_datalake.vendor.aws_dynamodb_export_to_s3 import Export
+
+n_files = 40
+n_items_per_file = 5000
+get_latency = 0.2  # seconds per GetObject call
+
+bucket = "my-bucket"
+
+decoder = ItemDecoder(
+    schema={"account": "S", "amount": "N", "is_credit": "N", "note": "S"}
+)
+
+
+def create_export(bsm: BotoSesManager) -> Export:
+    export = Export(
+        arn="arn:aws:dynamodb:us-east-1:111122223333:table/my-table/export/1672531200000-a1b2c3d4",
+        status="COMPLETED",
+        s3_bucket=bucket,
+        s3_prefix="exports",
+    )
+    prefix = f"exports/AWSDynamoDB/{export.export_short_id}"
+    rnd = random.Random(1)
+    manifest_lines = list()
+    for ith in range(n_files):
+        lines = [
+            json.dumps(
+                {
+                    "Item": {
+                        "account": {"S": str(rnd.randint(1, 10**9))},
+                        "amount": {"N": str(rnd.randint(1, 10000))},
+                        "is_credit": {"N": str(rnd.randint(0, 1))},
+                        "note": {"S": "x" * rnd.randint(10, 100)},
+                    }
+                }
+            )
+            for _ in range(n_items_per_file)
+        ]
+        body = gzip.compress("\n".join(lines).encode("utf-8"))
+        key = f"{prefix}/data/{ith}.json.gz"
+        bsm.s3_client.put_object(Bucket=bucket, Key=key, Body=body)
+        manifest_lines.append(
+            json.dumps(
+                {
+                    "itemCount": n_items_per_file,
+                    "md5Checksum": base64.b64encode(hashlib.md5(body).digest()).decode(
+                        "utf-8"
+                    ),
+                    "etag": hashlib.md5(body).hexdigest(),
+                    "dataFileS3Key": key,
+                }
+            )
+        )
+    bsm.s3_client.put_object(
+        Bucket=bucket,
+        Key=f"{prefix}/manifest-files.json",
+        Body="\n".join(manifest_lines),
+    )
+    return export
+
+
+def main():
+    with moto.mock_aws():
+        bsm = BotoSesManager(region_name="us-east-1")
+        bsm.s3_client.create_bucket(Bucket=bucket)
+        print(f"create {n_files} x {n_items_per_file} items export ...")
+        export = create_export(bsm)
+
+        def add_latency(**kwargs):
+            time.sleep(get_latency)
+
+        bsm.s3_client.meta.events.register("before-call.s3.GetObject", add_latency)
+
+        n_items = n_files * n_items_per_file
+        for max_workers in [1, 4, 16]:
+            for verify in [False, True]:
+                start = time.perf_counter()
+                count = 0
+                for _ in export.read_items(
+                    dynamodb_client=None,
+                    s3_client=bsm.s3_client,
+                    decoder=decoder,
+                    max_workers=max_workers,
+                    verify=verify,
+                ):
+                    count += 1
+                assert count == n_items
+                elapsed = time.perf_counter() - start
+                print(
+                    f"max_workers = {max_workers:>2}, verify = {verify!s:>5}: "
+                    f"{elapsed:.2f} sec, {n_items / elapsed:,.0f} items/s"
+                )
+
+
+if __name__ == "__main__":
+    main()
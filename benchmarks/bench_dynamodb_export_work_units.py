@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+"""
+Simulate the makespan (the time of the slowest worker) of the DynamoDB export
+to s3 post processor, with the legacy fixed chunks of 100 files and with
+:func:`rds_to_datalake.vendor.aws_dynamodb_export_to_s3.plan_work_units`,
+on a skewed export. The worker time is proportional to the item count.
+
+Usage::
+
+    python -m benchmarks.bench_dynamodb_export_work_units
+"""
+
+import random
+
+from rds_to_datalake.vendor.aws_dynamodb_export_to_s3 import (
+    DataFile,
+    plan_work_units,
+)
+
+n_files = 2000
+items_per_second = 30000  # per worker
+
+max_items_per_work_unit = 1_000_000
+
+
+def main():
+    rnd = random.Random(1)
+    data_file_list = [
+        DataFile(
+            # pareto distribution, a few files are much bigger than others
+            item_count=int(rnd.paretovariate(1.5) * 2000),
+            md5="",
+            etag="",
+            s3_bucket="my-bucket",
+            s3_key=f"data/{str(ith).zfill(6)}.json.gz",
+        )
+        for ith in range(n_files)
+    ]
+    total = sum([data_file.item_count for data_file in data_file_list])
+    print(f"{n_files} data files, {total} items")
+
+    chunks = [
+        sum([data_file.item_count for data_file in data_file_list[i : i + 100]])
+        for i in range(0, n_files, 100)
+    ]
+    print(
+        f"fixed 100 files chunks: {len(chunks)} workers, "
+        f"makespan {max(chunks) / items_per_second:.1f} sec, "
+        f"mean {sum(chunks) / len(chunks) / items_per_second:.1f} sec"
+    )
+
+    for max_items in [max_items_per_work_unit, max_items_per_work_unit // 4]:
+        work_unit_list = plan_work_units(
+            data_file_list,
+            max_weight_per_unit=max_items,
+        )
+        weights = [work_unit.weight for work_unit in work_unit_list]
+        print(
+            f"bin-packed, max {max_items} items: {len(weights)} workers, "
+            f"makespan {max(weights) / items_per_second:.1f} sec, "
+            f"mean {sum(weights) / len(weights) / items_per_second:.1f} sec"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark the throughput (rows/s) and the peak RSS of the dynamodb export to
+s3 post processor worker lambda function against local fixture files.
+
+It compares the legacy implementation, which loads all data files into memory,
+with the streaming implementation in the json and parquet output mode. Each
+implementation runs in a fresh process, so the peak RSS are comparable.
+
+Usage::
+
+    python -m benchmarks.bench_dynamodb_export_worker
+"""
+
+import os
+import json
+import gzip
+import time
+import random
+import resource
+import tempfile
+import multiprocessing
+from pathlib import Path
+
+n_files = 20
+n_items_per_file = 20000
+
+bucket = "my-bucket"
+prefix = "dynamodb_export"
+dir_fixture = Path(tempfile.gettempdir()).joinpath("bench_dynamodb_export_worker")
+
+
+def create_fixture_files():
+    """
+    Create the fixture ``.json.gz`` files in DynamoDB export format once.
+    """
+    dir_fixture.mkdir(parents=True, exist_ok=True)
+    rnd = random.Random(1)
+    for ith in range(1, 1 + n_files):
+        path = dir_fixture.joinpath(f"{str(ith).zfill(6)}.json.gz")
+        if path.exists():
+            continue
+        lines = list()
+        for _ in range(n_items_per_file):
+            item = {
+                "account": {"S": f"{rnd.randint(1, 10**9)}"},
+                "create_at": {"S": "2023-01-01T00:00:00.000000"},
+                "update_at": {"S": "2023-01-01T00:00:00.000000"},
+                "entity": {"S": f"entity-{rnd.randint(1, 1000)}"},
+                "amount": {"N": str(rnd.randint(1, 10000))},
+                "is_credit": {"N": str(rnd.randint(0, 1))},
+                "note": {"S": "x" * rnd.randint(10, 100)},
+            }
+            lines.append(json.dumps({"Item": item}))
+        path.write_bytes(gzip.compress("\n".join(lines).encode("utf-8")))
+
+
+def legacy_lambda_handler(s3_client, event):
+    """
+    The original implementation, loads everything into memory.
+    """
+    lines = list()
+    for key in event["key_list"]:
+        res = s3_client.get_object(Bucket=event["bucket"], Key=key)
+        items = [
+            json.loads(line)
+            for line in (
+                gzip.decompress(res["Body"].read()).decode("utf-8").splitlines()
+            )
+        ]
+        for item in items:
+            row = dict(
+                account=item["Item"]["account"]["S"],
+                create_at=item["Item"]["create_at"]["S"],
+                update_at=item["Item"]["update_at"]["S"],
+                entity=item["Item"]["entity"]["S"],
+                amount=int(item["Item"]["amount"]["N"]),
+                is_credit=int(item["Item"]["is_credit"]["N"]),
+                note=item["Item"]["note"]["S"],
+            )
+            lines.append(json.dumps(row))
+    key = f"{event['dynamodb_export_processed_prefix']}/{str(event['ith']).zfill(6)}.json.gz"
+    s3_client.put_object(
+        Bucket=event["bucket"],
+        Key=key,
+        Body=gzip.compress("\n".join(lines).encode("utf-8")),
+    )
+
+
+def run(mode: str, queue: multiprocessing.Queue):
+    import moto
+
+    with moto.mock_aws():
+        os.environ["AWS_DEFAULT_REGION"] = "us-east-1"
+        os.environ["OUTPUT_FORMAT"] = "parquet" if mode == "parquet" else "json"
+
+        from lambda_functions import (
+            dynamodb_export_to_s3_post_processor_worker as worker,
+        )
+
+        s3_client = worker.s3_client
+        s3_client.create_bucket(Bucket=bucket)
+        key_list = list()
+        for path in sorted(dir_fixture.glob("*.json.gz")):
+            key = f"{prefix}/data/{path.name}"
+            s3_client.put_object(Bucket=bucket, Key=key, Body=path.read_bytes())
+            key_list.append(key)
+        event = {
+            "ith": 1,
+            "bucket": bucket,
+            "key_list": key_list,
+            "dynamodb_export_processed_prefix": f"{prefix}/processed",
+        }
+
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = time.perf_counter()
+        if mode == "legacy":
+            legacy_lambda_handler(s3_client, event)
+        else:
+            worker.lambda_handler(event, None)
+        elapsed = time.perf_counter() - start
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((elapsed, rss_before, rss_after))
+
+
+def main():
+    create_fixture_files()
+    n_rows = n_files * n_items_per_file
+    print(f"{n_files} files x {n_items_per_file} items = {n_rows} rows")
+    ctx = multiprocessing.get_context("spawn")
+    for mode in ["legacy", "json", "parquet"]:
+        queue = ctx.Queue()
+        process = ctx.Process(target=run, args=(mode, queue))
+        process.start()
+        elapsed, rss_before, rss_after = queue.get()
+        process.join()
+        # ru_maxrss is in KB on linux
+        print(
+            f"{mode:>8}: {elapsed:.2f} sec, {n_rows / elapsed:,.0f} rows/s, "
+            f"peak RSS {rss_after / 1024:.0f} MB "
+            f"(+{(rss_after - rss_before) / 1024:.0f} MB while processing)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+"""
+Micro benchmark of decoding DynamoDB json items with
+:class:`rds_to_datalake.vendor.dynamodb_json.ItemDecoder` and
+:class:`boto3.dynamodb.types.TypeDeserializer`.
+
+Usage::
+
+    python -m benchmarks.bench_dynamodb_json
+"""
+
+import time
+import random
+
+from boto3.dynamodb.types import TypeDeserializer
+
+from rds_to_datalake.vendor.dynamodb_json import decode_item, ItemDecoder
+
+n_items = 1_000_000
+
+schema = {
+    "account": "S",
+    "create_at": "S",
+    "update_at": "S",
+    "entity": "S",
+    "amount": "N",
+    "is_credit": "N",
+    "note": "S",
+}
+
+
+def create_items():
+    rnd = random.Random(1)
+    return [
+        {
+            "account": {"S": f"{rnd.randint(1, 10**9)}"},
+            "create_at": {"S": "2023-01-01T00:00:00.000000"},
+            "update_at": {"S": "2023-01-01T00:00:00.000000"},
+            "entity": {"S": f"entity-{rnd.randint(1, 1000)}"},
+            "amount": {"N": str(rnd.randint(1, 10000))},
+            "is_credit": {"N": str(rnd.randint(0, 1))},
+            "note": {"S": "hello"},
+        }
+        for _ in range(n_items)
+    ]
+
+
+def timeit(title: str, func, items):
+    start = time.perf_counter()
+    func(items)
+    elapsed = time.perf_counter() - start
+    print(f"{title:>28}: {elapsed:.2f} sec, {n_items / elapsed:,.0f} items/s")
+
+
+def main():
+    items = create_items()
+    deserializer = TypeDeserializer()
+    decoder = ItemDecoder(schema=schema)
+
+    def type_deserializer(items):
+        return [
+            {k: deserializer.deserialize(v) for k, v in item.items()}
+            for item in items
+        ]
+
+    def schemaless(items):
+        return [decode_item(item) for item in items]
+
+    print(f"decode {n_items} items")
+    timeit("TypeDeserializer", type_deserializer, items)
+    timeit("decode_item (no schema)", schemaless, items)
+    timeit("ItemDecoder.decode_items", decoder.decode_items, items)
+    timeit("ItemDecoder.decode_columns", decoder.decode_columns, items)
+    timeit("ItemDecoder.to_dataframe", decoder.to_dataframe, items)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+"""
+Measure the number of files and the bytes per file written by the DynamoDB
+stream consumer lambda function in the json and parquet output mode, before
+and after the compaction, against a moto S3 stand-in.
+
+Usage::
+
+    python -m benchmarks.bench_dynamodb_stream_consumer
+"""
+
+import io
+import os
+import random
+import contextlib
+from datetime import datetime, timedelta, timezone
+
+import moto
+
+n_invocations = 300
+n_records_per_invocation = 100
+n_minutes = 10
+
+bucket = "my-bucket"
+epoch = datetime(2023, 1, 1, tzinfo=timezone.utc)
+
+
+def create_events():
+    rnd = random.Random(1)
+    events = list()
+    for ith in range(n_invocations):
+        # records of one invocation are close in time
+        start = epoch + timedelta(seconds=ith * n_minutes * 60 / n_invocations)
+        records = list()
+        for _ in range(n_records_per_invocation):
+            update_at = start + timedelta(seconds=rnd.randint(0, 10))
+            records.append(
+                {
+                    "eventName": "INSERT",
+                    "dynamodb": {
+                        "NewImage": {
+                            "account": {"S": str(rnd.randint(1, 10**9))},
+                            "create_at": {"S": update_at.isoformat()},
+                            "update_at": {
+                                "S": update_at.strftime("%Y-%m-%dT%H:%M:%S.%f%z")
+                            },
+                            "entity": {"S": f"entity-{rnd.randint(1, 1000)}"},
+                            "amount": {"N": str(rnd.randint(1, 10000))},
+                            "is_credit": {"N": str(rnd.randint(0, 1))},
+                            "note": {"S": "x" * rnd.randint(10, 100)},
+                        }
+                    },
+                }
+            )
+        events.append({"Records": records})
+    return events
+
+
+def report(title: str, s3_client, prefix: str):
+    sizes = list()
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for res in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for dct in res.get("Contents", []):
+            sizes.append(dct["Size"])
+    print(
+        f"{title:>28}: {len(sizes):>4} files, {sum(sizes):>9,} bytes, "
+        f"{sum(sizes) / len(sizes):>9,.0f} bytes per file"
+    )
+
+
+def main():
+    with moto.mock_aws():
+        os.environ["AWS_REGION"] = "us-east-1"
+        os.environ["AWS_DEFAULT_REGION"] = "us-east-1"
+        os.environ["S3_BUCKET"] = bucket
+        os.environ["S3_PREFIX"] = "dynamodb_stream"
+
+        from lambda_functions import dynamodb_stream_consumer as consumer
+
+        s3_client = consumer.s3_client
+        s3_client.create_bucket(Bucket=bucket)
+        events = create_events()
+        print(
+            f"{n_invocations} invocations x {n_records_per_invocation} records "
+            f"over {n_minutes} minutes"
+        )
+        for output_format in ["json", "parquet"]:
+            consumer.S3_PREFIX = f"dynamodb_stream_{output_format}"
+            consumer.OUTPUT_FORMAT = output_format
+            # the lambda function prints a line per file
+            with contextlib.redirect_stdout(io.StringIO()):
+                for event in events:
+                    consumer.lambda_handler(event, None)
+            report(output_format, s3_client, consumer.S3_PREFIX)
+            with contextlib.redirect_stdout(io.StringIO()):
+                consumer.compact(now=epoch + timedelta(minutes=n_minutes + 10))
+            report(f"{output_format} + compaction", s3_client, consumer.S3_PREFIX)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+"""
+Compare the legacy latest-version dedup of ``glue_jobs/incremental.py``
+(``row_number()`` over a window partitioned by id, then a global sort by
+update_at) with the single aggregation ``dedup_latest_version``, in a local
+pyspark session. It checks that both produce the same rows on a fixture of
+cdc rows with many versions per id, and reports the wall time and the number
+of stages. The glue script can't be imported outside of Glue, the two
+versions are replicated here.
+
+Requires ``pip install pyspark`` and java.
+
+Usage::
+
+    python -m benchmarks.bench_glue_dedup
+"""
+
+import time
+import random
+import tempfile
+from pathlib import Path
+
+from pyspark.sql import SparkSession
+from pyspark.sql import functions as F
+from pyspark.sql.window import Window
+
+n_rows = 1000000
+n_ids = 200000
+
+
+def create_cdc_files(spark, dir_input: Path):
+    rnd = random.Random(1)
+    # update_at is unique, so the latest version of each id is well defined
+    rows = [
+        (
+            rnd.choice("IU"),
+            f"t-{str(rnd.randrange(n_ids)).zfill(9)}",
+            "2023-01-01T00:00:00",
+            f"2023-02-01T00:00:00.{str(ith).zfill(7)}",
+            rnd.randint(1, 1000),
+            "x" * 50,
+        )
+        for ith in rnd.sample(range(n_rows), n_rows)
+    ]
+    df = spark.createDataFrame(
+        rows, ["Op", "id", "create_at", "update_at", "amount", "note"]
+    )
+    df.repartition(16).write.parquet(str(dir_input))
+
+
+def legacy(pdf):
+    pdf_1 = pdf.withColumn(
+        "row_number",
+        F.row_number().over(
+            Window.partitionBy("id").orderBy(F.col("update_at").desc())
+        ),
+    )
+    return (
+        pdf_1.filter(pdf_1.row_number == 1)
+        .drop("row_number")
+        .sort(pdf_1.update_at.desc())
+    )
+
+
+def dedup_latest_version(pdf):
+    latest = F.max(
+        F.struct(
+            F.col("update_at"),
+            F.struct(*[F.col(column) for column in pdf.columns]).alias("row"),
+        )
+    ).alias("latest")
+    return pdf.groupBy("id").agg(latest).select("latest.row.*")
+
+
+def main():
+    spark = (
+        SparkSession.builder.master("local[4]")
+        .config("spark.sql.shuffle.partitions", "16")
+        .config("spark.ui.showConsoleProgress", "false")
+        .getOrCreate()
+    )
+    spark.sparkContext.setLogLevel("ERROR")
+    tracker = spark.sparkContext.statusTracker()
+    with tempfile.TemporaryDirectory() as dir_tmp:
+        dir_tmp = Path(dir_tmp)
+        dir_input = dir_tmp.joinpath("input")
+        print(f"create {n_rows} cdc rows of {n_ids} ids ...")
+        create_cdc_files(spark, dir_input)
+        pdf = spark.read.parquet(str(dir_input))
+        for name, func in [
+            ("legacy", legacy),
+            ("aggregate", dedup_latest_version),
+        ]:
+            spark.sparkContext.setJobGroup(name, name)
+            start = time.perf_counter()
+            func(pdf).write.parquet(str(dir_tmp.joinpath(name)))
+            elapsed = time.perf_counter() - start
+            n_stage = 0
+            for job_id in tracker.getJobIdsForGroup(name):
+                n_stage += len(tracker.getJobInfo(job_id).stageIds)
+            print(f"{name:>9}: {elapsed:.2f} sec, {n_stage} stages")
+
+        df_legacy = spark.read.parquet(str(dir_tmp.joinpath("legacy")))
+        df_aggregate = spark.read.parquet(str(dir_tmp.joinpath("aggregate")))
+        n_diff = (
+            df_legacy.exceptAll(df_aggregate).count()
+            + df_aggregate.exceptAll(df_legacy).count()
+        )
+        print(f"{df_legacy.count()} rows, {n_diff} different rows")
+        assert n_diff == 0
+    spark.stop()
+
+
+if __name__ == "__main__":
+    main()
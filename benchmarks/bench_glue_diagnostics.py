@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+
+"""
+Compare the number of spark jobs and stages of the incremental glue job
+transform (``glue_jobs/incremental.py``) with the legacy diagnostics (schema,
+``show(3)`` and ``count()`` of each intermediate dataframe) and with the
+``DIAGNOSTICS`` levels off, sampled and full, in a local pyspark session. The
+glue script can't be imported outside of Glue, the transform is replicated
+here, the hudi write is replaced by a parquet write.
+
+Requires ``pip install pyspark`` and java.
+
+Usage::
+
+    python -m benchmarks.bench_glue_diagnostics
+"""
+
+import time
+import random
+import tempfile
+import contextlib
+from pathlib import Path
+
+from pyspark.sql import SparkSession
+from pyspark.sql import functions as F
+from pyspark.sql.window import Window
+
+n_rows = 1000000
+n_ids = 200000
+
+
+def create_cdc_files(spark, dir_input: Path):
+    rnd = random.Random(1)
+    rows = [
+        (
+            rnd.choice("IU"),
+            f"t-{str(rnd.randrange(n_ids)).zfill(9)}",
+            f"2023-01-0{rnd.randint(1, 9)}T0{rnd.randint(0, 9)}:00:00",
+            f"2023-02-01T00:00:{str(ith % 60).zfill(2)}.{str(ith).zfill(7)}",
+            "x" * 50,
+        )
+        for ith in range(n_rows)
+    ]
+    df = spark.createDataFrame(rows, ["Op", "id", "create_at", "update_at", "note"])
+    df.repartition(16).write.parquet(str(dir_input))
+
+
+def show_df(pdf, n: int = 3):
+    pdf.show(n, vertical=True, truncate=False)
+
+
+def transform(spark, dir_input: Path, dir_output: Path, level: str):
+    """
+    :param level: "legacy", "off", "sampled" or "full".
+    """
+
+    def show_df_details(pdf, name: str):
+        if level == "off":
+            return
+        pdf.printSchema()
+        show_df(pdf)
+        if level == "legacy":
+            print(f"{name}.count() = {pdf.count()}")
+
+    pdf_incremental = spark.read.parquet(str(dir_input))
+    show_df_details(pdf_incremental, "pdf_incremental")
+    pdf_incremental_1 = pdf_incremental.withColumn(
+        "row_number",
+        F.row_number().over(
+            Window.partitionBy("id").orderBy(F.col("update_at").desc())
+        ),
+    )
+    if level == "full":
+        pdf_incremental_1 = pdf_incremental_1.withColumn(
+            "n_version",
+            F.count(F.lit(1)).over(Window.partitionBy("id")),
+        )
+    pdf_incremental_2 = (
+        pdf_incremental_1.filter(pdf_incremental_1.row_number == 1)
+        .drop("row_number")
+        .sort(pdf_incremental_1.update_at.desc())
+    )
+    if level == "full":
+        pdf_persisted = pdf_incremental_2.persist()
+        row = pdf_persisted.agg(
+            F.count(F.lit(1)).alias("n_dedup"),
+            F.sum("n_version").alias("n_input"),
+        ).collect()[0]
+        print(f"n_input = {row['n_input']}, n_dedup = {row['n_dedup']}")
+        pdf_incremental_2 = pdf_persisted.drop("n_version")
+    show_df_details(pdf_incremental_2, "pdf_incremental_2")
+    pdf_incremental_3 = (
+        pdf_incremental_2.withColumn(
+            "create_year", F.substring(pdf_incremental_2.create_at, 1, 4)
+        )
+        .withColumn("create_month", F.substring(pdf_incremental_2.create_at, 6, 2))
+        .withColumn("create_day", F.substring(pdf_incremental_2.create_at, 9, 2))
+        .drop("Op")
+    )
+    show_df_details(pdf_incremental_3, "pdf_incremental_3")
+    pdf_incremental_3.write.mode("overwrite").partitionBy(
+        "create_year", "create_month", "create_day"
+    ).parquet(str(dir_output))
+    if level == "full":
+        pdf_persisted.unpersist()
+
+
+def main():
+    spark = (
+        SparkSession.builder.master("local[4]")
+        .config("spark.sql.shuffle.partitions", "16")
+        .config("spark.ui.showConsoleProgress", "false")
+        .getOrCreate()
+    )
+    spark.sparkContext.setLogLevel("ERROR")
+    tracker = spark.sparkContext.statusTracker()
+    with tempfile.TemporaryDirectory() as dir_tmp:
+        dir_tmp = Path(dir_tmp)
+        dir_input = dir_tmp.joinpath("input")
+        print(f"create {n_rows} cdc rows of {n_ids} ids ...")
+        create_cdc_files(spark, dir_input)
+        result_list = list()
+        for level in ["legacy", "off", "sampled", "full"]:
+            spark.sparkContext.setJobGroup(level, level)
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(None):
+                transform(spark, dir_input, dir_tmp.joinpath(level), level)
+            elapsed = time.perf_counter() - start
+            job_ids = tracker.getJobIdsForGroup(level)
+            n_stage = 0
+            for job_id in job_ids:
+                n_stage += len(tracker.getJobInfo(job_id).stageIds)
+            result_list.append((level, elapsed, len(job_ids), n_stage))
+        for level, elapsed, n_job, n_stage in result_list:
+            print(f"{level:>8}: {elapsed:.2f} sec, {n_job} jobs, {n_stage} stages")
+    spark.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+"""
+Compare the number of queries and rows transferred by the hash-range
+reconciliation of :mod:`rds_to_datalake.vendor.merkle_diff` with a full table
+compare, on two SQLite databases with the Athena functions registered, when
+the tables match and when a few rows differ.
+
+Usage::
+
+    python -m benchmarks.bench_merkle_diff
+"""
+
+import time
+
+import sqlalchemy as sa
+
+from rds_to_datalake.vendor.merkle_diff import (
+    register_sqlite_functions,
+    Side,
+    reconcile,
+)
+
+n_rows = 200000
+
+metadata = sa.MetaData()
+table = sa.Table(
+    "transactions",
+    metadata,
+    sa.Column("id", sa.String, primary_key=True),
+    sa.Column("entity", sa.String),
+    sa.Column("amount", sa.Integer),
+    sa.Column("note", sa.String),
+)
+columns = [column.name for column in table.columns]
+
+
+def make_rows():
+    return [
+        {
+            "id": f"t-{str(ith).zfill(9)}",
+            "entity": f"entity-{ith % 97}",
+            "amount": ith % 10000,
+            "note": "x" * 50,
+        }
+        for ith in range(n_rows)
+    ]
+
+
+def create_side(rows) -> Side:
+    engine = sa.create_engine("sqlite:///:memory:")
+    sa.event.listen(
+        engine,
+        "connect",
+        lambda dbapi_conn, _: register_sqlite_functions(dbapi_conn),
+    )
+    metadata.create_all(engine)
+    conn = engine.connect()
+    conn.execute(table.insert(), rows)
+
+    def query(sql: str):
+        return [dict(row) for row in conn.execute(sa.text(sql)).mappings()]
+
+    return Side(query=query, dialect="athena", table="transactions")
+
+
+def main():
+    rows = make_rows()
+    left = create_side(rows)
+    for n_diff in [0, 10]:
+        right_rows = [dict(row) for row in rows]
+        for ith in range(n_diff):
+            right_rows[ith * (n_rows // n_diff)]["amount"] = -1
+        right = create_side(right_rows)
+        left.n_query = 0
+        start = time.perf_counter()
+        report = reconcile(left, right, columns=columns)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{n_diff:>2} changed rows: {report.n_query} queries, "
+            f"{report.n_fetched} rows fetched instead of {n_rows * 2}, "
+            f"{report.n_changed} changed rows found, {elapsed:.2f} sec"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+
+"""
+Compare the legacy positional compare (load both tables into lists and zip)
+with the streaming merge-join and hash-bucket compare of
+:mod:`rds_to_datalake.vendor.table_diff`, on two SQLite databases standing in
+for Postgres (server-side cursor) and Athena (keyset pages). It reports the
+wall time, the peak python memory and whether one missing row is detected.
+
+Usage::
+
+    python -m benchmarks.bench_table_diff
+"""
+
+import time
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+import sqlalchemy as sa
+
+from rds_to_datalake.vendor.table_diff import (
+    iter_sqlalchemy_chunks,
+    iter_keyset_pages,
+    iter_rows,
+    compare_sorted,
+    compare_hash_buckets,
+)
+
+n_rows = 200000
+chunk_size = 10000
+page_size = 50000
+
+metadata = sa.MetaData()
+table = sa.Table(
+    "transactions",
+    metadata,
+    sa.Column("id", sa.String, primary_key=True),
+    sa.Column("account_id", sa.String),
+    sa.Column("entity", sa.String),
+    sa.Column("amount", sa.Integer),
+    sa.Column("note", sa.String),
+)
+
+
+def create_database(path: Path, missing_id: str = None) -> sa.engine.Engine:
+    engine = sa.create_engine(f"sqlite:///{path}")
+    metadata.create_all(engine)
+    with engine.begin() as conn:
+        for start in range(0, n_rows, 50000):
+            rows = [
+                {
+                    "id": f"t-{str(ith).zfill(9)}",
+                    "account_id": f"a-{ith % 1000}",
+                    "entity": f"entity-{ith % 97}",
+                    "amount": ith % 10000,
+                    "note": "x" * 50,
+                }
+                for ith in range(start, min(start + 50000, n_rows))
+            ]
+            rows = [row for row in rows if row["id"] != missing_id]
+            conn.execute(table.insert(), rows)
+    return engine
+
+
+def legacy(rds_engine, dl_engine) -> int:
+    def read(engine):
+        with engine.connect() as conn:
+            stmt = sa.select(table).order_by(table.c.id)
+            return [dict(row) for row in conn.execute(stmt).mappings()]
+
+    rds_rows, dl_rows = read(rds_engine), read(dl_engine)
+    return sum([rds_row != dl_row for rds_row, dl_row in zip(rds_rows, dl_rows)])
+
+
+def iter_dl_rows(dl_engine):
+    def read_page(last_id, limit):
+        stmt = sa.select(table).order_by(table.c.id).limit(limit)
+        if last_id is not None:
+            stmt = stmt.where(table.c.id > last_id)
+        with dl_engine.connect() as conn:
+            return [dict(row) for row in conn.execute(stmt).mappings()]
+
+    return iter_rows(iter_keyset_pages(read_page, key="id", page_size=page_size))
+
+
+def merge(rds_engine, dl_engine) -> int:
+    stmt = sa.select(table).order_by(table.c.id)
+    report = compare_sorted(
+        iter_rows(iter_sqlalchemy_chunks(rds_engine, stmt, chunk_size)),
+        iter_dl_rows(dl_engine),
+    )
+    return report.n_missing + report.n_extra + report.n_changed
+
+
+def hash_bucket(rds_engine, dl_engine) -> int:
+    report = compare_hash_buckets(
+        iter_rows(iter_sqlalchemy_chunks(rds_engine, sa.select(table), chunk_size)),
+        iter_dl_rows(dl_engine),
+    )
+    return report.n_missing + report.n_extra + report.n_changed
+
+
+def main():
+    with tempfile.TemporaryDirectory() as dir_tmp:
+        dir_tmp = Path(dir_tmp)
+        print(f"create two tables of {n_rows} rows, one row is missing ...")
+        rds_engine = create_database(dir_tmp.joinpath("rds.sqlite"))
+        dl_engine = create_database(
+            dir_tmp.joinpath("dl.sqlite"),
+            missing_id=f"t-{str(n_rows // 2).zfill(9)}",
+        )
+        for name, func in [
+            ("legacy", legacy),
+            ("merge", merge),
+            ("hash", hash_bucket),
+        ]:
+            start = time.perf_counter()
+            n_diff = func(rds_engine, dl_engine)
+            elapsed = time.perf_counter() - start
+            # measure the memory in a second run, tracemalloc slows it down
+            tracemalloc.start()
+            func(rds_engine, dl_engine)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(
+                f"{name:>6}: {elapsed:.2f} sec, peak memory {peak / 1024**2:.1f} MB, "
+                f"{n_diff} different rows reported"
+            )
+
+if __name__ == "__main__":
+    main()
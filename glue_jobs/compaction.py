@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+"""
+Compact the MERGE_ON_READ hudi tables of the ``TABLE_NAMES`` job parameter,
+merge the log files appended by the incremental glue job into new base files,
+so the read optimized view ``{table}`` catches up and the real time view
+``{table}_rt`` has fewer log files to merge.
+
+It is started by the orchestrator, see
+``rds_to_datalake.incremental_load_orchestration.CDCTracker.try_to_run_glue_job``,
+which pauses the incremental glue job of the tables during the compaction.
+It runs the pending compaction first, e.g. left by a failed run, then
+schedules and runs a new one.
+"""
+
+# standard library
+import sys
+import json
+import time
+import traceback
+
+# third party library
+from s3pathlib import S3Path
+
+# pyspark / AWS Glue stuff
+from pyspark import SparkConf
+from pyspark.sql import SparkSession
+
+from awsglue.utils import getResolvedOptions
+from awsglue.context import GlueContext
+from awsglue.job import Job
+
+# ------------------------------------------------------------------------------
+# create spark session
+# ------------------------------------------------------------------------------
+conf = (
+    SparkConf()
+    .setAppName("MyApp")
+    .setAll(
+        [
+            ("spark.serializer", "org.apache.spark.serializer.KryoSerializer"),
+            ("spark.sql.hive.convertMetastoreParquet", "false"),
+            # the CALL run_compaction procedure
+            (
+                "spark.sql.extensions",
+                "org.apache.spark.sql.hudi.HoodieSparkSessionExtension",
+            ),
+        ]
+    )
+)
+spark_ses = SparkSession.builder.config(conf=conf).enableHiveSupport().getOrCreate()
+spark_ctx = spark_ses.sparkContext
+glue_ctx = GlueContext(spark_ctx)
+
+# ------------------------------------------------------------------------------
+# resolve job parameters
+# ------------------------------------------------------------------------------
+print("create spark session")
+args = getResolvedOptions(
+    sys.argv,
+    [
+        "JOB_NAME",
+        "S3URI_DATABASE",
+        "TABLE_NAMES",
+    ],
+)
+job = Job(glue_ctx)
+job.init(args["JOB_NAME"], args)
+
+S3URI_DATABASE = args["S3URI_DATABASE"]
+TABLE_NAMES = [table for table in args["TABLE_NAMES"].split(",") if table]
+print(f"TABLE_NAMES = {TABLE_NAMES}")
+
+s3dir_database = S3Path(S3URI_DATABASE)
+
+
+# ------------------------------------------------------------------------------
+# ETL Logics
+# ------------------------------------------------------------------------------
+def compact_one_table(table: str):
+    s3dir_table = s3dir_database.joinpath(table).to_dir()
+    path = s3dir_table.uri.rstrip("/")
+    print(f"compact {path}")
+    for op in ["run", "schedule", "run"]:
+        print(f"run_compaction(op => {op!r})")
+        spark_ses.sql(f"CALL run_compaction(op => '{op}', path => '{path}')").show(
+            truncate=False
+        )
+
+
+# one table after another, a compaction already uses the whole cluster
+result_list = list()
+for table in TABLE_NAMES:
+    start = time.time()
+    result = {"table": table}
+    try:
+        compact_one_table(table)
+        result["status"] = "succeeded"
+    except Exception as e:
+        traceback.print_exc()
+        result["status"] = "failed"
+        result["error"] = repr(e)
+    result["elapsed"] = round(time.time() - start, 3)
+    result_list.append(result)
+print("run summary:")
+print(json.dumps(result_list, indent=4))
+
+job.commit()
+
+failed_table_list = [
+    result["table"] for result in result_list if result["status"] == "failed"
+]
+if len(failed_table_list):
+    raise RuntimeError(f"failed to compact tables: {failed_table_list}")
@@ -5,6 +5,9 @@ import typing as T
 import sys
 import json
 import dataclasses
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
 
 # third party library
 import boto3
@@ -14,12 +17,18 @@ from s3pathlib import S3Path
 from pyspark import SparkConf
 from pyspark.sql import SparkSession
 from pyspark.sql import functions as F
-from pyspark.sql.window import Window
 
 from awsglue.utils import getResolvedOptions
 from awsglue.context import GlueContext
 from awsglue.job import Job
 
+# shipped with the --extra-py-files job parameter
+from hudi_partition import (
+    default_partition_scheme,
+    add_partition_columns,
+    get_partition_options,
+)
+
 # ------------------------------------------------------------------------------
 # create spark session
 # ------------------------------------------------------------------------------
@@ -31,6 +40,8 @@ conf = (
         [
             ("spark.serializer", "org.apache.spark.serializer.KryoSerializer"),
             ("spark.sql.hive.convertMetastoreParquet", "false"),
+            # each table runs in its own scheduler pool, see run_all_tables
+            ("spark.scheduler.mode", "FAIR"),
         ]
     )
 )
@@ -60,6 +71,73 @@ S3URI_DATABASE = args["S3URI_DATABASE"]
 S3URI_INCREMENTAL_GLUE_JOB_INPUT = args["S3URI_INCREMENTAL_GLUE_JOB_INPUT"]
 DATABASE_NAME = args["DATABASE_NAME"]
 
+# optional job parameters
+# diagnostics level:
+# - off: no extra spark action
+# - sampled: print the schema and the first rows of each intermediate dataframe
+# - full: also report the row counts, the deduplicated dataframe is persisted
+#   and counted in one action, the written rows come from the hudi commit
+#   metadata
+DIAGNOSTICS_OFF = "off"
+DIAGNOSTICS_SAMPLED = "sampled"
+DIAGNOSTICS_FULL = "full"
+DIAGNOSTICS = DIAGNOSTICS_OFF
+if "--DIAGNOSTICS" in sys.argv:
+    DIAGNOSTICS = getResolvedOptions(sys.argv, ["DIAGNOSTICS"])["DIAGNOSTICS"]
+if DIAGNOSTICS not in [DIAGNOSTICS_OFF, DIAGNOSTICS_SAMPLED, DIAGNOSTICS_FULL]:
+    raise ValueError(f"invalid DIAGNOSTICS {DIAGNOSTICS!r}")
+print(f"DIAGNOSTICS = {DIAGNOSTICS}")
+
+# max number of tables processed concurrently
+MAX_TABLE_CONCURRENCY = 4
+if "--MAX_TABLE_CONCURRENCY" in sys.argv:
+    MAX_TABLE_CONCURRENCY = int(
+        getResolvedOptions(sys.argv, ["MAX_TABLE_CONCURRENCY"])["MAX_TABLE_CONCURRENCY"]
+    )
+print(f"MAX_TABLE_CONCURRENCY = {MAX_TABLE_CONCURRENCY}")
+
+# the hudi partition scheme per table, see get_partition_scheme
+DEFAULT_PARTITION_SCHEME = default_partition_scheme
+PARTITION_SCHEME_MAPPER = dict()
+if "--PARTITION_SCHEME_MAPPER" in sys.argv:
+    PARTITION_SCHEME_MAPPER = json.loads(
+        getResolvedOptions(sys.argv, ["PARTITION_SCHEME_MAPPER"])[
+            "PARTITION_SCHEME_MAPPER"
+        ]
+    )
+print(f"PARTITION_SCHEME_MAPPER = {PARTITION_SCHEME_MAPPER}")
+
+# the hudi table type per table, COPY_ON_WRITE or MERGE_ON_READ
+DEFAULT_TABLE_TYPE = "COPY_ON_WRITE"
+TABLE_TYPE_MAPPER = dict()
+if "--TABLE_TYPE_MAPPER" in sys.argv:
+    TABLE_TYPE_MAPPER = json.loads(
+        getResolvedOptions(sys.argv, ["TABLE_TYPE_MAPPER"])["TABLE_TYPE_MAPPER"]
+    )
+print(f"TABLE_TYPE_MAPPER = {TABLE_TYPE_MAPPER}")
+
+# how to keep the latest version of each record
+# - aggregate: one group by id aggregation, see dedup_latest_version
+# - precombine: no dedup in spark, hudi keeps the record with the largest
+#   precombine field (update_at) before the upsert
+DEDUP_MODE_AGGREGATE = "aggregate"
+DEDUP_MODE_PRECOMBINE = "precombine"
+DEDUP_MODE = DEDUP_MODE_AGGREGATE
+if "--DEDUP_MODE" in sys.argv:
+    DEDUP_MODE = getResolvedOptions(sys.argv, ["DEDUP_MODE"])["DEDUP_MODE"]
+if DEDUP_MODE not in [DEDUP_MODE_AGGREGATE, DEDUP_MODE_PRECOMBINE]:
+    raise ValueError(f"invalid DEDUP_MODE {DEDUP_MODE!r}")
+print(f"DEDUP_MODE = {DEDUP_MODE}")
+
+# the DMS change sequence column, e.g. added by a transformation rule with
+# $AR_H_CHANGE_SEQ, it breaks the tie of the same update_at
+DEDUP_SEQUENCE_COLUMN = None
+if "--DEDUP_SEQUENCE_COLUMN" in sys.argv:
+    DEDUP_SEQUENCE_COLUMN = getResolvedOptions(
+        sys.argv, ["DEDUP_SEQUENCE_COLUMN"]
+    )["DEDUP_SEQUENCE_COLUMN"]
+print(f"DEDUP_SEQUENCE_COLUMN = {DEDUP_SEQUENCE_COLUMN}")
+
 # ------------------------------------------------------------------------------
 # create boto3 session
 # ------------------------------------------------------------------------------
@@ -136,10 +214,115 @@ def show_df(pdf, n: int = 3):
 
 
 def show_df_details(pdf, name: str):
+    """
+    Print the schema and the first rows, it doesn't count the rows, that
+    would recompute the whole lineage.
+    """
+    if DIAGNOSTICS == DIAGNOSTICS_OFF:
+        return
     print(name)
     pdf.printSchema()
     show_df(pdf)
-    print(f"{name}.count() = {pdf.count()}")
+
+
+def get_latest_hudi_commit_stats(s3dir_table: S3Path) -> T.Optional[dict]:
+    """
+    Read the write stats of the latest Hudi commit from the timeline in
+    ``.hoodie/``, it doesn't run any spark action.
+    """
+    s3dir_timeline = s3dir_table.joinpath(".hoodie").to_dir()
+    paginator = s3_client.get_paginator("list_objects_v2")
+    latest_key = None
+    for res in paginator.paginate(
+        Bucket=s3dir_timeline.bucket,
+        Prefix=s3dir_timeline.key,
+        Delimiter="/",
+    ):
+        for dct in res.get("Contents", []):
+            key = dct["Key"]
+            if key.endswith(".commit") or key.endswith(".deltacommit"):
+                if (latest_key is None) or (
+                    key.split("/")[-1] > latest_key.split("/")[-1]
+                ):
+                    latest_key = key
+    if latest_key is None:
+        return None
+    res = s3_client.get_object(Bucket=s3dir_timeline.bucket, Key=latest_key)
+    commit_metadata = json.loads(res["Body"].read().decode("utf-8"))
+    stats = {
+        "instant": latest_key.split("/")[-1],
+        "n_partition": 0,
+        "n_file": 0,
+        "n_write": 0,
+        "n_insert": 0,
+        "n_update": 0,
+        "n_delete": 0,
+    }
+    for write_stats in commit_metadata.get("partitionToWriteStats", {}).values():
+        stats["n_partition"] += 1
+        for write_stat in write_stats:
+            stats["n_file"] += 1
+            stats["n_write"] += write_stat.get("numWrites", 0)
+            stats["n_insert"] += write_stat.get("numInserts", 0)
+            stats["n_update"] += write_stat.get("numUpdateWrites", 0)
+            stats["n_delete"] += write_stat.get("numDeletes", 0)
+    return stats
+
+
+def dedup_latest_version(pdf, with_n_version: bool = False):
+    """
+    Keep the latest version of each id with one aggregation, it is one
+    shuffle by id, no window sort and no global sort. ``max`` of a struct
+    compares the fields in order: update_at, the DMS sequence column if any,
+    then the whole row.
+
+    :param with_n_version: if True, add a ``n_version`` column, the number of
+        versions of each id in the input.
+    """
+    order_columns = ["update_at"]
+    if DEDUP_SEQUENCE_COLUMN:
+        order_columns.append(DEDUP_SEQUENCE_COLUMN)
+    latest = F.max(
+        F.struct(
+            *[F.col(column) for column in order_columns],
+            F.struct(*[F.col(column) for column in pdf.columns]).alias("row"),
+        )
+    ).alias("latest")
+    if with_n_version:
+        return pdf.groupBy("id").agg(
+            latest, F.count(F.lit(1)).alias("n_version")
+        ).select("latest.row.*", "n_version")
+    else:
+        return pdf.groupBy("id").agg(latest).select("latest.row.*")
+
+
+# ------------------------------------------------------------------------------
+# Hudi table type
+# ------------------------------------------------------------------------------
+def get_table_type_options(table: str) -> T.Dict[str, str]:
+    """
+    Get the hudi write and hive sync options of the table type.
+    """
+    table_type = TABLE_TYPE_MAPPER.get(table, DEFAULT_TABLE_TYPE)
+    options = {"hoodie.datasource.write.table.type": table_type}
+    if table_type == "MERGE_ON_READ":
+        options.update(
+            {
+                # the log files are compacted by glue_jobs/compaction.py
+                "hoodie.compact.inline": "false",
+                "hoodie.compact.schedule.inline": "false",
+                # the read optimized view is {table}, the real time view is {table}_rt
+                "hoodie.datasource.hive_sync.skip_ro_suffix": "true",
+            }
+        )
+    return options
+
+
+# ------------------------------------------------------------------------------
+# Hudi partition scheme, see rds_to_datalake/hudi_partition.py
+# ------------------------------------------------------------------------------
+def get_partition_scheme(table: str) -> str:
+    return PARTITION_SCHEME_MAPPER.get(table, DEFAULT_PARTITION_SCHEME)
 
 
 def process_one_table(
@@ -151,6 +334,7 @@ def process_one_table(
     print(f"read incremental data of table {per_table_todo.table!r}")
     if len(per_table_todo.s3uri_list) == 0:
         print("no incremental data to process, skip")
+        return
 
     pdf_incremental = glue_ctx.create_dynamic_frame.from_options(
         connection_type="s3",
@@ -168,47 +352,37 @@ def process_one_table(
     # ------------------------------------------------------------------------------
     # only keep the latest version of each record
     # ------------------------------------------------------------------------------
-    # add row_number column
-    pdf_incremental_1 = pdf_incremental.withColumn(
-        "row_number",
-        F.row_number().over(
-            Window.partitionBy("id").orderBy(F.col("update_at").desc())
-        ),
-    )
-    pdf_incremental_2 = (
-        pdf_incremental_1
-        .filter(pdf_incremental_1.row_number == 1)
-        .drop("row_number")
-        .sort(pdf_incremental_1.update_at.desc())
-    )
+    if DEDUP_MODE == DEDUP_MODE_AGGREGATE:
+        pdf_incremental_2 = dedup_latest_version(
+            pdf_incremental,
+            with_n_version=DIAGNOSTICS == DIAGNOSTICS_FULL,
+        )
+    else:
+        # hudi deduplicates the batch by the precombine field before upsert
+        pdf_incremental_2 = pdf_incremental
+    if DIAGNOSTICS == DIAGNOSTICS_FULL:
+        # one action counts the rows, the write reuses the persisted
+        # dataframe instead of reading s3 again
+        pdf_persisted = pdf_incremental_2.persist()
+        if DEDUP_MODE == DEDUP_MODE_AGGREGATE:
+            row = pdf_persisted.agg(
+                F.count(F.lit(1)).alias("n_dedup"),
+                F.sum("n_version").alias("n_input"),
+            ).collect()[0]
+            print(f"n_input = {row['n_input']}, n_dedup = {row['n_dedup']}")
+            pdf_incremental_2 = pdf_persisted.drop("n_version")
+        else:
+            print(f"n_input = {pdf_persisted.count()}")
+            pdf_incremental_2 = pdf_persisted
     show_df_details(pdf_incremental_2, "pdf_incremental_2")
 
     # ------------------------------------------------------------------------------
-    # generate create_year, create_month, ..., create_minute columns
+    # generate the partition columns, e.g. create_year, create_month, ...
     # ------------------------------------------------------------------------------
-    pdf_incremental_3 = (
-        pdf_incremental_2.withColumn(
-            "create_year",
-            F.substring(pdf_incremental_2.create_at, 1, 4),
-        )
-        .withColumn(
-            "create_month",
-            F.substring(pdf_incremental_2.create_at, 6, 2),
-        )
-        .withColumn(
-            "create_day",
-            F.substring(pdf_incremental_2.create_at, 9, 2),
-        )
-        .withColumn(
-            "create_hour",
-            F.substring(pdf_incremental_2.create_at, 12, 2),
-        )
-        .withColumn(
-            "create_minute",
-            F.substring(pdf_incremental_2.create_at, 15, 2),
-        )
-        .drop("Op")
-    )
+    pdf_incremental_3 = add_partition_columns(
+        pdf_incremental_2,
+        get_partition_scheme(per_table_todo.table),
+    ).drop("Op")
     show_df_details(pdf_incremental_3, "pdf_incremental_3")
 
     # --------------------------------------------------------------------------
@@ -220,20 +394,19 @@ def process_one_table(
 
     additional_options = {
         "hoodie.table.name": table,
-        "hoodie.datasource.write.storage.type": "COPY_ON_WRITE",
         "hoodie.datasource.write.operation": "upsert",
         "hoodie.datasource.write.recordkey.field": "id",
         "hoodie.datasource.write.precombine.field": "update_at",
-        "hoodie.datasource.write.partitionpath.field": "create_year,create_month,create_day,create_hour,create_minute",
+        "hoodie.combine.before.upsert": "true",
         "hoodie.datasource.write.hive_style_partitioning": "true",
         "hoodie.datasource.hive_sync.enable": "true",
         "hoodie.datasource.hive_sync.database": database,
         "hoodie.datasource.hive_sync.table": table,
-        "hoodie.datasource.hive_sync.partition_fields": "create_year,create_month,create_day,create_hour,create_minute",
-        "hoodie.datasource.hive_sync.partition_extractor_class": "org.apache.hudi.hive.MultiPartKeysValueExtractor",
         "hoodie.datasource.hive_sync.use_jdbc": "false",
         "hoodie.datasource.hive_sync.mode": "hms",
         "path": s3dir_database.joinpath(table).uri,
+        **get_partition_options(get_partition_scheme(table)),
+        **get_table_type_options(table),
     }
     (
         pdf_incremental_3.write.format("hudi")
@@ -241,8 +414,64 @@ def process_one_table(
         .mode("append")
         .save()
     )
+    if DIAGNOSTICS == DIAGNOSTICS_FULL:
+        pdf_persisted.unpersist()
+        commit_stats = get_latest_hudi_commit_stats(s3dir_database.joinpath(table))
+        print(f"hudi commit stats = {commit_stats}")
+
+
+def run_one_table(table: str, func: T.Callable, *args) -> dict:
+    """
+    Run the pipeline of one table in its own FAIR scheduler pool, so the
+    tables share the cluster. The exception is reported instead of raised,
+    so one table doesn't stop the others.
+    """
+    # the local property is per thread, pyspark pins the python thread to a
+    # jvm thread
+    spark_ctx.setLocalProperty("spark.scheduler.pool", table)
+    start = time.time()
+    result = {"table": table}
+    try:
+        func(*args)
+        result["status"] = "succeeded"
+    except Exception as e:
+        traceback.print_exc()
+        result["status"] = "failed"
+        result["error"] = repr(e)
+    finally:
+        spark_ctx.setLocalProperty("spark.scheduler.pool", None)
+    result["elapsed"] = round(time.time() - start, 3)
+    print(f"finished table {table!r}: {result['status']}, {result['elapsed']} sec")
+    return result
+
+
+def run_all_tables(table_args_list: T.List[T.Tuple[str, T.Callable, tuple]]):
+    """
+    Run the per table pipelines concurrently with a thread pool, small
+    tables don't wait for the large ones, then print the run summary.
+    """
+    with ThreadPoolExecutor(max_workers=MAX_TABLE_CONCURRENCY) as executor:
+        futures = [
+            executor.submit(run_one_table, table, func, *args)
+            for table, func, args in table_args_list
+        ]
+        result_list = [future.result() for future in futures]
+    print("run summary:")
+    print(json.dumps(result_list, indent=4))
+    return result_list
 
-for per_table_todo in glue_job_input.todo_list:
-    process_one_table(per_table_todo)
+
+result_list = run_all_tables(
+    [
+        (per_table_todo.table, process_one_table, (per_table_todo,))
+        for per_table_todo in glue_job_input.todo_list
+    ]
+)
 
 job.commit()
+
+failed_table_list = [
+    result["table"] for result in result_list if result["status"] == "failed"
+]
+if len(failed_table_list):
+    raise RuntimeError(f"failed to process tables: {failed_table_list}")
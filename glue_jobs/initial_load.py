@@ -1,7 +1,12 @@
 # -*- coding: utf-8 -*-
 
 # standard library
+import typing as T
 import sys
+import json
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
 
 # third party library
 import boto3
@@ -10,12 +15,18 @@ from s3pathlib import S3Path, context
 # pyspark / AWS Glue stuff
 from pyspark import SparkConf
 from pyspark.sql import SparkSession
-from pyspark.sql import functions as F
 
 from awsglue.utils import getResolvedOptions
 from awsglue.context import GlueContext
 from awsglue.job import Job
 
+# shipped with the --extra-py-files job parameter
+from hudi_partition import (
+    default_partition_scheme,
+    add_partition_columns,
+    get_partition_options,
+)
+
 # ------------------------------------------------------------------------------
 # create spark session
 # ------------------------------------------------------------------------------
@@ -26,6 +37,8 @@ conf = (
         [
             ("spark.serializer", "org.apache.spark.serializer.KryoSerializer"),
             ("spark.sql.hive.convertMetastoreParquet", "false"),
+            # each table runs in its own scheduler pool, see run_all_tables
+            ("spark.scheduler.mode", "FAIR"),
         ]
     )
 )
@@ -53,6 +66,49 @@ S3URI_DMS_OUTPUT_DATABASE = args["S3URI_DMS_OUTPUT_DATABASE"]
 S3URI_DATABASE = args["S3URI_DATABASE"]
 DATABASE_NAME = args["DATABASE_NAME"]
 
+# optional job parameters
+# diagnostics level:
+# - off: no extra spark action
+# - sampled: print the schema and the first rows of each intermediate dataframe
+# - full: also report the written rows from the hudi commit metadata
+DIAGNOSTICS_OFF = "off"
+DIAGNOSTICS_SAMPLED = "sampled"
+DIAGNOSTICS_FULL = "full"
+DIAGNOSTICS = DIAGNOSTICS_OFF
+if "--DIAGNOSTICS" in sys.argv:
+    DIAGNOSTICS = getResolvedOptions(sys.argv, ["DIAGNOSTICS"])["DIAGNOSTICS"]
+if DIAGNOSTICS not in [DIAGNOSTICS_OFF, DIAGNOSTICS_SAMPLED, DIAGNOSTICS_FULL]:
+    raise ValueError(f"invalid DIAGNOSTICS {DIAGNOSTICS!r}")
+print(f"DIAGNOSTICS = {DIAGNOSTICS}")
+
+# max number of tables processed concurrently
+MAX_TABLE_CONCURRENCY = 4
+if "--MAX_TABLE_CONCURRENCY" in sys.argv:
+    MAX_TABLE_CONCURRENCY = int(
+        getResolvedOptions(sys.argv, ["MAX_TABLE_CONCURRENCY"])["MAX_TABLE_CONCURRENCY"]
+    )
+print(f"MAX_TABLE_CONCURRENCY = {MAX_TABLE_CONCURRENCY}")
+
+# the hudi partition scheme per table, see get_partition_scheme
+DEFAULT_PARTITION_SCHEME = default_partition_scheme
+PARTITION_SCHEME_MAPPER = dict()
+if "--PARTITION_SCHEME_MAPPER" in sys.argv:
+    PARTITION_SCHEME_MAPPER = json.loads(
+        getResolvedOptions(sys.argv, ["PARTITION_SCHEME_MAPPER"])[
+            "PARTITION_SCHEME_MAPPER"
+        ]
+    )
+print(f"PARTITION_SCHEME_MAPPER = {PARTITION_SCHEME_MAPPER}")
+
+# the hudi table type per table, COPY_ON_WRITE or MERGE_ON_READ
+DEFAULT_TABLE_TYPE = "COPY_ON_WRITE"
+TABLE_TYPE_MAPPER = dict()
+if "--TABLE_TYPE_MAPPER" in sys.argv:
+    TABLE_TYPE_MAPPER = json.loads(
+        getResolvedOptions(sys.argv, ["TABLE_TYPE_MAPPER"])["TABLE_TYPE_MAPPER"]
+    )
+print(f"TABLE_TYPE_MAPPER = {TABLE_TYPE_MAPPER}")
+
 # ------------------------------------------------------------------------------
 # create boto3 session
 # ------------------------------------------------------------------------------
@@ -66,6 +122,7 @@ aws_region = boto_ses.region_name
 print(f"aws_account_id = {aws_account_id}")
 print(f"aws_region = {aws_region}")
 context.attach_boto_session(boto_ses)
+s3_client = boto_ses.client("s3")
 
 # figure out where to read data and where to dump data
 s3dir_dms_output_database = S3Path(S3URI_DMS_OUTPUT_DATABASE)
@@ -79,10 +136,88 @@ def show_df(pdf, n: int = 3):
 
 
 def show_df_details(pdf, name: str):
+    """
+    Print the schema and the first rows, it doesn't count the rows, that
+    would recompute the whole lineage.
+    """
+    if DIAGNOSTICS == DIAGNOSTICS_OFF:
+        return
     print(name)
     pdf.printSchema()
     show_df(pdf)
-    print(f"{name}.count() = {pdf.count()}")
+
+
+def get_latest_hudi_commit_stats(s3dir_table: S3Path) -> T.Optional[dict]:
+    """
+    Read the write stats of the latest Hudi commit from the timeline in
+    ``.hoodie/``, it doesn't run any spark action.
+    """
+    s3dir_timeline = s3dir_table.joinpath(".hoodie").to_dir()
+    paginator = s3_client.get_paginator("list_objects_v2")
+    latest_key = None
+    for res in paginator.paginate(
+        Bucket=s3dir_timeline.bucket,
+        Prefix=s3dir_timeline.key,
+        Delimiter="/",
+    ):
+        for dct in res.get("Contents", []):
+            key = dct["Key"]
+            if key.endswith(".commit") or key.endswith(".deltacommit"):
+                if (latest_key is None) or (
+                    key.split("/")[-1] > latest_key.split("/")[-1]
+                ):
+                    latest_key = key
+    if latest_key is None:
+        return None
+    res = s3_client.get_object(Bucket=s3dir_timeline.bucket, Key=latest_key)
+    commit_metadata = json.loads(res["Body"].read().decode("utf-8"))
+    stats = {
+        "instant": latest_key.split("/")[-1],
+        "n_partition": 0,
+        "n_file": 0,
+        "n_write": 0,
+        "n_insert": 0,
+        "n_update": 0,
+        "n_delete": 0,
+    }
+    for write_stats in commit_metadata.get("partitionToWriteStats", {}).values():
+        stats["n_partition"] += 1
+        for write_stat in write_stats:
+            stats["n_file"] += 1
+            stats["n_write"] += write_stat.get("numWrites", 0)
+            stats["n_insert"] += write_stat.get("numInserts", 0)
+            stats["n_update"] += write_stat.get("numUpdateWrites", 0)
+            stats["n_delete"] += write_stat.get("numDeletes", 0)
+    return stats
+
+
+# ------------------------------------------------------------------------------
+# Hudi table type
+# ------------------------------------------------------------------------------
+def get_table_type_options(table: str) -> T.Dict[str, str]:
+    """
+    Get the hudi write and hive sync options of the table type.
+    """
+    table_type = TABLE_TYPE_MAPPER.get(table, DEFAULT_TABLE_TYPE)
+    options = {"hoodie.datasource.write.table.type": table_type}
+    if table_type == "MERGE_ON_READ":
+        options.update(
+            {
+                # the log files are compacted by glue_jobs/compaction.py
+                "hoodie.compact.inline": "false",
+                "hoodie.compact.schedule.inline": "false",
+                # the read optimized view is {table}, the real time view is {table}_rt
+                "hoodie.datasource.hive_sync.skip_ro_suffix": "true",
+            }
+        )
+    return options
+
+
+# ------------------------------------------------------------------------------
+# Hudi partition scheme, see rds_to_datalake/hudi_partition.py
+# ------------------------------------------------------------------------------
+def get_partition_scheme(table: str) -> str:
+    return PARTITION_SCHEME_MAPPER.get(table, DEFAULT_PARTITION_SCHEME)
 
 
 def process_one_table(
@@ -125,28 +260,10 @@ def process_one_table(
     # transform data
     # --------------------------------------------------------------------------
     print("transform data")
-    # generate create_year, create_month, ..., create_minute columns
-    pdf_initial_enriched = (
-        pdf_initial.withColumn(
-            "create_year",
-            F.substring(pdf_initial.create_at, 1, 4),
-        )
-        .withColumn(
-            "create_month",
-            F.substring(pdf_initial.create_at, 6, 2),
-        )
-        .withColumn(
-            "create_day",
-            F.substring(pdf_initial.create_at, 9, 2),
-        )
-        .withColumn(
-            "create_hour",
-            F.substring(pdf_initial.create_at, 12, 2),
-        )
-        .withColumn(
-            "create_minute",
-            F.substring(pdf_initial.create_at, 15, 2),
-        )
+    # generate the partition columns, e.g. create_year, create_month, ...
+    pdf_initial_enriched = add_partition_columns(
+        pdf_initial,
+        get_partition_scheme(s3dir_table.basename),
     )
     show_df_details(pdf_initial_enriched, "pdf_initial_enriched")
 
@@ -159,20 +276,18 @@ def process_one_table(
 
     additional_options = {
         "hoodie.table.name": table,
-        "hoodie.datasource.write.storage.type": "COPY_ON_WRITE",
         "hoodie.datasource.write.operation": "upsert",
         "hoodie.datasource.write.recordkey.field": "id",
         "hoodie.datasource.write.precombine.field": "update_at",
-        "hoodie.datasource.write.partitionpath.field": "create_year,create_month,create_day,create_hour,create_minute",
         "hoodie.datasource.write.hive_style_partitioning": "true",
         "hoodie.datasource.hive_sync.enable": "true",
         "hoodie.datasource.hive_sync.database": database,
         "hoodie.datasource.hive_sync.table": table,
-        "hoodie.datasource.hive_sync.partition_fields": "create_year,create_month,create_day,create_hour,create_minute",
-        "hoodie.datasource.hive_sync.partition_extractor_class": "org.apache.hudi.hive.MultiPartKeysValueExtractor",
         "hoodie.datasource.hive_sync.use_jdbc": "false",
         "hoodie.datasource.hive_sync.mode": "hms",
         "path": s3dir_database.joinpath(table).uri,
+        **get_partition_options(get_partition_scheme(table)),
+        **get_table_type_options(table),
     }
 
     (
@@ -181,12 +296,66 @@ def process_one_table(
         .mode("overwrite")
         .save()
     )
+    if DIAGNOSTICS == DIAGNOSTICS_FULL:
+        commit_stats = get_latest_hudi_commit_stats(s3dir_database.joinpath(table))
+        print(f"hudi commit stats = {commit_stats}")
+
+
+def run_one_table(table: str, func: T.Callable, *args) -> dict:
+    """
+    Run the pipeline of one table in its own FAIR scheduler pool, so the
+    tables share the cluster. The exception is reported instead of raised,
+    so one table doesn't stop the others.
+    """
+    # the local property is per thread, pyspark pins the python thread to a
+    # jvm thread
+    spark_ctx.setLocalProperty("spark.scheduler.pool", table)
+    start = time.time()
+    result = {"table": table}
+    try:
+        func(*args)
+        result["status"] = "succeeded"
+    except Exception as e:
+        traceback.print_exc()
+        result["status"] = "failed"
+        result["error"] = repr(e)
+    finally:
+        spark_ctx.setLocalProperty("spark.scheduler.pool", None)
+    result["elapsed"] = round(time.time() - start, 3)
+    print(f"finished table {table!r}: {result['status']}, {result['elapsed']} sec")
+    return result
+
+
+def run_all_tables(table_args_list: T.List[T.Tuple[str, T.Callable, tuple]]):
+    """
+    Run the per table pipelines concurrently with a thread pool, small
+    tables don't wait for the large ones, then print the run summary.
+    """
+    with ThreadPoolExecutor(max_workers=MAX_TABLE_CONCURRENCY) as executor:
+        futures = [
+            executor.submit(run_one_table, table, func, *args)
+            for table, func, args in table_args_list
+        ]
+        result_list = [future.result() for future in futures]
+    print("run summary:")
+    print(json.dumps(result_list, indent=4))
+    return result_list
 
 
 s3dir_public = s3dir_dms_output_database.joinpath("public").to_dir()
 print(f"scan tables in {s3dir_public.uri}")
-for s3dir_table in s3dir_public.iterdir():
-    process_one_table(s3dir_table)
+result_list = run_all_tables(
+    [
+        (s3dir_table.basename, process_one_table, (s3dir_table,))
+        for s3dir_table in s3dir_public.iterdir()
+    ]
+)
 
 
 job.commit()
+
+failed_table_list = [
+    result["table"] for result in result_list if result["status"] == "failed"
+]
+if len(failed_table_list):
+    raise RuntimeError(f"failed to process tables: {failed_table_list}")
@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+
+"""
+Rewrite one hudi table with the partition scheme of the
+``PARTITION_SCHEME_MAPPER`` job parameter, e.g. from the per minute partitions
+to ``"month"`` or ``"day,bucket:account_id:16"``, and with the table type of
+the ``TABLE_TYPE_MAPPER`` job parameter.
+
+1. read the hudi table, drop the hudi meta columns and the old partition
+   columns listed in ``.hoodie/hoodie.properties``.
+2. add the new partition columns, bulk insert into the staging folder.
+3. delete the glue catalog tables (including the ``_rt`` and ``_ro`` views),
+   their partition keys and input format can't be altered by the hive sync.
+4. overwrite the original table from the staging folder, with hive sync.
+5. delete the staging folder.
+
+.. note::
+
+    Update ``hudi_partition_scheme_mapper`` / ``hudi_table_type_mapper`` in
+    the config and deploy it before you run this job. Once the partition
+    scheme doesn't match ``.hoodie/hoodie.properties``, the orchestrator
+    holds the incremental glue job of the table, so it never upserts to the
+    new partition path before the table is rewritten. Wait for its running
+    incremental glue job to finish, then run this job.
+"""
+
+# standard library
+import typing as T
+import sys
+import json
+
+# third party library
+import boto3
+from s3pathlib import S3Path, context
+
+# pyspark / AWS Glue stuff
+from pyspark import SparkConf
+from pyspark.sql import SparkSession
+
+from awsglue.utils import getResolvedOptions
+from awsglue.context import GlueContext
+from awsglue.job import Job
+
+# shipped with the --extra-py-files job parameter
+from hudi_partition import (
+    default_partition_scheme,
+    get_partition_columns,
+    add_partition_columns,
+    get_partition_options,
+    parse_hudi_partition_fields,
+)
+
+# ------------------------------------------------------------------------------
+# create spark session
+# ------------------------------------------------------------------------------
+conf = (
+    SparkConf()
+    .setAppName("MyApp")
+    .setAll(
+        [
+            ("spark.serializer", "org.apache.spark.serializer.KryoSerializer"),
+            ("spark.sql.hive.convertMetastoreParquet", "false"),
+        ]
+    )
+)
+spark_ses = SparkSession.builder.config(conf=conf).enableHiveSupport().getOrCreate()
+spark_ctx = spark_ses.sparkContext
+glue_ctx = GlueContext(spark_ctx)
+
+# ------------------------------------------------------------------------------
+# resolve job parameters
+# ------------------------------------------------------------------------------
+print("create spark session")
+args = getResolvedOptions(
+    sys.argv,
+    [
+        "JOB_NAME",
+        "TABLE_NAME",
+        "S3URI_DATABASE",
+        "S3URI_DATABASE_STAGING",
+        "DATABASE_NAME",
+    ],
+)
+job = Job(glue_ctx)
+job.init(args["JOB_NAME"], args)
+
+TABLE_NAME = args["TABLE_NAME"]
+S3URI_DATABASE = args["S3URI_DATABASE"]
+S3URI_DATABASE_STAGING = args["S3URI_DATABASE_STAGING"]
+DATABASE_NAME = args["DATABASE_NAME"]
+print(f"TABLE_NAME = {TABLE_NAME}")
+
+# optional job parameters
+# the hudi partition scheme per table, see get_partition_scheme
+DEFAULT_PARTITION_SCHEME = default_partition_scheme
+PARTITION_SCHEME_MAPPER = dict()
+if "--PARTITION_SCHEME_MAPPER" in sys.argv:
+    PARTITION_SCHEME_MAPPER = json.loads(
+        getResolvedOptions(sys.argv, ["PARTITION_SCHEME_MAPPER"])[
+            "PARTITION_SCHEME_MAPPER"
+        ]
+    )
+print(f"PARTITION_SCHEME_MAPPER = {PARTITION_SCHEME_MAPPER}")
+
+# the hudi table type per table, COPY_ON_WRITE or MERGE_ON_READ
+DEFAULT_TABLE_TYPE = "COPY_ON_WRITE"
+TABLE_TYPE_MAPPER = dict()
+if "--TABLE_TYPE_MAPPER" in sys.argv:
+    TABLE_TYPE_MAPPER = json.loads(
+        getResolvedOptions(sys.argv, ["TABLE_TYPE_MAPPER"])["TABLE_TYPE_MAPPER"]
+    )
+print(f"TABLE_TYPE_MAPPER = {TABLE_TYPE_MAPPER}")
+
+# ------------------------------------------------------------------------------
+# create boto3 session
+# ------------------------------------------------------------------------------
+print("create boto3 session")
+
+boto_ses = boto3.session.Session()
+sts_client = boto_ses.client("sts")
+aws_account_id = sts_client.get_caller_identity()["Account"]
+aws_region = boto_ses.region_name
+
+print(f"aws_account_id = {aws_account_id}")
+print(f"aws_region = {aws_region}")
+context.attach_boto_session(boto_ses)
+glue_client = boto_ses.client("glue")
+
+# figure out where to read data and where to dump data
+s3dir_table = S3Path(S3URI_DATABASE).joinpath(TABLE_NAME).to_dir()
+s3dir_table_staging = S3Path(S3URI_DATABASE_STAGING).joinpath(TABLE_NAME).to_dir()
+
+# ------------------------------------------------------------------------------
+# ETL Logics
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# Hudi table type
+# ------------------------------------------------------------------------------
+def get_table_type_options(table: str) -> T.Dict[str, str]:
+    """
+    Get the hudi write and hive sync options of the table type.
+    """
+    table_type = TABLE_TYPE_MAPPER.get(table, DEFAULT_TABLE_TYPE)
+    options = {"hoodie.datasource.write.table.type": table_type}
+    if table_type == "MERGE_ON_READ":
+        options.update(
+            {
+                # the log files are compacted by glue_jobs/compaction.py
+                "hoodie.compact.inline": "false",
+                "hoodie.compact.schedule.inline": "false",
+                # the read optimized view is {table}, the real time view is {table}_rt
+                "hoodie.datasource.hive_sync.skip_ro_suffix": "true",
+            }
+        )
+    return options
+
+
+# ------------------------------------------------------------------------------
+# Hudi partition scheme, see rds_to_datalake/hudi_partition.py
+# ------------------------------------------------------------------------------
+def get_partition_scheme(table: str) -> str:
+    return PARTITION_SCHEME_MAPPER.get(table, DEFAULT_PARTITION_SCHEME)
+
+
+def get_hudi_partition_fields(s3dir_table: S3Path) -> T.List[str]:
+    """
+    Read the partition columns of a hudi table from ``.hoodie/hoodie.properties``.
+    """
+    s3path = s3dir_table.joinpath(".hoodie", "hoodie.properties")
+    return parse_hudi_partition_fields(s3path.read_text())
+
+
+def drop_hudi_columns(pdf, partition_fields: T.List[str]):
+    columns = [
+        column
+        for column in pdf.columns
+        if column.startswith("_hoodie") or column in partition_fields
+    ]
+    return pdf.drop(*columns)
+
+
+def get_write_options(
+    table: str,
+    s3dir: S3Path,
+    operation: str,
+    hive_sync: bool,
+) -> T.Dict[str, str]:
+    options = {
+        "hoodie.table.name": table,
+        "hoodie.datasource.write.operation": operation,
+        "hoodie.datasource.write.recordkey.field": "id",
+        "hoodie.datasource.write.precombine.field": "update_at",
+        "hoodie.datasource.write.hive_style_partitioning": "true",
+        "hoodie.datasource.hive_sync.enable": "true" if hive_sync else "false",
+        "hoodie.datasource.hive_sync.database": DATABASE_NAME,
+        "hoodie.datasource.hive_sync.table": table,
+        "hoodie.datasource.hive_sync.use_jdbc": "false",
+        "hoodie.datasource.hive_sync.mode": "hms",
+        "path": s3dir.uri,
+        **get_partition_options(get_partition_scheme(table)),
+        **get_table_type_options(table),
+    }
+    return options
+
+
+scheme = get_partition_scheme(TABLE_NAME)
+old_partition_fields = get_hudi_partition_fields(s3dir_table)
+print(f"repartition {s3dir_table.uri}")
+print(f"from {old_partition_fields} to {get_partition_columns(scheme)} ({scheme!r})")
+
+# ------------------------------------------------------------------------------
+# rewrite the table into the staging folder
+# ------------------------------------------------------------------------------
+print(f"write to staging folder {s3dir_table_staging.uri}")
+pdf = spark_ses.read.format("hudi").load(s3dir_table.uri)
+pdf = add_partition_columns(drop_hudi_columns(pdf, old_partition_fields), scheme)
+(
+    pdf.write.format("hudi")
+    .options(
+        **get_write_options(
+            TABLE_NAME,
+            s3dir_table_staging,
+            operation="bulk_insert",
+            hive_sync=False,
+        )
+    )
+    .mode("overwrite")
+    .save()
+)
+
+# ------------------------------------------------------------------------------
+# overwrite the original table from the staging folder
+# ------------------------------------------------------------------------------
+for name in [TABLE_NAME, f"{TABLE_NAME}_rt", f"{TABLE_NAME}_ro"]:
+    print(f"delete glue catalog table {DATABASE_NAME}.{name}")
+    try:
+        glue_client.delete_table(DatabaseName=DATABASE_NAME, Name=name)
+    except glue_client.exceptions.EntityNotFoundException:
+        pass
+
+print(f"overwrite {s3dir_table.uri}")
+pdf_staging = spark_ses.read.format("hudi").load(s3dir_table_staging.uri)
+pdf_staging = drop_hudi_columns(pdf_staging, [])
+(
+    pdf_staging.write.format("hudi")
+    .options(
+        **get_write_options(
+            TABLE_NAME,
+            s3dir_table,
+            operation="bulk_insert",
+            hive_sync=True,
+        )
+    )
+    .mode("overwrite")
+    .save()
+)
+
+print(f"delete staging folder {s3dir_table_staging.uri}")
+s3dir_table_staging.delete()
+
+job.commit()
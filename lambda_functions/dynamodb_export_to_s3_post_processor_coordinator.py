@@ -2,43 +2,102 @@
 
 """
 This lambda function will be triggered by the creation of DynamoDB export to s3
-manifest file. It parses the manifest file (data file list), group every 100 files
-into a list and send it to the post processor worker lambda function.
+manifest file. It parses the manifest file (data file list), bin-packs the
+files into balanced work units by item count (or by bytes if
+``MAX_BYTES_PER_WORK_UNIT`` is set), and sends the work units to the post
+processor worker lambda function concurrently.
+
+It also writes the ``manifest-work-units.json`` file, each worker writes a
+status file when it is done, and the last worker writes the
+``manifest-completed.json`` file, so the downstream load can start once every
+part exists.
+
+It requires the ``rds_to_datalake`` package in the lambda layer, see
+:func:`rds_to_datalake.cdk_define.build_lambda_layer_source`, the layer arn is
+the ``LambdaLayerArn`` output of the cdk stack.
 """
 
 import typing as T
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
+
 import boto3
 
+from rds_to_datalake.vendor.aws_dynamodb_export_to_s3 import (
+    DataFile,
+    WorkUnit,
+    get_item_count,
+    get_size,
+    plan_work_units,
+)
+
 s3_client = boto3.client("s3")
 lbd_client = boto3.client("lambda")
 
 DYNAMODB_EXPORT_TO_S3_POST_PROCESS_WORKER_FUNCTION_NAME = os.environ[
     "DYNAMODB_EXPORT_TO_S3_POST_PROCESS_WORKER_FUNCTION_NAME"
 ]
+MAX_ITEMS_PER_WORK_UNIT = int(os.environ.get("MAX_ITEMS_PER_WORK_UNIT", "1000000"))
+MAX_BYTES_PER_WORK_UNIT = os.environ.get("MAX_BYTES_PER_WORK_UNIT")
+MAX_FILES_PER_WORK_UNIT = int(os.environ.get("MAX_FILES_PER_WORK_UNIT", "100"))
+MAX_WORKERS = int(os.environ.get("MAX_WORKERS", "16"))  # concurrent invoke
 
 
-def grouper_list(iterable: T.Iterable, n: int) -> T.Iterable[list]:
-    """Evenly divide list into fixed-length piece, no filled value if chunk
-    size smaller than fixed-length.
+def fill_size(bucket: str, prefix: str, data_file_list: T.List[DataFile]):
+    """
+    The manifest file doesn't have the data file size, get it from the
+    s3 list objects API, one call per 1000 files.
+    """
+    size_mapper = dict()
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for res in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for dct in res.get("Contents", []):
+            size_mapper[dct["Key"]] = dct["Size"]
+    for data_file in data_file_list:
+        data_file.size = size_mapper[data_file.s3_key]
 
-    Example::
 
-        >>> list(grouper_list(range(10), n=3)
-        [[0, 1, 2], [3, 4, 5], [6, 7, 8], [9]]
+def clean_up_completion_status(
+    bucket: str,
+    work_unit_status_prefix: str,
+    completion_manifest_key: str,
+):
     """
-    chunk = list()
-    counter = 0
-    for item in iterable:
-        counter += 1
-        chunk.append(item)
-        if counter == n:
-            yield chunk
-            chunk = list()
-            counter = 0
-    if len(chunk) > 0:
-        yield chunk
+    Delete the status files of the previous run of the same export, otherwise
+    the workers of this run may consider it done too early.
+    """
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for res in paginator.paginate(Bucket=bucket, Prefix=f"{work_unit_status_prefix}/"):
+        objects = [{"Key": dct["Key"]} for dct in res.get("Contents", [])]
+        if len(objects):
+            s3_client.delete_objects(Bucket=bucket, Delete={"Objects": objects})
+    s3_client.delete_object(Bucket=bucket, Key=completion_manifest_key)
+
+
+def invoke_worker(
+    work_unit: WorkUnit,
+    bucket: str,
+    dynamodb_export_processed_prefix: str,
+    n_work_unit: int,
+    work_unit_status_prefix: str,
+    completion_manifest_key: str,
+):
+    lbd_client.invoke(
+        FunctionName=DYNAMODB_EXPORT_TO_S3_POST_PROCESS_WORKER_FUNCTION_NAME,
+        InvocationType="Event",
+        Payload=json.dumps(
+            {
+                "ith": work_unit.ith,
+                "bucket": bucket,
+                "key_list": work_unit.key_list,
+                "dynamodb_export_processed_prefix": dynamodb_export_processed_prefix,
+                "n_work_unit": n_work_unit,
+                "work_unit_status_prefix": work_unit_status_prefix,
+                "completion_manifest_key": completion_manifest_key,
+            }
+        ),
+    )
 
 
 def lambda_handler(event, context):
@@ -53,29 +112,73 @@ def lambda_handler(event, context):
     parts = key.split("/")
     if (parts[-1] != "manifest-files.json") or (parts[-3] != "AWSDynamoDB"):
         raise ValueError(f"s3://{bucket}/{key} is not a dynamodb export manifest file!")
+    data_prefix = "/".join(parts[:-1] + ["data/"])
     parts[-4] = "dynamodb_export_processed"
     parts.pop()
-    parts.append("data")
-    dynamodb_export_processed_prefix = "/".join(parts)
+    dynamodb_export_processed_root = "/".join(parts)
+    dynamodb_export_processed_prefix = f"{dynamodb_export_processed_root}/data"
+    work_unit_status_prefix = f"{dynamodb_export_processed_root}/work_unit_status"
+    completion_manifest_key = (
+        f"{dynamodb_export_processed_root}/manifest-completed.json"
+    )
 
     res = s3_client.get_object(Bucket=bucket, Key=key)
-    lines = res["Body"].read().splitlines()
-
-    all_key_list = [json.loads(line)["dataFileS3Key"] for line in lines]
-
-    for ith, key_list in enumerate(
-        grouper_list(all_key_list, 100),
-        start=1,
-    ):
-        lbd_client.invoke(
-            FunctionName=DYNAMODB_EXPORT_TO_S3_POST_PROCESS_WORKER_FUNCTION_NAME,
-            InvocationType="Event",
-            Payload=json.dumps(
-                {
-                    "ith": ith,
-                    "bucket": bucket,
-                    "key_list": key_list,
-                    "dynamodb_export_processed_prefix": dynamodb_export_processed_prefix,
-                }
-            ),
+    data_file_list = DataFile.from_manifest_files(
+        bucket=bucket,
+        content=res["Body"].read().decode("utf-8"),
+    )
+
+    if MAX_BYTES_PER_WORK_UNIT:
+        fill_size(bucket, data_prefix, data_file_list)
+        work_unit_list = plan_work_units(
+            data_file_list,
+            max_weight_per_unit=int(MAX_BYTES_PER_WORK_UNIT),
+            max_files_per_unit=MAX_FILES_PER_WORK_UNIT,
+            weight_func=get_size,
         )
+    else:
+        work_unit_list = plan_work_units(
+            data_file_list,
+            max_weight_per_unit=MAX_ITEMS_PER_WORK_UNIT,
+            max_files_per_unit=MAX_FILES_PER_WORK_UNIT,
+            weight_func=get_item_count,
+        )
+    n_work_unit = len(work_unit_list)
+    print(f"plan {len(data_file_list)} data files into {n_work_unit} work units")
+
+    clean_up_completion_status(
+        bucket, work_unit_status_prefix, completion_manifest_key
+    )
+    s3_client.put_object(
+        Bucket=bucket,
+        Key=f"{dynamodb_export_processed_root}/manifest-work-units.json",
+        Body=json.dumps(
+            {
+                "n_work_unit": n_work_unit,
+                "work_unit_list": [
+                    {
+                        "ith": work_unit.ith,
+                        "key_list": work_unit.key_list,
+                        "item_count": work_unit.item_count,
+                        "weight": work_unit.weight,
+                    }
+                    for work_unit in work_unit_list
+                ],
+            }
+        ),
+        ContentType="application/json",
+    )
+
+    def invoke(work_unit: WorkUnit):
+        invoke_worker(
+            work_unit=work_unit,
+            bucket=bucket,
+            dynamodb_export_processed_prefix=dynamodb_export_processed_prefix,
+            n_work_unit=n_work_unit,
+            work_unit_status_prefix=work_unit_status_prefix,
+            completion_manifest_key=completion_manifest_key,
+        )
+
+    # the heaviest work unit is dispatched first
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        list(executor.map(invoke, work_unit_list))
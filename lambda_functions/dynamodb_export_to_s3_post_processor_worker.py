@@ -3,65 +3,310 @@
 """
 This lambda function will be invoked by the dynamodb export to s3 post processor
 coordinator lambda function.
+
+It streams the data files: each ``.json.gz`` file is decompressed line by line,
+the items are decoded in batches, and the output is written part by
+part, so the memory usage stays flat regardless of the number of files.
+
+- ``OUTPUT_FORMAT=json`` (default): write one ``${ith}.json.gz`` file via s3
+  multipart upload, each uploaded part is about ``PART_SIZE`` bytes.
+- ``OUTPUT_FORMAT=parquet``: write one ``${ith}-${part}.parquet`` file per
+  ``BATCH_SIZE`` items.
+
+It requires the ``rds_to_datalake`` package and polars in the lambda layer,
+see :func:`rds_to_datalake.cdk_define.build_lambda_layer_source`, the layer
+arn is the ``LambdaLayerArn`` output of the cdk stack.
 """
 
+import typing as T
+import os
+import io
 import json
 import gzip
+import zlib
 
 import boto3
 
+from rds_to_datalake.vendor.dynamodb_json import ItemDecoder
+
 s3_client = boto3.client("s3")
 
+OUTPUT_FORMAT = os.environ.get("OUTPUT_FORMAT", "json")
+BATCH_SIZE = int(os.environ.get("BATCH_SIZE", "10000"))  # number of items
+PART_SIZE = int(os.environ.get("PART_SIZE", str(8 * 1024 * 1024)))  # bytes
+MIN_PART_SIZE = 5 * 1024 * 1024  # s3 multipart upload minimal part size
 
-def lambda_handler(event, context):
+# attribute name -> DynamoDB data type
+ITEM_SCHEMA = {
+    "account": "S",
+    "create_at": "S",
+    "update_at": "S",
+    "entity": "S",
+    "amount": "N",
+    "is_credit": "N",
+    "note": "S",
+}
+item_decoder = ItemDecoder(schema=ITEM_SCHEMA)
+
+
+def iter_lines(bucket: str, key: str) -> T.Iterable[bytes]:
     """
-    :param event: example, {"ith": ..., "bucket": ..., "key_list": [...]}
+    Stream the lines of a ``.json.gz`` data file without loading the whole
+    file into memory.
     """
-    ith = event["ith"]
-    bucket = event["bucket"]
-    key_list = event["key_list"]
-    dynamodb_export_processed_prefix = event["dynamodb_export_processed_prefix"]
+    res = s3_client.get_object(Bucket=bucket, Key=key)
+    with gzip.GzipFile(fileobj=res["Body"]) as f:
+        for line in f:
+            yield line
 
-    lines = list()
-    for key in key_list:
-        # read data
-        res = s3_client.get_object(
-            Bucket=bucket,
-            Key=key,
+
+def iter_batches(
+    iterable: T.Iterable,
+    n: int,
+) -> T.Iterable[list]:
+    """
+    Group the items into lists of at most n items.
+    """
+    batch = list()
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == n:
+            yield batch
+            batch = list()
+    if len(batch):
+        yield batch
+
+
+class MultipartGzipWriter:
+    """
+    Compress the data incrementally and upload it with s3 multipart upload.
+    It only holds about ``part_size`` bytes of compressed data in memory.
+    """
+
+    def __init__(
+        self,
+        s3_client,
+        bucket: str,
+        key: str,
+        part_size: int = PART_SIZE,
+    ):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self.compressor = zlib.compressobj(wbits=31)  # gzip format
+        self.buffer = bytearray()
+        self.upload_id: T.Optional[str] = None
+        self.parts: T.List[dict] = list()
+
+    def _upload_part(self):
+        # ref: https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/s3/client/upload_part.html
+        if self.upload_id is None:
+            res = self.s3_client.create_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.key,
+                ContentType="application/x-gzip",
+            )
+            self.upload_id = res["UploadId"]
+        part_number = len(self.parts) + 1
+        res = self.s3_client.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            PartNumber=part_number,
+            Body=bytes(self.buffer),
         )
-        items = [
-            json.loads(line)
-            for line in (
-                gzip.decompress(res["Body"].read()).decode("utf-8").splitlines()
+        self.parts.append({"PartNumber": part_number, "ETag": res["ETag"]})
+        self.buffer = bytearray()
+
+    def write(self, data: bytes):
+        self.buffer.extend(self.compressor.compress(data))
+        if len(self.buffer) >= self.part_size:
+            self._upload_part()
+
+    def close(self):
+        self.buffer.extend(self.compressor.flush())
+        # the data is small, no need to use multipart upload
+        if self.upload_id is None:
+            self.s3_client.put_object(
+                Bucket=self.bucket,
+                Key=self.key,
+                Body=bytes(self.buffer),
+                ContentType="application/x-gzip",
             )
-        ]
-        # process
-        for item in items:
-            account = item["Item"]["account"]["S"]
-            create_at = item["Item"]["create_at"]["S"]
-            update_at = item["Item"]["update_at"]["S"]
-            entity = item["Item"]["entity"]["S"]
-            amount = int(item["Item"]["amount"]["N"])
-            is_credit = int(item["Item"]["is_credit"]["N"])
-            note = item["Item"]["note"]["S"]
-
-            row = dict(
-                account=account,
-                create_at=create_at,
-                update_at=update_at,
-                entity=entity,
-                amount=amount,
-                is_credit=is_credit,
-                note=note,
+            return
+        if len(self.buffer):
+            self._upload_part()
+        self.s3_client.complete_multipart_upload(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            MultipartUpload={"Parts": self.parts},
+        )
+
+    def abort(self):
+        if self.upload_id is not None:
+            self.s3_client.abort_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self.upload_id,
             )
-            line = json.dumps(row)
-            lines.append(line)
 
-    # write data
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def iter_item_batches(
+    bucket: str,
+    key_list: T.List[str],
+    batch_size: int = BATCH_SIZE,
+) -> T.Iterable[list]:
+    """
+    Yield the DynamoDB json items of the data files in batches.
+    """
+    for key in key_list:
+        for lines in iter_batches(iter_lines(bucket, key), batch_size):
+            yield [json.loads(line)["Item"] for line in lines]
+
+
+def write_json(
+    bucket: str,
+    key_list: T.List[str],
+    dynamodb_export_processed_prefix: str,
+    ith: int,
+) -> T.Tuple[T.List[str], int]:
+    """
+    :return: the output s3 key list and the number of rows.
+    """
     key = f"{dynamodb_export_processed_prefix}/{str(ith).zfill(6)}.json.gz"
+    n_rows = 0
+    with MultipartGzipWriter(s3_client, bucket, key) as writer:
+        for items in iter_item_batches(bucket, key_list):
+            lines = [json.dumps(row) for row in item_decoder.decode_items(items)]
+            if n_rows:
+                writer.write(b"\n")
+            writer.write("\n".join(lines).encode("utf-8"))
+            n_rows += len(lines)
+    return [key], n_rows
+
+
+def write_parquet(
+    bucket: str,
+    key_list: T.List[str],
+    dynamodb_export_processed_prefix: str,
+    ith: int,
+) -> T.Tuple[T.List[str], int]:
+    """
+    :return: the output s3 key list and the number of rows.
+    """
+    output_key_list = list()
+    n_rows = 0
+    for part, items in enumerate(
+        iter_item_batches(bucket, key_list),
+        start=1,
+    ):
+        buffer = io.BytesIO()
+        item_decoder.to_dataframe(items).write_parquet(buffer)
+        key = (
+            f"{dynamodb_export_processed_prefix}"
+            f"/{str(ith).zfill(6)}-{str(part).zfill(6)}.parquet"
+        )
+        s3_client.put_object(
+            Bucket=bucket,
+            Key=key,
+            Body=buffer.getvalue(),
+            ContentType="application/octet-stream",
+        )
+        output_key_list.append(key)
+        n_rows += len(items)
+    return output_key_list, n_rows
+
+
+def report_completion(
+    bucket: str,
+    ith: int,
+    output_key_list: T.List[str],
+    n_rows: int,
+    n_work_unit: int,
+    work_unit_status_prefix: str,
+    completion_manifest_key: str,
+):
+    """
+    Write the status file of this work unit. If all work units are done,
+    write the completion manifest file that lists all output files. It is
+    possible that the last two workers both write it, the content is the same.
+    """
+    s3_client.put_object(
+        Bucket=bucket,
+        Key=f"{work_unit_status_prefix}/{str(ith).zfill(6)}.json",
+        Body=json.dumps(
+            {"ith": ith, "output_key_list": output_key_list, "n_rows": n_rows}
+        ),
+        ContentType="application/json",
+    )
+    status_key_list = list()
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for res in paginator.paginate(Bucket=bucket, Prefix=f"{work_unit_status_prefix}/"):
+        for dct in res.get("Contents", []):
+            status_key_list.append(dct["Key"])
+    if len(status_key_list) < n_work_unit:
+        return
+
+    all_output_key_list = list()
+    total_rows = 0
+    for key in sorted(status_key_list):
+        res = s3_client.get_object(Bucket=bucket, Key=key)
+        status = json.loads(res["Body"].read().decode("utf-8"))
+        all_output_key_list.extend(status["output_key_list"])
+        total_rows += status["n_rows"]
+    print(f"all {n_work_unit} work units are done, write completion manifest")
     s3_client.put_object(
         Bucket=bucket,
-        Key=key,
-        Body=gzip.compress("\n".join(lines).encode("utf-8")),
-        ContentType="application/x-gzip",
+        Key=completion_manifest_key,
+        Body=json.dumps(
+            {
+                "n_work_unit": n_work_unit,
+                "n_rows": total_rows,
+                "output_key_list": all_output_key_list,
+            }
+        ),
+        ContentType="application/json",
     )
+
+
+def lambda_handler(event, context):
+    """
+    :param event: example, {"ith": ..., "bucket": ..., "key_list": [...]},
+        the coordinator also sends ``n_work_unit``, ``work_unit_status_prefix``
+        and ``completion_manifest_key`` to track the completion.
+    """
+    ith = event["ith"]
+    bucket = event["bucket"]
+    key_list = event["key_list"]
+    dynamodb_export_processed_prefix = event["dynamodb_export_processed_prefix"]
+
+    if OUTPUT_FORMAT == "parquet":
+        output_key_list, n_rows = write_parquet(
+            bucket, key_list, dynamodb_export_processed_prefix, ith
+        )
+    else:
+        output_key_list, n_rows = write_json(
+            bucket, key_list, dynamodb_export_processed_prefix, ith
+        )
+
+    if "work_unit_status_prefix" in event:
+        report_completion(
+            bucket=bucket,
+            ith=ith,
+            output_key_list=output_key_list,
+            n_rows=n_rows,
+            n_work_unit=event["n_work_unit"],
+            work_unit_status_prefix=event["work_unit_status_prefix"],
+            completion_manifest_key=event["completion_manifest_key"],
+        )
@@ -7,16 +7,36 @@ This script reads data from DynamoDB Stream, transform it, and save it to S3.
 
 - batch size: 100
 - batch window: 10 seconds
+
+Output format, ``OUTPUT_FORMAT`` environment variable:
+
+- ``json`` (default): one json file per minute partition per invocation.
+- ``parquet``: one parquet file per minute partition per invocation.
+
+Compaction: when this lambda function is invoked by a scheduled event (for
+example, every 5 minutes), it merges the small files of the closed minute
+partitions within the last ``COMPACTION_LOOKBACK`` seconds into one parquet
+file. The partitions are by ``update_at``, so a late or replayed record
+reopens an old partition, a partition is closed only when its newest file is
+older than ``COMPACTION_CLOSE_DELAY`` seconds. A reopened partition is merged
+again once it is closed, the duplicated records of a replay are dropped.
+
+It requires the ``rds_to_datalake`` package and polars in the lambda layer,
+see :func:`rds_to_datalake.cdk_define.build_lambda_layer_source`, the layer
+arn is the ``LambdaLayerArn`` output of the cdk stack.
 """
 
 import typing as T
 import os
 import json
+import io
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 
 import boto3
 
+from rds_to_datalake.vendor.dynamodb_json import ItemDecoder
+
 s3_client = boto3.client("s3")
 sts_client = boto3.client("sts")
 aws_account_id = sts_client.get_caller_identity()["Account"]
@@ -26,10 +46,68 @@ S3_BUCKET = os.environ["S3_BUCKET"]
 S3_PREFIX = os.environ["S3_PREFIX"]  # processed dynamodb stream data s3 folder
 if S3_PREFIX.endswith("/"):
     S3_PREFIX = S3_PREFIX[:-1]
+OUTPUT_FORMAT = os.environ.get("OUTPUT_FORMAT", "json")
+COMPACTION_CLOSE_DELAY = int(os.environ.get("COMPACTION_CLOSE_DELAY", "300"))
+COMPACTION_LOOKBACK = int(os.environ.get("COMPACTION_LOOKBACK", "3600"))
 
+# the new image includes the key attributes
+item_decoder = ItemDecoder(
+    schema={
+        "account": "S",
+        "create_at": "S",
+        "update_at": "S",
+        "entity": "S",
+        "amount": "N",
+        "is_credit": "N",
+        "note": "S",
+    }
+)
 
-def lambda_handler(event, context):
-    records = event["Records"]
+
+def get_partition_prefix(year: str, month: str, day: str, hour: str, minute: str):
+    return (
+        f"{S3_PREFIX}"
+        f"/year={year}/month={month}/day={day}/hour={hour}/minute={minute}"
+    )
+
+
+def get_polars_schema() -> dict:
+    """
+    The fixed parquet schema, so the files of the same partition can be merged.
+    """
+    import polars as pl
+
+    dtype_mapper = {"S": pl.Utf8, "N": pl.Int64}
+    return {name: dtype_mapper[type_] for name, type_ in item_decoder.schema.items()}
+
+
+def write_partition(partition: str, data_list: T.List[dict]):
+    year, month, day, hour, minute = partition.split("-")
+    bucket = S3_BUCKET
+    prefix = get_partition_prefix(year, month, day, hour, minute)
+    if OUTPUT_FORMAT == "parquet":
+        import polars as pl
+
+        key = f"{prefix}/{uuid.uuid4().hex}.parquet"
+        buffer = io.BytesIO()
+        pl.DataFrame(data_list, schema=get_polars_schema()).write_parquet(buffer)
+        body = buffer.getvalue()
+        content_type = "application/octet-stream"
+    else:
+        key = f"{prefix}/{uuid.uuid4().hex}.json"
+        lines = [json.dumps(data) for data in data_list]
+        body = "\n".join(lines)
+        content_type = "application/json"
+    print(f"write {len(data_list)} records to s3://{bucket}/{key}")
+    s3_client.put_object(
+        Bucket=bucket,
+        Key=key,
+        Body=body,
+        ContentType=content_type,
+    )
+
+
+def consume(records: T.List[dict]):
     print(f"received {len(records)} records")
     # print(records[:3]) # for debug only
 
@@ -39,24 +117,8 @@ def lambda_handler(event, context):
             continue
 
         # parse dynamodb stream record
-        dynamodb_data = record["dynamodb"]
-        account = dynamodb_data["Keys"]["account"]["S"]
-        create_at = dynamodb_data["Keys"]["create_at"]["S"]
-        update_at = dynamodb_data["NewImage"]["update_at"]["S"]
-        entity = dynamodb_data["NewImage"]["entity"]["S"]
-        amount = int(dynamodb_data["NewImage"]["amount"]["N"])
-        is_credit = int(dynamodb_data["NewImage"]["is_credit"]["N"])
-        note = dynamodb_data["NewImage"]["note"]["S"]
-
-        data = dict(
-            account=account,
-            create_at=create_at,
-            update_at=update_at,
-            entity=entity,
-            amount=amount,
-            is_credit=is_credit,
-            note=note,
-        )
+        data = item_decoder.decode_item(record["dynamodb"]["NewImage"])
+        update_at = data["update_at"]
 
         # partition data by update_at, this field indicate when this record is updated
         update_at_datetime = datetime.strptime(update_at, "%Y-%m-%dT%H:%M:%S.%f%z")
@@ -71,20 +133,119 @@ def lambda_handler(event, context):
         except KeyError:
             groups[partition] = [data]
 
-    # write cdc data to s3 by partition
+    # write cdc data to s3 by partition, records of the same partition
+    # are coalesced into one file
     for partition, data_list in groups.items():
-        year, month, day, hour, minute = partition.split("-")
-        bucket = S3_BUCKET
-        key = (
-            f"{S3_PREFIX}"
-            f"/year={year}/month={month}/day={day}/hour={hour}/minute={minute}"
-            f"/{uuid.uuid4().hex}.json"
+        write_partition(partition, data_list)
+
+
+def list_partition(prefix: str) -> T.List[dict]:
+    """
+    List the files of a minute partition, the ``Contents`` of
+    ``ListObjectsV2``.
+    """
+    content_list = list()
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for res in paginator.paginate(Bucket=S3_BUCKET, Prefix=f"{prefix}/"):
+        content_list.extend(res.get("Contents", []))
+    return content_list
+
+
+def compact_partition(prefix: str, watermark: datetime) -> bool:
+    """
+    Merge all files of a minute partition into one parquet file, if no file
+    is written to the partition after the ``watermark``.
+
+    The new file is written before the small files are deleted, so no data is
+    lost, but a reader in between may see the records twice. A file written
+    during the compaction is kept, it is merged in a later run.
+
+    :return: True if the partition is compacted.
+    """
+    import polars as pl
+
+    bucket = S3_BUCKET
+    content_list = list_partition(prefix)
+    if len(content_list) <= 1:
+        return False
+    # a late or replayed record reopened the partition, wait until it is closed
+    if max([dct["LastModified"] for dct in content_list]) > watermark:
+        print(f"partition s3://{bucket}/{prefix}/ is still open, skip it.")
+        return False
+    key_list = [dct["Key"] for dct in content_list]
+
+    df_list = list()
+    schema = get_polars_schema()
+    for key in key_list:
+        res = s3_client.get_object(Bucket=bucket, Key=key)
+        body = io.BytesIO(res["Body"].read())
+        if key.endswith(".parquet"):
+            df = pl.read_parquet(body)
+        else:
+            df = pl.read_ndjson(body)
+        df_list.append(
+            df.select([pl.col(name).cast(dtype) for name, dtype in schema.items()])
         )
-        lines = [json.dumps(data) for data in data_list]
-        print(f"write {len(data_list)} records to s3://{bucket}/{key}")
-        s3_client.put_object(
+    # a replayed batch writes the same records again
+    df = pl.concat(df_list).unique(maintain_order=True)
+
+    key = f"{prefix}/compacted-{uuid.uuid4().hex}.parquet"
+    buffer = io.BytesIO()
+    df.write_parquet(buffer)
+    print(f"compact {len(key_list)} files, {df.height} records to s3://{bucket}/{key}")
+    s3_client.put_object(
+        Bucket=bucket,
+        Key=key,
+        Body=buffer.getvalue(),
+        ContentType="application/octet-stream",
+    )
+    key_set = set(key_list)
+    key_set.add(key)
+    n_new = len([dct for dct in list_partition(prefix) if dct["Key"] not in key_set])
+    if n_new:
+        print(f"{n_new} files are written during the compaction, keep them.")
+    for i in range(0, len(key_list), 1000):
+        s3_client.delete_objects(
             Bucket=bucket,
-            Key=key,
-            Body="\n".join(lines),
-            ContentType="application/json",
+            Delete={"Objects": [{"Key": key} for key in key_list[i : i + 1000]]},
+        )
+    return True
+
+
+def compact(now: T.Optional[datetime] = None) -> int:
+    """
+    Compact the closed minute partitions within the lookback window.
+
+    :return: number of compacted partitions.
+    """
+    if now is None:
+        now = datetime.now(timezone.utc)
+    watermark = now - timedelta(seconds=COMPACTION_CLOSE_DELAY)
+    end = watermark.replace(second=0, microsecond=0)
+    start = end - timedelta(seconds=COMPACTION_LOOKBACK)
+    n_compacted = 0
+    minute = start
+    while minute < end:
+        prefix = get_partition_prefix(
+            str(minute.year).zfill(4),
+            str(minute.month).zfill(2),
+            str(minute.day).zfill(2),
+            str(minute.hour).zfill(2),
+            str(minute.minute).zfill(2),
         )
+        if compact_partition(prefix, watermark):
+            n_compacted += 1
+        minute += timedelta(minutes=1)
+    return n_compacted
+
+
+def lambda_handler(event, context):
+    """
+    :param event: the DynamoDB stream event, or a scheduled event to run the
+        compaction.
+    """
+    if "Records" in event:
+        consume(event["Records"])
+    else:
+        n_compacted = compact()
+        print(f"compacted {n_compacted} partitions")
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+"""
+This lambda function is the event driven incremental glue job orchestrator.
+It is triggered by the s3 ``ObjectCreated`` event notification of the DMS
+output folder, and by a scheduled event (for example, every 5 minutes) so the
+max age threshold is met even if there's no new cdc data file.
+
+It is deployed by ``rds_to_datalake.cdk_deploy.cdk_deploy_4_event_driven_orchestrator``,
+the deployment package includes the ``rds_to_datalake`` package. The reserved
+concurrency is 1, the tracker and the listing index on s3 are read, modified
+and written without lock, so the invocations must not overlap.
+"""
+
+import typing as T
+import os
+import json
+import math
+from datetime import datetime
+
+from s3pathlib import S3Path
+from boto_session_manager import BotoSesManager
+
+from rds_to_datalake.incremental_load_orchestration import (
+    BatchPlanner,
+    TriggerPolicy,
+    CompactionPolicy,
+    CDCTracker,
+)
+
+bsm = BotoSesManager()
+
+S3URI_INCREMENTAL_GLUE_JOB_TRACKER = os.environ["S3URI_INCREMENTAL_GLUE_JOB_TRACKER"]
+S3URI_INCREMENTAL_GLUE_JOB_INPUT = os.environ["S3URI_INCREMENTAL_GLUE_JOB_INPUT"]
+S3URI_INCREMENTAL_GLUE_JOB_LISTING_INDEX = os.environ[
+    "S3URI_INCREMENTAL_GLUE_JOB_LISTING_INDEX"
+]
+S3URI_DMS_OUTPUT_DATABASE = os.environ["S3URI_DMS_OUTPUT_DATABASE"]
+GLUE_JOB_NAME = os.environ["GLUE_JOB_NAME"]
+EPOCH_PROCESSED_TIME = os.environ.get("EPOCH_PROCESSED_TIME", "2023-01-01T00:00:00+00:00")
+BATCH_PLANNER = json.loads(os.environ.get("BATCH_PLANNER", "{}"))
+TABLE_GROUP_LIST = json.loads(os.environ.get("TABLE_GROUP_LIST", "null"))
+MAX_CONCURRENT_RUNS = int(os.environ.get("MAX_CONCURRENT_RUNS", "1"))
+TRIGGER_MIN_BYTES = int(os.environ.get("TRIGGER_MIN_BYTES", str(64 * 1024 * 1024)))
+TRIGGER_MAX_AGE = int(os.environ.get("TRIGGER_MAX_AGE", "300"))
+DISCOVERY_MAX_WORKERS = int(os.environ.get("DISCOVERY_MAX_WORKERS", "16"))
+# empty string means no timeout, it is capped by the remaining time anyway
+DISCOVERY_TIMEOUT = os.environ.get("DISCOVERY_TIMEOUT", "30")
+# the time to write the tracker and start the glue job after the discovery
+DISCOVERY_TIME_RESERVE = 60
+S3URI_DATABASE = os.environ["S3URI_DATABASE"]
+COMPACTION_GLUE_JOB_NAME = os.environ["COMPACTION_GLUE_JOB_NAME"]
+COMPACTION_POLICY = json.loads(os.environ.get("COMPACTION_POLICY", "{}"))
+MOR_TABLE_LIST = json.loads(os.environ.get("MOR_TABLE_LIST", "[]"))
+PARTITION_SCHEME_MAPPER = json.loads(os.environ.get("PARTITION_SCHEME_MAPPER", "{}"))
+
+
+def get_discovery_timeout(context, cdc_tracker: CDCTracker) -> T.Optional[float]:
+    """
+    The per table discovery timeout. A worker discovers its tables one by
+    one, and one invocation discovers up to ``MAX_CONCURRENT_RUNS`` table
+    groups, so the timeout is capped to make all of them finish before the
+    lambda function timeout minus :data:`DISCOVERY_TIME_RESERVE`.
+    """
+    timeout = float(DISCOVERY_TIMEOUT) if DISCOVERY_TIMEOUT else None
+    if context is None:
+        return timeout
+    n_round = MAX_CONCURRENT_RUNS * max(
+        [
+            math.ceil(len(table_group_tracker.table_list) / DISCOVERY_MAX_WORKERS)
+            for table_group_tracker in cdc_tracker.table_group_tracker_list
+        ],
+        default=1,
+    )
+    remaining = context.get_remaining_time_in_millis() / 1000 - DISCOVERY_TIME_RESERVE
+    remaining = max(remaining / max(n_round, 1), 1)
+    if timeout is None:
+        return remaining
+    return min(timeout, remaining)
+
+
+def lambda_handler(event, context):
+    """
+    :param event: s3 put event, example:
+        {"Records": [{"eventSource": "aws:s3", "eventName": "ObjectCreated:Put", "s3": {"bucket": {"name": "..."}, "object": {"key": "...", "size": 123}}}]}
+    """
+    cdc_tracker = CDCTracker.read(
+        bsm=bsm,
+        s3path_tracker=S3Path(S3URI_INCREMENTAL_GLUE_JOB_TRACKER),
+        s3dir_glue_job_input=S3Path(S3URI_INCREMENTAL_GLUE_JOB_INPUT).to_dir(),
+        s3dir_dms_output_database=S3Path(S3URI_DMS_OUTPUT_DATABASE).to_dir(),
+        glue_job_name=GLUE_JOB_NAME,
+        epoch_processed_datetime=datetime.fromisoformat(EPOCH_PROCESSED_TIME),
+        s3path_listing_index=S3Path(S3URI_INCREMENTAL_GLUE_JOB_LISTING_INDEX),
+        batch_planner=BatchPlanner(**BATCH_PLANNER),
+        table_group_list=TABLE_GROUP_LIST,
+        max_concurrent_runs=MAX_CONCURRENT_RUNS,
+        s3dir_database=S3Path(S3URI_DATABASE).to_dir(),
+        compaction_glue_job_name=COMPACTION_GLUE_JOB_NAME,
+        compaction_policy=CompactionPolicy(**COMPACTION_POLICY),
+        mor_table_list=MOR_TABLE_LIST,
+        partition_scheme_mapper=PARTITION_SCHEME_MAPPER,
+    )
+    is_started = cdc_tracker.handle_s3_event(
+        bsm=bsm,
+        event=event,
+        trigger_policy=TriggerPolicy(
+            min_bytes=TRIGGER_MIN_BYTES,
+            max_age=TRIGGER_MAX_AGE,
+        ),
+        max_workers=DISCOVERY_MAX_WORKERS,
+        timeout=get_discovery_timeout(context, cdc_tracker),
+    )
+    return {"is_started": is_started}
@@ -5,10 +5,13 @@ from .cdk_deploy import cdk_deploy
 from .cdk_deploy import cdk_deploy_1_iam_role
 from .cdk_deploy import cdk_deploy_2_rds_database
 from .cdk_deploy import cdk_deploy_3_dms
+from .cdk_deploy import cdk_deploy_4_event_driven_orchestrator
 from .cdk_deploy import cdk_destroy
 from .glue_job import run_initial_glue_job
 from .glue_job import run_incremental_glue_job
+from .glue_job import run_incremental_glue_job_on_s3_event
 from .athena import run_athena_query
 from .athena import preview_hudi_table
 from .compare import compare
+from .compare import reconcile
 from .cleanup import cleanup
@@ -4,64 +4,93 @@
 Athena related functions.
 """
 
+import typing as T
+from pathlib import Path
+
 import polars as pl
 
 from .config_init import config
 from .boto_ses import bsm
-from .s3paths import s3dir_athena_result
-from .paths import path_query_result
-from .waiter import Waiter
+from .s3paths import s3dir_athena_result, s3dir_database
+from .paths import path_query_result, dir_athena_result, dir_athena_cache
+from .vendor import aws_athena
+
+athena_result_cache = aws_athena.AthenaResultCache(
+    dir_cache=dir_athena_cache,
+    ttl=24 * 3600,
+)
+
+# the completed hudi instants that change the table data
+hudi_completed_action_list = [
+    "commit",
+    "deltacommit",
+    "replacecommit",
+    "rollback",
+    "restore",
+]
+
+
+def get_hudi_table_commit_time(table: str) -> T.Optional[str]:
+    """
+    Get the latest completed instant time from the hudi table timeline,
+    it is used as the version of the cached query result.
+    """
+    s3dir_timeline = s3dir_database.joinpath(table, ".hoodie").to_dir()
+    commit_time = None
+    for s3path in s3dir_timeline.iter_objects(bsm=bsm, recursive=False):
+        parts = s3path.basename.split(".")
+        if len(parts) == 2 and parts[1] in hudi_completed_action_list:
+            if (commit_time is None) or (parts[0] > commit_time):
+                commit_time = parts[0]
+    return commit_time
 
 
 def run_athena_query(
     database: str,
     sql: str,
     verbose: bool = True,
-) -> pl.DataFrame:
+    lazy: bool = False,
+    files: bool = False,
+    use_cache: bool = False,
+    cache_version: T.Optional[str] = None,
+    stats: T.Optional[aws_athena.AthenaQueryStats] = None,
+) -> T.Union[pl.DataFrame, pl.LazyFrame, T.List[Path]]:
     """
-    Run athena query and get the result as a polars.DataFrame.
+    Run athena query and get the result as a polars.DataFrame. The query
+    result is unloaded as parquet files and read in parallel.
+
+    :param lazy: if True, return a ``polars.LazyFrame``, so the projections
+        are pushed down to the parquet reader. Without ``use_cache``, the
+        parquet files are left in :data:`~rds_to_datalake.paths.dir_athena_result`,
+        clear it after the frame is consumed.
+    :param files: return the list of local parquet files instead, see
+        :func:`~rds_to_datalake.vendor.aws_athena.run_athena_query`.
+    :param use_cache: if True, use the local :data:`athena_result_cache`.
+    :param cache_version: see :func:`get_hudi_table_commit_time`.
+    :param stats: see :class:`~rds_to_datalake.vendor.aws_athena.AthenaQueryStats`.
     """
-    if verbose:
-        print(f"run_athena_query:")
-        print(sql)
-
-    # ref: https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/athena/client/start_query_execution.html
-    response = bsm.athena_client.start_query_execution(
-        QueryString=sql,
-        QueryExecutionContext=dict(
-            Catalog="AwsDataCatalog",
-            Database=database,
-        ),
-        ResultConfiguration=dict(
-            OutputLocation=s3dir_athena_result.uri,
-        ),
+    return aws_athena.run_athena_query(
+        athena_client=bsm.athena_client,
+        s3_client=bsm.s3_client,
+        s3uri_result=s3dir_athena_result.uri,
+        database=database,
+        sql=sql,
+        verbose=verbose,
+        lazy=lazy,
+        files=files,
+        dir_result=dir_athena_result,
+        cache=athena_result_cache if use_cache else None,
+        cache_version=cache_version,
+        stats=stats,
     )
-    exec_id = response["QueryExecutionId"]
 
-    # ref: https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/athena/client/get_query_execution.html
-    for _ in Waiter(
-        delays=1,
-        timeout=10,
-        verbose=verbose,
-    ):
-        response = bsm.athena_client.get_query_execution(
-            QueryExecutionId=exec_id,
-        )
-        status = response["QueryExecution"]["Status"]["State"]
-        if status == "SUCCEEDED":
-            break
-        elif status in ["FAILED", "CANCELLED"]:
-            raise RuntimeError(f"status = {status}")
-        else:
-            pass
-
-    if verbose:
-        print("")
-
-    s3path_athena_result = s3dir_athena_result.joinpath(f"{exec_id}.csv")
-    with s3path_athena_result.open("rb") as f:
-        df = pl.read_csv(f.read())
-    return df
+
+def pin_athena_query_result(database: str, sql: str):
+    """
+    The cached result of the query is not removed within this context, hold
+    it until the ``polars.LazyFrame`` of :func:`run_athena_query` is collected.
+    """
+    return athena_result_cache.pin("AwsDataCatalog", database, sql)
 
 
 def preview_hudi_table(
@@ -71,9 +100,12 @@ def preview_hudi_table(
     Preview the Dynamodb equavilent Hudi table via Athena.
     """
     print(f"preview hudi table '{config.glue_database}.{config.glue_table}'")
+    commit_time = get_hudi_table_commit_time(config.glue_table)
     df = run_athena_query(
         database=config.glue_database,
         sql=f"SELECT * FROM {config.glue_table} LIMIT {limit}",
+        use_cache=True,
+        cache_version=commit_time,
     )
     df.write_csv(str(path_query_result), has_header=True)
     print(f"preview data: file://{path_query_result}")
@@ -81,6 +113,8 @@ def preview_hudi_table(
     df = run_athena_query(
         database=config.glue_database,
         sql=f"SELECT COUNT(*) as n_rows FROM {config.glue_table}",
+        use_cache=True,
+        cache_version=commit_time,
     )
     n_rows = df.to_dicts()[0]["n_rows"]
     print(f"n_rows = {n_rows}")
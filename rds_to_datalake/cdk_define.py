@@ -3,8 +3,11 @@
 # ------------------------------------------------------------------------------
 # Import dependencies
 # ------------------------------------------------------------------------------
+import sys
 import json
+import shutil
 import dataclasses
+import subprocess
 
 import aws_cdk as cdk
 import aws_cdk.aws_s3 as s3
@@ -13,6 +16,10 @@ import aws_cdk.aws_ec2 as ec2
 import aws_cdk.aws_rds as rds
 import aws_cdk.aws_dms as dms
 import aws_cdk.aws_glue as glue
+import aws_cdk.aws_lambda as lambda_
+import aws_cdk.aws_events as events
+import aws_cdk.aws_events_targets as events_targets
+import aws_cdk.aws_s3_notifications as s3_notifications
 
 from constructs import Construct
 
@@ -288,7 +295,7 @@ class Stack(cdk.Stack):
     def declare_glue_job(self):
         default_arguments = {
             "--datalake-formats": "hudi",
-            "--conf": "spark.serializer=org.apache.spark.serializer.KryoSerializer --conf spark.sql.hive.convertMetastoreParquet=false",
+            "--conf": "spark.serializer=org.apache.spark.serializer.KryoSerializer --conf spark.sql.hive.convertMetastoreParquet=false --conf spark.scheduler.mode=FAIR",
             "--enable-metrics": "true",
             "--enable-spark-ui": "true",
             "--enable-job-insights": "false",
@@ -299,6 +306,7 @@ class Stack(cdk.Stack):
             "--spark-event-logs-path": f"s3://{self.config.s3_bucket_glue_assets}/sparkHistoryLogs/",
             "--TempDir": f"s3://{self.config.s3_bucket_glue_assets}/temporary/",
             "--additional-python-modules": "boto_session_manager==1.5.3,s3pathlib==2.0.1",
+            "--extra-py-files": s3paths.s3path_hudi_partition_glue_lib.uri,
         }
 
         self.glue_job_initial_load = glue.CfnJob(
@@ -323,6 +331,12 @@ class Stack(cdk.Stack):
                 "--S3URI_DMS_OUTPUT_DATABASE": s3paths.s3dir_dms_output_database.uri,
                 "--S3URI_DATABASE": s3paths.s3dir_database.uri,
                 "--DATABASE_NAME": self.config.glue_database,
+                "--DIAGNOSTICS": self.config.glue_diagnostics,
+                "--MAX_TABLE_CONCURRENCY": str(self.config.glue_max_table_concurrency),
+                "--PARTITION_SCHEME_MAPPER": json.dumps(
+                    self.config.hudi_partition_scheme_mapper
+                ),
+                "--TABLE_TYPE_MAPPER": json.dumps(self.config.hudi_table_type_mapper),
                 "--CODE_ETAG": s3paths.s3path_initial_load_glue_script.etag,
             },
         )
@@ -340,7 +354,7 @@ class Stack(cdk.Stack):
             worker_type="G.1X",
             number_of_workers=2,
             execution_property=glue.CfnJob.ExecutionPropertyProperty(
-                max_concurrent_runs=1,
+                max_concurrent_runs=self.config.incremental_max_concurrent_runs,
             ),
             max_retries=0,
             timeout=60,
@@ -350,10 +364,288 @@ class Stack(cdk.Stack):
                 "--S3URI_DATABASE": s3paths.s3dir_database.uri,
                 "--S3URI_INCREMENTAL_GLUE_JOB_INPUT": s3paths.s3dir_incremental_glue_job_input.uri,
                 "--DATABASE_NAME": self.config.glue_database,
+                "--DIAGNOSTICS": self.config.glue_diagnostics,
+                "--MAX_TABLE_CONCURRENCY": str(self.config.glue_max_table_concurrency),
+                "--DEDUP_MODE": self.config.glue_dedup_mode,
+                "--PARTITION_SCHEME_MAPPER": json.dumps(
+                    self.config.hudi_partition_scheme_mapper
+                ),
+                "--TABLE_TYPE_MAPPER": json.dumps(self.config.hudi_table_type_mapper),
                 "--CODE_ETAG": s3paths.s3path_incremental_glue_script.etag,
             },
         )
 
+        # run on demand by rds_to_datalake.glue_job.run_repartition_glue_job
+        self.glue_job_repartition = glue.CfnJob(
+            self,
+            "GlueJobRepartition",
+            name=self.config.glue_job_name_repartition,
+            role=self.glue_role.role_arn,
+            command=glue.CfnJob.JobCommandProperty(
+                name="glueetl",
+                script_location=s3paths.s3path_repartition_glue_script.uri,
+            ),
+            glue_version="4.0",
+            worker_type="G.1X",
+            number_of_workers=2,
+            execution_property=glue.CfnJob.ExecutionPropertyProperty(
+                max_concurrent_runs=1,
+            ),
+            max_retries=0,
+            timeout=60,
+            default_arguments={
+                **default_arguments,
+                "--S3URI_DATABASE": s3paths.s3dir_database.uri,
+                "--S3URI_DATABASE_STAGING": s3paths.s3dir_database_staging.uri,
+                "--DATABASE_NAME": self.config.glue_database,
+                "--PARTITION_SCHEME_MAPPER": json.dumps(
+                    self.config.hudi_partition_scheme_mapper
+                ),
+                "--TABLE_TYPE_MAPPER": json.dumps(self.config.hudi_table_type_mapper),
+                "--CODE_ETAG": s3paths.s3path_repartition_glue_script.etag,
+            },
+        )
+
+        # run by the orchestrator, see CDCTracker.try_to_run_glue_job
+        self.glue_job_compaction = glue.CfnJob(
+            self,
+            "GlueJobCompaction",
+            name=self.config.glue_job_name_compaction,
+            role=self.glue_role.role_arn,
+            command=glue.CfnJob.JobCommandProperty(
+                name="glueetl",
+                script_location=s3paths.s3path_compaction_glue_script.uri,
+            ),
+            glue_version="4.0",
+            worker_type="G.1X",
+            number_of_workers=2,
+            execution_property=glue.CfnJob.ExecutionPropertyProperty(
+                max_concurrent_runs=self.config.incremental_max_concurrent_runs,
+            ),
+            max_retries=0,
+            timeout=60,
+            default_arguments={
+                **default_arguments,
+                "--conf": (
+                    default_arguments["--conf"]
+                    + " --conf spark.sql.extensions="
+                    + "org.apache.spark.sql.hudi.HoodieSparkSessionExtension"
+                ),
+                "--S3URI_DATABASE": s3paths.s3dir_database.uri,
+                "--CODE_ETAG": s3paths.s3path_compaction_glue_script.etag,
+            },
+        )
+
+    def declare_lambda_function(self):
+        build_lambda_function_source()
+        build_lambda_layer_source()
+
+        # the dynamodb stream consumer and the dynamodb export to s3 post
+        # processor lambda functions import ``rds_to_datalake`` and polars,
+        # attach this layer to them
+        self.lambda_layer = lambda_.LayerVersion(
+            self,
+            "LambdaLayer",
+            layer_version_name=self.config.lambda_layer_name,
+            code=lambda_.Code.from_asset(str(paths.dir_build_lambda_layer)),
+            compatible_runtimes=[lambda_.Runtime.PYTHON_3_10],
+        )
+        self.output_lambda_layer_arn = cdk.CfnOutput(
+            self,
+            self.config.lambda_layer_arn_output_id,
+            value=self.lambda_layer.layer_version_arn,
+        )
+
+        # the discovery of a table has to give up before the lambda function
+        # times out, the handler also caps it with the remaining time
+        if (self.config.incremental_discovery_timeout is not None) and (
+            self.config.incremental_discovery_timeout
+            >= lambda_orchestrator_timeout // 2
+        ):
+            raise ValueError(
+                f"incremental_discovery_timeout has to be less than "
+                f"{lambda_orchestrator_timeout // 2} seconds, "
+                f"half of the orchestrator lambda function timeout!"
+            )
+
+        # the orchestrator reads, modifies and writes the tracker and the
+        # listing index on s3 without lock, the invocations must be serialized.
+        # The throttled async invocations (s3 and scheduled events) are retried.
+        # Don't run the s3_orchestrate_incremental_glue_job.py polling script
+        # at the same time.
+        self.lambda_func_incremental_glue_job_orchestrator = lambda_.Function(
+            self,
+            "LambdaFunctionIncrementalGlueJobOrchestrator",
+            function_name=self.config.lambda_function_name_incremental_glue_job_orchestrator,
+            code=lambda_.Code.from_asset(str(paths.dir_build_lambda)),
+            handler="incremental_glue_job_orchestrator.lambda_handler",
+            runtime=lambda_.Runtime.PYTHON_3_10,
+            role=self.lambda_role,
+            memory_size=512,
+            timeout=cdk.Duration.seconds(lambda_orchestrator_timeout),
+            reserved_concurrent_executions=1,
+            environment={
+                "S3URI_INCREMENTAL_GLUE_JOB_TRACKER": s3paths.s3path_incremental_glue_job_tracker.uri,
+                "S3URI_INCREMENTAL_GLUE_JOB_INPUT": s3paths.s3dir_incremental_glue_job_input.uri,
+                "S3URI_INCREMENTAL_GLUE_JOB_LISTING_INDEX": s3paths.s3path_incremental_glue_job_listing_index.uri,
+                "S3URI_DMS_OUTPUT_DATABASE": s3paths.s3dir_dms_output_database.uri,
+                "GLUE_JOB_NAME": self.config.glue_job_name_incremental,
+                "BATCH_PLANNER": json.dumps(
+                    dict(
+                        max_files_per_table=self.config.incremental_max_files_per_table,
+                        max_bytes_per_table=self.config.incremental_max_bytes_per_table,
+                        max_rows_per_table=self.config.incremental_max_rows_per_table,
+                        max_bytes_per_run=self.config.incremental_max_bytes_per_run,
+                        bytes_per_row=self.config.incremental_bytes_per_row,
+                    )
+                ),
+                "TABLE_GROUP_LIST": json.dumps(
+                    self.config.incremental_table_group_list
+                ),
+                "MAX_CONCURRENT_RUNS": str(
+                    self.config.incremental_max_concurrent_runs
+                ),
+                "TRIGGER_MIN_BYTES": str(self.config.incremental_trigger_min_bytes),
+                "TRIGGER_MAX_AGE": str(self.config.incremental_trigger_max_age),
+                "DISCOVERY_MAX_WORKERS": str(
+                    self.config.incremental_discovery_max_workers
+                ),
+                "DISCOVERY_TIMEOUT": (
+                    ""
+                    if self.config.incremental_discovery_timeout is None
+                    else str(self.config.incremental_discovery_timeout)
+                ),
+                "S3URI_DATABASE": s3paths.s3dir_database.uri,
+                "COMPACTION_GLUE_JOB_NAME": self.config.glue_job_name_compaction,
+                "COMPACTION_POLICY": json.dumps(
+                    dict(
+                        max_delta_commits=self.config.compaction_max_delta_commits,
+                        max_age=self.config.compaction_max_age,
+                    )
+                ),
+                "MOR_TABLE_LIST": json.dumps(self.config.hudi_mor_table_list),
+                "PARTITION_SCHEME_MAPPER": json.dumps(
+                    self.config.hudi_partition_scheme_mapper
+                ),
+            },
+        )
+
+        # the new cdc data files
+        self.s3_bucket_data.add_event_notification(
+            s3.EventType.OBJECT_CREATED,
+            s3_notifications.LambdaDestination(
+                self.lambda_func_incremental_glue_job_orchestrator
+            ),
+            s3.NotificationKeyFilter(
+                prefix=s3paths.s3dir_dms_output_database.joinpath("public").to_dir().key,
+                suffix=".parquet",
+            ),
+        )
+
+        # check the max age threshold even if there's no new cdc data file
+        self.event_rule_incremental_glue_job_orchestrator = events.Rule(
+            self,
+            "EventRuleIncrementalGlueJobOrchestrator",
+            schedule=events.Schedule.rate(cdk.Duration.minutes(5)),
+            targets=[
+                events_targets.LambdaFunction(
+                    self.lambda_func_incremental_glue_job_orchestrator
+                ),
+            ],
+        )
+
+
+# the orchestrator lambda function timeout in seconds
+lambda_orchestrator_timeout = 300
+
+# the third party libraries of the lambda function, the same version as the
+# glue job --additional-python-modules
+lambda_requirements = [
+    "boto_session_manager==1.5.3",
+    "s3pathlib==2.0.1",
+]
+
+
+def build_lambda_function_source():
+    """
+    Build the lambda function deployment package in ``build/lambda``, the
+    orchestrator handler, the ``rds_to_datalake`` package and its third
+    party libraries.
+    """
+    shutil.rmtree(paths.dir_build_lambda.abspath, ignore_errors=True)
+    paths.dir_build_lambda.mkdir_if_not_exists()
+    shutil.copy(
+        paths.path_lbd_func_incremental_glue_job_orchestrator.abspath,
+        paths.dir_build_lambda.joinpath(
+            paths.path_lbd_func_incremental_glue_job_orchestrator.basename
+        ).abspath,
+    )
+    shutil.copytree(
+        paths.dir_python_lib.abspath,
+        paths.dir_build_lambda.joinpath(paths.dir_python_lib.basename).abspath,
+        ignore=shutil.ignore_patterns("__pycache__", "*.pyc"),
+    )
+    subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "pip",
+            "install",
+            *lambda_requirements,
+            "--target",
+            paths.dir_build_lambda.abspath,
+            "--disable-pip-version-check",
+            "--quiet",
+        ],
+        check=True,
+    )
+
+
+# the third party libraries of the lambda layer, polars is used by the
+# parquet output and the compaction of the dynamodb lambda functions
+lambda_layer_requirements = [
+    *lambda_requirements,
+    "polars>=0.18.0,<0.19.0",
+]
+
+
+def build_lambda_layer_source():
+    """
+    Build the lambda layer in ``build/lambda_layer``, the ``rds_to_datalake``
+    package and its third party libraries under the ``python`` folder. The
+    libraries are the linux wheels of the lambda runtime, polars has
+    platform specific binaries.
+    """
+    shutil.rmtree(paths.dir_build_lambda_layer.abspath, ignore_errors=True)
+    dir_python = paths.dir_build_lambda_layer.joinpath("python")
+    dir_python.mkdir_if_not_exists()
+    shutil.copytree(
+        paths.dir_python_lib.abspath,
+        dir_python.joinpath(paths.dir_python_lib.basename).abspath,
+        ignore=shutil.ignore_patterns("__pycache__", "*.pyc"),
+    )
+    subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "pip",
+            "install",
+            *lambda_layer_requirements,
+            "--target",
+            dir_python.abspath,
+            "--platform",
+            "manylinux2014_x86_64",
+            "--implementation",
+            "cp",
+            "--python-version",
+            "3.10",
+            "--only-binary=:all:",
+            "--disable-pip-version-check",
+            "--quiet",
+        ],
+        check=True,
+    )
+
 
 def pre_app_synth():
     s3paths.s3path_initial_load_glue_script.write_text(
@@ -366,6 +658,21 @@ def pre_app_synth():
         content_type="text/plain",
     )
 
+    s3paths.s3path_repartition_glue_script.write_text(
+        paths.path_glue_script_repartition.read_text(),
+        content_type="text/plain",
+    )
+
+    s3paths.s3path_compaction_glue_script.write_text(
+        paths.path_glue_script_compaction.read_text(),
+        content_type="text/plain",
+    )
+
+    s3paths.s3path_hudi_partition_glue_lib.write_text(
+        paths.path_glue_lib_hudi_partition.read_text(),
+        content_type="text/plain",
+    )
+
 
 @dataclasses.dataclass
 class ResourceActivationConfig:
@@ -375,6 +682,7 @@ class ResourceActivationConfig:
     declare_dms: bool = dataclasses.field(default=False)
     declare_glue_catalog: bool = dataclasses.field(default=False)
     declare_glue_job: bool = dataclasses.field(default=False)
+    declare_lambda_function: bool = dataclasses.field(default=False)
 
     @classmethod
     def read(cls):
@@ -422,5 +730,7 @@ def app_synth():
         stack.declare_glue_catalog()
     if resource_activation_config.declare_glue_job:
         stack.declare_glue_job()
+    if resource_activation_config.declare_lambda_function:
+        stack.declare_lambda_function()
 
     app.synth()
@@ -18,6 +18,13 @@ def get_cloudformation_stack_console_url(
     )
 
 
+def _clear_outputs_cache():
+    # the stack outputs may change, e.g. the database host
+    from .cdk_export import Outputs
+
+    Outputs.clear_cache()
+
+
 def cdk_deploy():
     print(
         f"🚀 You are deploying stack to AWS Account {config.aws_account_id}, "
@@ -38,6 +45,7 @@ def cdk_deploy():
             config.aws_profile,
         ]
         subprocess.run(args, check=True)
+    _clear_outputs_cache()
 
 
 def cdk_deploy_1_iam_role():
@@ -73,6 +81,24 @@ def cdk_deploy_3_dms():
     cdk_deploy()
 
 
+def cdk_deploy_4_event_driven_orchestrator():
+    """
+    Also deploy the event driven incremental glue job orchestrator lambda
+    function, it replaces the s3_orchestrate_incremental_glue_job.py polling
+    script, don't run both.
+    """
+    resource_activation_config = ResourceActivationConfig()
+    resource_activation_config.declare_s3_bucket = True
+    resource_activation_config.declare_iam_role = True
+    resource_activation_config.declare_glue_catalog = True
+    resource_activation_config.declare_glue_job = True
+    resource_activation_config.declare_rds_database = True
+    resource_activation_config.declare_dms = True
+    resource_activation_config.declare_lambda_function = True
+    resource_activation_config.write()
+    cdk_deploy()
+
+
 def cdk_destroy():
     print(
         f"🔥 You are destroying stack from AWS Account {config.aws_account_id}, "
@@ -91,3 +117,4 @@ def cdk_destroy():
             config.aws_profile,
         ]
         subprocess.run(args, check=True)
+    _clear_outputs_cache()
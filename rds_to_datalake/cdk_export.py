@@ -1,8 +1,12 @@
 # -*- coding: utf-8 -*-
 
 import dataclasses
+
+import diskcache
+
 from .config_init import config
 from .boto_ses import bsm
+from .paths import dir_cdk_outputs_cache
 
 
 @dataclasses.dataclass
@@ -10,7 +14,26 @@ class Outputs:
     db_instance_host: str
 
     @classmethod
-    def read(cls):
+    def read(cls, use_cache: bool = False, ttl: int = 3600):
+        """
+        Read the CloudFormation stack outputs.
+
+        :param use_cache: if True, use the outputs cached on local disk in the
+            last ``ttl`` seconds, it saves a ``describe_stacks`` API call.
+        """
+        if use_cache:
+            with diskcache.Cache(str(dir_cdk_outputs_cache)) as cache:
+                data = cache.get(config.cloudformation_stack_name)
+                if data is not None:
+                    return cls(**data)
+                outputs = cls.read()
+                cache.set(
+                    config.cloudformation_stack_name,
+                    dataclasses.asdict(outputs),
+                    expire=ttl,
+                )
+                return outputs
+
         res = bsm.cloudformation_client.describe_stacks(
             StackName=config.cloudformation_stack_name,
         )
@@ -20,3 +43,8 @@ class Outputs:
         return cls(
             db_instance_host=outputs[config.db_instance_host_output_id],
         )
+
+    @classmethod
+    def clear_cache(cls):
+        with diskcache.Cache(str(dir_cdk_outputs_cache)) as cache:
+            cache.delete(config.cloudformation_stack_name)
@@ -1,88 +1,398 @@
 # -*- coding: utf-8 -*-
 
 import typing as T
+import json
+import time
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
 
+import polars as pl
 import sqlalchemy as sa
 from rich import print as rprint
 
 from .config_init import config
+from .boto_ses import bsm
+from .paths import path_compare_report
 from .db_connect import create_engine_for_this_project
 from .db_orm import table_name_list, get_table_def
-from .athena import run_athena_query
+from .hudi_partition import get_partition_columns
+from .athena import (
+    run_athena_query,
+    pin_athena_query_result,
+    get_hudi_table_commit_time,
+)
+from .vendor.table_diff import (
+    DiffReport,
+    iter_sqlalchemy_chunks,
+    iter_sqlalchemy_frames,
+    iter_postgres_copy_frames,
+    iter_sorted_parquet_files,
+    iter_rows,
+    collect_sorted_rows,
+    compare_sorted,
+    compare_hash_buckets,
+)
+from .vendor.merkle_diff import Side, ReconcileReport, reconcile as _reconcile
+from .vendor.aws_athena import AthenaQueryStats
 
 
 T_RECORDS = T.List[T.Dict[str, T.Any]]
 
 
+def get_columns_to_drop(table_name: str, columns: T.List[str]) -> T.List[str]:
+    """
+    Get the Hudi meta columns and the partition columns of the Hudi table,
+    they are not in RDS.
+    """
+    partition_columns = get_partition_columns(
+        config.get_hudi_partition_scheme(table_name)
+    )
+    return [
+        column
+        for column in columns
+        if column.startswith("_hoodie") or column in partition_columns
+    ]
+
+
 def read_from_rds_table(
     engine: sa.engine.Engine,
     table_name: str,
+    chunk_size: int = 10000,
 ) -> T_RECORDS:
+    """
+    Read all rows sorted by id. The rows are fetched with a server-side
+    cursor, ``chunk_size`` rows at a time, use :func:`iter_rds_table_chunks`
+    or :func:`iter_rds_table_frames` to stream a large table.
+    """
     table = get_table_def(table_name)
-    rows = list()
-    with engine.connect() as conn:
-        stmt = sa.select(table).order_by(table.c.id)
-        for row in conn.execute(stmt).mappings():
-            rows.append(dict(row))
-    return rows
+    stmt = sa.select(table).order_by(table.c.id)
+    return list(iter_rows(iter_sqlalchemy_chunks(engine, stmt, chunk_size)))
 
 
 def read_from_hudi_table(
     table_name: str,
 ) -> T_RECORDS:
-    df = run_athena_query(
-        database=config.glue_database,
-        sql=f"SELECT * FROM {config.glue_database}.{table_name} ORDER BY id",
-        verbose=False,
-    )
-    columns_to_drop = [
-        "create_year",
-        "create_month",
-        "create_day",
-        "create_hour",
-        "create_minute",
-    ]
-    for column in df.columns:
-        if column.startswith("_hoodie"):
-            columns_to_drop.append(column)
-    rows = df.drop(columns_to_drop).to_dicts()
-    return rows
-
-
-def compare_table(engine: sa.engine.Engine, table_name: str):
-    print(f"--- Compare table {table_name!r} ---")
-    rds_rows = read_from_rds_table(engine, table_name)
-    dl_rows = read_from_hudi_table(table_name)
-    n_rds_rows = len(rds_rows)
-    n_dl_rows = len(dl_rows)
-    print(f"n_rds_rows: {n_rds_rows}")
-    print(f"n_dl_rows: {n_dl_rows}")
-    if n_rds_rows != n_dl_rows:
-        raise ValueError("n_rds_rows != n_dl_rows")
+    athena_table = config.get_athena_table_name(table_name)
+    sql = f"SELECT * FROM {config.glue_database}.{athena_table} ORDER BY id"
+    # the cached files are read when the lazy frame is collected
+    with pin_athena_query_result(config.glue_database, sql):
+        lazy_df = run_athena_query(
+            database=config.glue_database,
+            sql=sql,
+            verbose=False,
+            lazy=True,
+            use_cache=True,
+            cache_version=get_hudi_table_commit_time(table_name),
+        )
+        columns_to_drop = get_columns_to_drop(table_name, lazy_df.columns)
+        # the dropped columns are never read from the parquet files,
+        # the unload result may have many files, so we sort it again
+        return collect_sorted_rows(
+            lazy_df, key="id", columns_to_drop=columns_to_drop
+        )
+
+
+def iter_rds_table_chunks(
+    engine: sa.engine.Engine,
+    table_name: str,
+    chunk_size: int = 10000,
+    order_by_id: bool = True,
+) -> T.Iterator[T_RECORDS]:
+    """
+    Read the RDS table in chunks with a server-side cursor.
+
+    :param order_by_id: if True, sort by id in the byte order (``COLLATE "C"``),
+        which is the same as the Athena varchar order.
+    """
+    table = get_table_def(table_name)
+    stmt = sa.select(table)
+    if order_by_id:
+        stmt = stmt.order_by(table.c.id.collate("C"))
+    yield from iter_sqlalchemy_chunks(engine, stmt, chunk_size)
+
+
+def iter_rds_table_frames(
+    engine: sa.engine.Engine,
+    table_name: str,
+    chunk_size: int = 100000,
+    order_by_id: bool = True,
+    use_copy: bool = False,
+) -> T.Iterator[pl.DataFrame]:
+    """
+    Read the RDS table in chunks of ``polars.DataFrame``.
+
+    :param use_copy: if True, export the table with ``COPY ... TO STDOUT``,
+        see :func:`~rds_to_datalake.vendor.table_diff.iter_postgres_copy_frames`.
+        Otherwise, use a server-side cursor.
+    """
+    table = get_table_def(table_name)
+    stmt = sa.select(table)
+    if order_by_id:
+        stmt = stmt.order_by(table.c.id.collate("C"))
+    if use_copy:
+        yield from iter_postgres_copy_frames(engine, stmt, chunk_size)
     else:
-        print("NICE! n_rds_rows == n_dl_rows")
-
-    # print first 10 rows that are different
-    is_same = True
-    diff_count = 0
-    for rds_row, dl_row in zip(rds_rows, dl_rows):
-        if rds_row != dl_row:
-            is_same = False
-            diff_count += 1
-            if diff_count <= 10:
-                print(f"rds_row: {rds_row}")
-                print(f"dl_row: {dl_row}")
-
-    if is_same is True:
+        yield from iter_sqlalchemy_frames(engine, stmt, chunk_size)
+
+
+def iter_hudi_table_pages(
+    table_name: str,
+    page_size: int = 1000000,
+    stats: T.Optional[AthenaQueryStats] = None,
+) -> T.Iterator[T_RECORDS]:
+    """
+    Read the Hudi table sorted by id, page by page. The table is read by one
+    ``UNLOAD`` query, its parquet parts are not sorted across the files, so
+    they are sorted one by one and merged locally, see
+    :func:`~rds_to_datalake.vendor.table_diff.iter_sorted_parquet_files`.
+    About ``page_size`` rows are in memory.
+    """
+    athena_table = config.get_athena_table_name(table_name)
+    sql = f"SELECT * FROM {config.glue_database}.{athena_table}"
+    # the cached files are read after the query returns
+    with pin_athena_query_result(config.glue_database, sql):
+        path_list = run_athena_query(
+            database=config.glue_database,
+            sql=sql,
+            verbose=False,
+            files=True,
+            use_cache=True,
+            cache_version=get_hudi_table_commit_time(table_name),
+            stats=stats,
+        )
+        columns = list()
+        for path in path_list:
+            columns = pl.scan_parquet(str(path)).columns
+            if len(columns):
+                break
+        yield from iter_sorted_parquet_files(
+            path_list,
+            key="id",
+            chunk_size=page_size,
+            columns_to_drop=get_columns_to_drop(table_name, columns),
+        )
+
+
+def print_report(report: DiffReport):
+    print(f"n_rds_rows: {report.n_left}")
+    print(f"n_dl_rows: {report.n_right}")
+    if report.is_same:
         print("NICE! The data in rds and hudi are exactly the same.")
     else:
         print("OPS! The data in rds and hudi are not the same.")
+        print(f"missing in hudi: {report.n_missing}, e.g. {report.missing_keys}")
+        print(f"extra in hudi: {report.n_extra}, e.g. {report.extra_keys}")
+        print(f"changed: {report.n_changed}, by column {report.column_diff_count}")
+        for changed_row in report.changed_rows:
+            rprint(changed_row)
+
+
+def compare_table(
+    engine: sa.engine.Engine,
+    table_name: str,
+    mode: str = "merge",
+    chunk_size: int = 10000,
+    page_size: int = 1000000,
+    max_samples: int = 10,
+    verbose: bool = True,
+    stats: T.Optional[AthenaQueryStats] = None,
+) -> DiffReport:
+    """
+    Compare the rows in RDS and Hudi by id, in constant memory.
+
+    :param mode: "merge" merge-joins both sides sorted by id, "hash" doesn't
+        sort the RDS side and compares both sides in local hash buckets.
+    :param chunk_size: the fetch size of the RDS server-side cursor.
+    :param page_size: about the number of Hudi rows in memory, see
+        :func:`iter_hudi_table_pages`.
+    :param stats: collect the Athena usage of this table.
+    """
+    if verbose:
+        print(f"--- Compare table {table_name!r} ---")
+    rds_rows = iter_rows(
+        iter_rds_table_chunks(
+            engine,
+            table_name,
+            chunk_size=chunk_size,
+            order_by_id=mode == "merge",
+        )
+    )
+    dl_rows = iter_rows(
+        iter_hudi_table_pages(table_name, page_size=page_size, stats=stats)
+    )
+    if mode == "merge":
+        report = compare_sorted(rds_rows, dl_rows, key="id", max_samples=max_samples)
+    elif mode == "hash":
+        report = compare_hash_buckets(
+            rds_rows, dl_rows, key="id", max_samples=max_samples
+        )
+    else:
+        raise ValueError(f"invalid mode {mode!r}, must be 'merge' or 'hash'")
+    if verbose:
+        print_report(report)
+    return report
+
+
+def reconcile_table(
+    engine: sa.engine.Engine,
+    table_name: str,
+    leaf_size: int = 1000,
+    max_samples: int = 10,
+    verbose: bool = True,
+    stats: T.Optional[AthenaQueryStats] = None,
+) -> ReconcileReport:
+    """
+    Compare the rows in RDS and Hudi with per-range aggregate hashes computed
+    by Postgres and Athena, only the rows of the differing ranges are read.
+    See :mod:`rds_to_datalake.vendor.merkle_diff`.
+    """
+    if verbose:
+        print(f"--- Reconcile table {table_name!r} ---")
+    columns = [column.name for column in get_table_def(table_name).columns]
+    commit_time = get_hudi_table_commit_time(table_name)
+
+    def query_rds(sql: str) -> T_RECORDS:
+        with engine.connect() as conn:
+            return [dict(row) for row in conn.execute(sa.text(sql)).mappings()]
+
+    def query_hudi(sql: str) -> T_RECORDS:
+        df = run_athena_query(
+            database=config.glue_database,
+            sql=sql,
+            verbose=False,
+            use_cache=True,
+            cache_version=commit_time,
+            stats=stats,
+        )
+        return df.to_dicts()
+
+    report = _reconcile(
+        left=Side(query=query_rds, dialect="postgresql", table=table_name),
+        right=Side(
+            query=query_hudi,
+            dialect="athena",
+            table=f"{config.glue_database}.{config.get_athena_table_name(table_name)}",
+        ),
+        columns=columns,
+        key="id",
+        leaf_size=leaf_size,
+        max_samples=max_samples,
+    )
+    if verbose:
+        print(
+            f"{report.n_query} queries, {report.n_level} levels, "
+            f"{report.n_fetched} rows fetched"
+        )
+        print_report(report)
+    return report
+
+
+def run_table_task(
+    engine: sa.engine.Engine,
+    table_name: str,
+    mode: str = "merge",
+) -> dict:
+    """
+    Compare one table without printing, and summarize the result, the Athena
+    usage and the wall time as a JSON serializable dict. The exception is
+    reported instead of raised, so one table doesn't stop the others.
+    """
+    stats = AthenaQueryStats()
+    start = time.perf_counter()
+    result = {"table": table_name, "mode": mode}
+    try:
+        if mode == "reconcile":
+            report = reconcile_table(engine, table_name, verbose=False, stats=stats)
+        else:
+            report = compare_table(
+                engine, table_name, mode=mode, verbose=False, stats=stats
+            )
+        result["status"] = "same" if report.is_same else "different"
+        result["n_rds_rows"] = report.n_left
+        result["n_dl_rows"] = report.n_right
+        result["n_same"] = report.n_same
+        result["n_missing"] = report.n_missing
+        result["n_extra"] = report.n_extra
+        result["n_changed"] = report.n_changed
+        result["column_diff_count"] = report.column_diff_count
+        result["missing_keys"] = report.missing_keys
+        result["extra_keys"] = report.extra_keys
+        result["changed_rows"] = report.changed_rows
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = repr(e)
+    result["athena"] = stats.to_dict()
+    result["elapsed"] = round(time.perf_counter() - start, 3)
+    return result
 
 
-def compare():
+def compare(
+    table_names: T.Optional[T.List[str]] = None,
+    mode: str = "merge",
+    max_workers: int = 4,
+    path_report=path_compare_report,
+) -> dict:
     """
     Compare the data in RDS and Hudi, see if they are exactly the same.
+    The tables are compared concurrently in a thread pool, the reads are
+    I/O bound. It writes a JSON report for dashboards.
+
+    :param table_names: default is all tables.
+    :param mode: "merge", "hash" (see :func:`compare_table`) or "reconcile"
+        (see :func:`reconcile_table`).
     """
+    if table_names is None:
+        table_names = table_name_list
     engine = create_engine_for_this_project()
-    for table_name in table_name_list:
-        compare_table(engine, table_name)
+    start = time.perf_counter()
+    # boto session manager creates the client lazily, make sure it is
+    # created before sharing it between threads
+    _ = bsm.athena_client
+    _ = bsm.s3_client
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        result_list = list(
+            executor.map(
+                lambda table_name: run_table_task(engine, table_name, mode),
+                table_names,
+            )
+        )
+    status_list = [result["status"] for result in result_list]
+    report = {
+        "create_time": datetime.now(timezone.utc).isoformat(),
+        "mode": mode,
+        "elapsed": round(time.perf_counter() - start, 3),
+        "n_table": len(result_list),
+        "n_same": status_list.count("same"),
+        "n_different": status_list.count("different"),
+        "n_error": status_list.count("error"),
+        "data_scanned_bytes": sum(
+            [result["athena"]["data_scanned_bytes"] for result in result_list]
+        ),
+        "tables": result_list,
+    }
+    for result in result_list:
+        print(
+            f"{result['table']}: {result['status']}, "
+            f"rds {result.get('n_rds_rows')} rows, "
+            f"hudi {result.get('n_dl_rows')} rows, "
+            f"scanned {result['athena']['data_scanned_bytes']} bytes, "
+            f"{result['elapsed']} sec"
+        )
+        if result["status"] == "error":
+            print(f"  {result['error']}")
+    path_report.parent.mkdir(parents=True, exist_ok=True)
+    # the sample values may be datetime or decimal
+    path_report.write_text(json.dumps(report, indent=4, default=str))
+    print(f"compare report: file://{path_report}")
+    return report
+
+
+def reconcile(
+    table_names: T.Optional[T.List[str]] = None,
+    max_workers: int = 4,
+) -> dict:
+    """
+    Reconcile the data in RDS and Hudi with aggregate hashes, it only reads
+    a few summary rows per table when the data matches.
+    """
+    return compare(table_names=table_names, mode="reconcile", max_workers=max_workers)
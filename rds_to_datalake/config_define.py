@@ -20,6 +20,53 @@ class Config:
     :param aws_profile: AWS cli profile for this project
     :param glue_database: glue catalog database name
     :param glue_table: glue catalog table name
+    :param incremental_discovery_max_workers: number of tables to discover
+        the new cdc data files concurrently before each incremental glue job run.
+    :param incremental_discovery_timeout: per table cdc data files discovery
+        timeout in seconds, None means no timeout.
+    :param incremental_max_files_per_table: max number of cdc data files
+        per table per incremental glue job run.
+    :param incremental_max_bytes_per_table: max total size of cdc data files
+        per table per incremental glue job run, None means no limit.
+    :param incremental_max_rows_per_table: max estimated number of rows
+        per table per incremental glue job run, None means no limit.
+    :param incremental_max_bytes_per_run: max total size of cdc data files
+        of all tables per incremental glue job run, None means no limit.
+    :param incremental_bytes_per_row: the estimated cdc parquet bytes per row,
+        it is used to estimate the number of rows from the object size.
+    :param incremental_table_group_list: list of table groups, each group is
+        processed by its own incremental glue job run. None means all tables
+        are in one group.
+    :param incremental_max_concurrent_runs: max number of concurrent
+        incremental glue job runs.
+    :param incremental_trigger_min_bytes: the event driven orchestrator starts
+        a run when the pending cdc data files reach this size.
+    :param incremental_trigger_max_age: the event driven orchestrator starts
+        a run when the oldest pending cdc data file is older than this
+        (in seconds).
+    :param glue_diagnostics: the diagnostics level of the glue jobs, "off",
+        "sampled" (schema and first rows) or "full" (also the row counts).
+    :param glue_max_table_concurrency: max number of tables processed
+        concurrently in one glue job run.
+    :param glue_dedup_mode: how the incremental glue job keeps the latest
+        version of each record, "aggregate" (one group by aggregation) or
+        "precombine" (let hudi do it before the upsert).
+    :param hudi_partition_scheme_mapper: the partition scheme per table, see
+        :mod:`rds_to_datalake.hudi_partition`, the default is "minute". After
+        changing the scheme of an existing table, deploy it, then run the
+        repartition glue job to migrate it. The incremental glue job of the
+        table is held by the orchestrator until the migration is finished.
+    :param hudi_table_type_mapper: the hudi table type per table,
+        "COPY_ON_WRITE" (the default) or "MERGE_ON_READ". The incremental glue
+        job only appends log files to a MERGE_ON_READ table, they are merged
+        into the base files by the compaction glue job. Athena reads the
+        read optimized view from ``{table}`` and the real time view from
+        ``{table}_rt``. After changing the type of an existing table, run the
+        repartition glue job to migrate it.
+    :param compaction_max_delta_commits: compact a MERGE_ON_READ table when
+        there are this many delta commits since the last compaction.
+    :param compaction_max_age: compact a MERGE_ON_READ table when the oldest
+        delta commit since the last compaction is older than this (in seconds).
     """
 
     app_name: str
@@ -31,6 +78,34 @@ class Config:
     database: str
     username: str
     password: str
+    incremental_discovery_max_workers: int = dataclasses.field(default=16)
+    incremental_discovery_timeout: T.Optional[int] = dataclasses.field(default=30)
+    incremental_max_files_per_table: int = dataclasses.field(default=1000)
+    incremental_max_bytes_per_table: T.Optional[int] = dataclasses.field(
+        default=128 * 1024 * 1024
+    )
+    incremental_max_rows_per_table: T.Optional[int] = dataclasses.field(default=None)
+    incremental_max_bytes_per_run: T.Optional[int] = dataclasses.field(
+        default=512 * 1024 * 1024
+    )
+    incremental_bytes_per_row: int = dataclasses.field(default=100)
+    incremental_table_group_list: T.Optional[T.List[T.List[str]]] = dataclasses.field(
+        default=None
+    )
+    incremental_max_concurrent_runs: int = dataclasses.field(default=1)
+    incremental_trigger_min_bytes: int = dataclasses.field(default=64 * 1024 * 1024)
+    incremental_trigger_max_age: int = dataclasses.field(default=300)
+    glue_diagnostics: str = dataclasses.field(default="off")
+    glue_max_table_concurrency: int = dataclasses.field(default=4)
+    glue_dedup_mode: str = dataclasses.field(default="aggregate")
+    hudi_partition_scheme_mapper: T.Dict[str, str] = dataclasses.field(
+        default_factory=dict
+    )
+    hudi_table_type_mapper: T.Dict[str, str] = dataclasses.field(
+        default_factory=dict
+    )
+    compaction_max_delta_commits: int = dataclasses.field(default=10)
+    compaction_max_age: int = dataclasses.field(default=3600)
 
     @cached_property
     def bsm(self) -> BotoSesManager:
@@ -152,6 +227,18 @@ class Config:
     def lambda_function_name_dynamodb_stream_consumer(self) -> str:
         return f"{self.app_name}_dynamodb_stream_consumer"
 
+    @property
+    def lambda_function_name_incremental_glue_job_orchestrator(self) -> str:
+        return f"{self.app_name}_incremental_glue_job_orchestrator"
+
+    @property
+    def lambda_layer_name(self) -> str:
+        return f"{self.app_name}_lambda_layer"
+
+    @property
+    def lambda_layer_arn_output_id(self) -> str:
+        return f"LambdaLayerArn"
+
     @property
     def glue_database(self) -> str:
         return self.app_name_snake
@@ -164,6 +251,38 @@ class Config:
     def glue_job_name_incremental(self) -> str:
         return f"{self.app_name}_incremental"
 
+    @property
+    def glue_job_name_repartition(self) -> str:
+        return f"{self.app_name}_repartition"
+
+    @property
+    def glue_job_name_compaction(self) -> str:
+        return f"{self.app_name}_compaction"
+
+    def get_hudi_partition_scheme(self, table: str) -> str:
+        from .hudi_partition import default_partition_scheme
+
+        return self.hudi_partition_scheme_mapper.get(table, default_partition_scheme)
+
+    def get_hudi_table_type(self, table: str) -> str:
+        return self.hudi_table_type_mapper.get(table, "COPY_ON_WRITE")
+
+    @property
+    def hudi_mor_table_list(self) -> T.List[str]:
+        return [
+            table
+            for table, table_type in self.hudi_table_type_mapper.items()
+            if table_type == "MERGE_ON_READ"
+        ]
+
+    def get_athena_table_name(self, table: str) -> str:
+        """
+        The glue catalog table of the latest snapshot of the hudi table.
+        """
+        if self.get_hudi_table_type(table) == "MERGE_ON_READ":
+            return f"{table}_rt"
+        return table
+
     @property
     def s3_bucket_artifacts(self) -> str:
         return f"{self.aws_account_id}-{self.aws_region}-artifacts"
@@ -0,0 +1,380 @@
+# -*- coding: utf-8 -*-
+
+"""
+High throughput fake data generator, to load test the DMS -> Glue -> Hudi
+pipeline at production volume.
+
+Unlike the one event per ORM session logic in ``s1_data_ingest.py``, the
+events are generated in batches, each batch is one database transaction with
+one multi-row ``INSERT ... ON CONFLICT DO NOTHING`` per table and one
+``executemany`` ``UPDATE`` per table. The faker values are pre-generated in a :class:`FakeDataPool`, so
+faker is not on the hot path. Multiple worker processes can run in parallel,
+each of them paced to its share of the target TPS.
+"""
+
+import typing as T
+import time
+import random
+import dataclasses
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ProcessPoolExecutor
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql, sqlite
+from faker import Faker
+
+from .db_orm import Account, Transaction
+from .id_pool import IdPool
+
+T_ENGINE_FACTORY = T.Callable[[], sa.engine.Engine]
+
+account_table = Account.__table__
+transaction_table = Transaction.__table__
+
+NEW_ACCOUNT = "new_account"
+UPDATE_ACCOUNT = "update_account"
+NEW_TRANSACTION = "new_transaction"
+UPDATE_TRANSACTION = "update_transaction"
+
+
+@dataclasses.dataclass
+class EventMix:
+    """
+    The relative weight of each event type. The default is the same as
+    ``s1_data_ingest.run_data_faker``.
+    """
+
+    new_account: float = dataclasses.field(default=0.09)
+    update_account: float = dataclasses.field(default=0.01)
+    new_transaction: float = dataclasses.field(default=0.81)
+    update_transaction: float = dataclasses.field(default=0.09)
+
+    def sample(self, k: int, rnd: random.Random) -> T.Dict[str, int]:
+        """
+        :return: number of events per event type in a batch of ``k`` events.
+        """
+        weights = dataclasses.asdict(self)
+        event_types = rnd.choices(list(weights), weights=list(weights.values()), k=k)
+        return {
+            event_type: event_types.count(event_type) for event_type in weights
+        }
+
+
+class FakeDataPool:
+    """
+    Pre-generated faker values, the generator picks values from them randomly.
+    """
+
+    def __init__(self, size: int = 1000, seed: T.Optional[int] = None):
+        fake = Faker()
+        if seed is not None:
+            fake.seed_instance(seed)
+        self.emails = [fake.email() for _ in range(size)]
+        self.companies = [fake.company() for _ in range(size)]
+        self.notes = ["\n".join(fake.paragraphs()) for _ in range(size)]
+
+
+digits = "0123456789"
+
+
+def rnd_account(rnd: random.Random) -> str:
+    return "-".join(
+        [
+            "".join(rnd.choices(digits, k=3)),
+            "".join(rnd.choices(digits, k=3)),
+            "".join(rnd.choices(digits, k=4)),
+        ]
+    )
+
+
+def insert_new_rows(
+    conn: sa.engine.Connection,
+    table: sa.Table,
+    rows: T.List[T.Dict[str, T.Any]],
+) -> T.List[str]:
+    """
+    Insert the rows, skip the row whose id already exists. The random account
+    id, or the transaction id of another worker process, may collide with an
+    existing row, it must not roll back the whole batch.
+
+    :return: the ids of the inserted rows.
+    """
+    dialect_name = conn.engine.dialect.name
+    if dialect_name == "postgresql":
+        stmt = postgresql.insert(table).on_conflict_do_nothing(index_elements=["id"])
+    elif dialect_name == "sqlite":
+        stmt = sqlite.insert(table).on_conflict_do_nothing(index_elements=["id"])
+    else:  # pragma: no cover
+        raise NotImplementedError(f"dialect {dialect_name!r} is not supported!")
+    return [row[0] for row in conn.execute(stmt.returning(table.c.id), rows)]
+
+
+@dataclasses.dataclass
+class GeneratorReport:
+    """
+    The number of events per event type and the elapsed seconds.
+    """
+
+    n_event: T.Dict[str, int] = dataclasses.field(default_factory=dict)
+    elapsed: float = dataclasses.field(default=0.0)
+
+    @property
+    def total(self) -> int:
+        return sum(self.n_event.values())
+
+    @property
+    def tps(self) -> float:
+        if self.elapsed == 0:
+            return 0.0
+        return self.total / self.elapsed
+
+    def merge(self, other: "GeneratorReport"):
+        for event_type, n in other.n_event.items():
+            self.n_event[event_type] = self.n_event.get(event_type, 0) + n
+
+
+class BatchGenerator:
+    """
+    Generate and write batches of events with one database connection.
+
+    :param pool_size: the max number of ids kept in memory for the update
+        events, see :class:`~rds_to_datalake.id_pool.IdPool`.
+    :param zipf_s: the skew of the updated ids, 0 is uniform.
+    """
+
+    def __init__(
+        self,
+        engine: sa.engine.Engine,
+        mix: T.Optional[EventMix] = None,
+        data_pool: T.Optional[FakeDataPool] = None,
+        pool_size: int = 100000,
+        zipf_s: float = 0.0,
+        seed: T.Optional[int] = None,
+    ):
+        self.engine = engine
+        self.mix = EventMix() if mix is None else mix
+        self.data_pool = FakeDataPool(seed=seed) if data_pool is None else data_pool
+        self.rnd = random.Random(seed)
+        self.account_ids = IdPool.from_table(
+            engine, account_table, capacity=pool_size, zipf_s=zipf_s, rnd=self.rnd
+        )
+        self.transaction_ids = IdPool.from_table(
+            engine, transaction_table, capacity=pool_size, zipf_s=zipf_s, rnd=self.rnd
+        )
+
+    def run_batch(self, batch_size: int) -> T.Dict[str, int]:
+        """
+        Write one batch of events in one database transaction.
+
+        An update event becomes a new event of the same table if there is no
+        row to update yet.
+        """
+        rnd = self.rnd
+        pool = self.data_pool
+        n_event = self.mix.sample(batch_size, rnd)
+        if len(self.account_ids) == 0:
+            n_event[NEW_ACCOUNT] += n_event[UPDATE_ACCOUNT]
+            n_event[UPDATE_ACCOUNT] = 0
+            # a transaction needs an account
+            if n_event[NEW_ACCOUNT] == 0 and n_event[NEW_TRANSACTION] > 0:
+                n_event[NEW_ACCOUNT] = 1
+                n_event[NEW_TRANSACTION] -= 1
+        if len(self.transaction_ids) == 0:
+            n_event[NEW_TRANSACTION] += n_event[UPDATE_TRANSACTION]
+            n_event[UPDATE_TRANSACTION] = 0
+
+        now = datetime.utcnow().replace(tzinfo=timezone.utc)
+
+        # each row has a distinct timestamp, the transaction id includes it
+        def get_time(ith: int) -> str:
+            return (now + timedelta(microseconds=ith)).isoformat()
+
+        # a row can be inserted and updated in the same batch, the updates
+        # are after all the inserts, so the update wins the latest version
+        n_insert = n_event[NEW_ACCOUNT] + n_event[NEW_TRANSACTION]
+
+        new_accounts = [
+            {
+                "id": rnd_account(rnd),
+                "email": rnd.choice(pool.emails),
+                "create_at": get_time(ith),
+                "update_at": get_time(ith),
+            }
+            for ith in range(n_event[NEW_ACCOUNT])
+        ]
+        self.account_ids.extend([row["id"] for row in new_accounts])
+        new_transactions = list()
+        for ith in range(n_event[NEW_TRANSACTION]):
+            account_id = self.account_ids.choice()
+            create_at = get_time(ith)
+            new_transactions.append(
+                {
+                    "id": f"{account_id}={create_at}",
+                    "account_id": account_id,
+                    "create_at": create_at,
+                    "update_at": create_at,
+                    "entity": rnd.choice(pool.companies),
+                    "amount": rnd.randint(1, 1000),
+                    "is_credit": rnd.randint(0, 1),
+                    "note": rnd.choice(pool.notes),
+                }
+            )
+        update_accounts = [
+            {
+                "b_id": self.account_ids.choice(),
+                "email": rnd.choice(pool.emails),
+                "update_at": get_time(n_insert + ith),
+            }
+            for ith in range(n_event[UPDATE_ACCOUNT])
+        ]
+        update_transactions = [
+            {
+                "b_id": self.transaction_ids.choice(),
+                "note": rnd.choice(pool.notes),
+                "update_at": get_time(n_insert + ith),
+            }
+            for ith in range(n_event[UPDATE_TRANSACTION])
+        ]
+
+        new_transaction_ids = list()
+        with self.engine.begin() as conn:
+            # the skipped new row doesn't count as an event
+            if new_accounts:
+                n_event[NEW_ACCOUNT] = len(
+                    insert_new_rows(conn, account_table, new_accounts)
+                )
+            if new_transactions:
+                new_transaction_ids = insert_new_rows(
+                    conn, transaction_table, new_transactions
+                )
+                n_event[NEW_TRANSACTION] = len(new_transaction_ids)
+            if update_accounts:
+                conn.execute(
+                    sa.update(account_table).where(
+                        account_table.c.id == sa.bindparam("b_id")
+                    ),
+                    update_accounts,
+                )
+            if update_transactions:
+                conn.execute(
+                    sa.update(transaction_table).where(
+                        transaction_table.c.id == sa.bindparam("b_id")
+                    ),
+                    update_transactions,
+                )
+        self.transaction_ids.extend(new_transaction_ids)
+        return n_event
+
+    def run(
+        self,
+        n_event: int,
+        batch_size: int = 1000,
+        target_tps: T.Optional[float] = None,
+        verbose: bool = False,
+    ) -> GeneratorReport:
+        """
+        Write ``n_event`` events in batches.
+
+        :param target_tps: if given, sleep between the batches so the
+            throughput doesn't exceed it.
+        """
+        report = GeneratorReport()
+        start = time.perf_counter()
+        n_done = 0
+        while n_done < n_event:
+            n_batch = self.run_batch(min(batch_size, n_event - n_done))
+            report.merge(GeneratorReport(n_event=n_batch))
+            n_done = report.total
+            elapsed = time.perf_counter() - start
+            if verbose:
+                print(f"finished {n_done} events, {n_done / elapsed:.1f} TPS")
+            if target_tps:
+                wait = n_done / target_tps - elapsed
+                if wait > 0:
+                    time.sleep(wait)
+        report.elapsed = time.perf_counter() - start
+        return report
+
+
+def run_worker(
+    engine_factory: T_ENGINE_FACTORY,
+    n_event: int,
+    batch_size: int = 1000,
+    target_tps: T.Optional[float] = None,
+    mix: T.Optional[EventMix] = None,
+    pool_size: int = 100000,
+    zipf_s: float = 0.0,
+    seed: T.Optional[int] = None,
+    verbose: bool = False,
+) -> GeneratorReport:
+    generator = BatchGenerator(
+        engine=engine_factory(),
+        mix=mix,
+        pool_size=pool_size,
+        zipf_s=zipf_s,
+        seed=seed,
+    )
+    return generator.run(
+        n_event=n_event,
+        batch_size=batch_size,
+        target_tps=target_tps,
+        verbose=verbose,
+    )
+
+
+def run_bulk_data_faker(
+    engine_factory: T_ENGINE_FACTORY,
+    n_event: int,
+    batch_size: int = 1000,
+    target_tps: T.Optional[float] = None,
+    mix: T.Optional[EventMix] = None,
+    n_worker: int = 1,
+    pool_size: int = 100000,
+    zipf_s: float = 0.0,
+    seed: T.Optional[int] = None,
+    verbose: bool = True,
+) -> GeneratorReport:
+    """
+    Generate ``n_event`` events with ``n_worker`` processes, and report the
+    achieved throughput.
+
+    :param engine_factory: a picklable function that creates the engine, it
+        is called in each worker process, e.g.
+        :func:`~rds_to_datalake.db_connect.create_engine_for_this_project`.
+    :param target_tps: the total target TPS of all workers, None is unlimited.
+    :param zipf_s: the skew of the updated ids, see
+        :class:`~rds_to_datalake.id_pool.IdPool`.
+    :param seed: the random seed, worker ``i`` uses ``seed + i``.
+    """
+    kwargs_list = [
+        dict(
+            engine_factory=engine_factory,
+            n_event=n_event // n_worker + (1 if ith < n_event % n_worker else 0),
+            batch_size=batch_size,
+            target_tps=None if target_tps is None else target_tps / n_worker,
+            mix=mix,
+            pool_size=pool_size,
+            zipf_s=zipf_s,
+            seed=None if seed is None else seed + ith,
+            verbose=verbose and (n_worker == 1),
+        )
+        for ith in range(n_worker)
+    ]
+    start = time.perf_counter()
+    if n_worker == 1:
+        report_list = [run_worker(**kwargs_list[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=n_worker) as executor:
+            futures = [
+                executor.submit(run_worker, **kwargs) for kwargs in kwargs_list
+            ]
+            report_list = [future.result() for future in futures]
+    report = GeneratorReport()
+    for worker_report in report_list:
+        report.merge(worker_report)
+    report.elapsed = time.perf_counter() - start
+    if verbose:
+        print(f"n event: {report.total}, {report.n_event}")
+        print(f"elapsed: {report.elapsed:.2f} sec")
+        print(f"TPS: {report.tps:.1f}")
+    return report
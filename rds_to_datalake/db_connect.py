@@ -1,5 +1,9 @@
 # -*- coding: utf-8 -*-
 
+import typing as T
+import os
+import threading
+
 import sqlalchemy as sa
 
 
@@ -9,29 +13,93 @@ def create_engine(
     database: str,
     username: str,
     password: str,
+    pool_size: int = 10,
+    max_overflow: int = 10,
+    pool_recycle: int = 1800,
+    pool_pre_ping: bool = True,
 ) -> sa.engine.Engine:
+    """
+    :param pool_size: the number of connections kept open in the QueuePool,
+        it should be at least the number of threads using the engine.
+    :param max_overflow: the number of extra connections opened when all the
+        pooled connections are in use.
+    :param pool_recycle: reconnect the connections older than this many
+        seconds, before the RDS proxy or firewall drops them.
+    :param pool_pre_ping: test the connection when it is checked out, so a
+        dropped connection is replaced instead of raising an error.
+    """
     return sa.create_engine(
         f"postgresql+psycopg2://{username}:{password}@{host}:{port}/{database}",
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_recycle=pool_recycle,
+        pool_pre_ping=pool_pre_ping,
     )
 
 
-def create_engine_for_this_project() -> sa.engine.Engine:
+# one engine per process, a forked process must not reuse the pooled
+# connections of the parent process
+_engine_mapper: T.Dict[int, sa.engine.Engine] = dict()
+_engine_lock = threading.Lock()
+
+
+def create_engine_for_this_project(use_cache: bool = True) -> sa.engine.Engine:
+    """
+    Create the engine of the project RDS database.
+
+    :param use_cache: if True, reuse the engine created in this process, and
+        use the CloudFormation stack outputs cached on local disk, see
+        :meth:`~rds_to_datalake.cdk_export.Outputs.read`.
+    """
     from .config_init import config
     from .cdk_export import Outputs
 
-    outputs = Outputs.read()
+    pid = os.getpid()
+    with _engine_lock:
+        if use_cache and (pid in _engine_mapper):
+            return _engine_mapper[pid]
+
+        outputs = Outputs.read(use_cache=use_cache)
+
+        engine = create_engine(
+            host=outputs.db_instance_host,
+            port=config.port,
+            database=config.database,
+            username=config.username,
+            password=config.password,
+        )
+        with engine.connect() as conn:
+            for row in conn.execute(
+                sa.text("SELECT 1;")
+            ):
+                assert row[0] == 1
+
+        if use_cache:
+            _engine_mapper[pid] = engine
+    return engine
 
-    engine = create_engine(
+
+def create_psycopg2_pool_for_this_project(
+    minconn: int = 1,
+    maxconn: int = 10,
+):
+    """
+    Create a thread safe psycopg2 connection pool of the project RDS database,
+    for multi-threaded code that uses the raw DBAPI connections, e.g.
+    ``COPY``. Use ``pool.getconn()`` and ``pool.putconn(conn)``.
+    """
+    from psycopg2.pool import ThreadedConnectionPool
+
+    from .config_init import config
+    from .cdk_export import Outputs
+
+    outputs = Outputs.read(use_cache=True)
+    return ThreadedConnectionPool(
+        minconn,
+        maxconn,
         host=outputs.db_instance_host,
         port=config.port,
-        database=config.database,
-        username=config.username,
+        dbname=config.database,
+        user=config.username,
         password=config.password,
     )
-    with engine.connect() as conn:
-        for row in conn.execute(
-            sa.text("SELECT 1;")
-        ):
-            assert row[0] == 1
-
-    return engine
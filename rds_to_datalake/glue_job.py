@@ -7,13 +7,22 @@ from pathlib_mate import Path
 
 from .config_init import config
 from .boto_ses import bsm
+from .paths import path_glue_lib_hudi_partition
 from .s3paths import (
     s3dir_glue_artifacts,
+    s3dir_database,
     s3dir_dms_output_database,
     s3dir_incremental_glue_job_input,
     s3path_incremental_glue_job_tracker,
+    s3path_incremental_glue_job_listing_index,
+    s3path_hudi_partition_glue_lib,
+)
+from .incremental_load_orchestration import (
+    BatchPlanner,
+    TriggerPolicy,
+    CompactionPolicy,
+    CDCTracker,
 )
-from .incremental_load_orchestration import CDCTracker
 
 
 def get_glue_job_console_url(
@@ -65,6 +74,7 @@ def create_hudi_glue_job(
     job_script: Path,
     glue_role_arn: str,
     additional_params: T.Optional[T.Dict[str, str]] = None,
+    max_concurrent_runs: int = 1,
 ):
     # ensure glue job is deleted first
     delete_glue_job_if_exists(glue_client, job_name)
@@ -75,6 +85,11 @@ def create_hudi_glue_job(
         job_script.read_text(),
         content_type="text/plain",
     )
+    # the module imported by the glue script
+    s3path_hudi_partition_glue_lib.write_text(
+        path_glue_lib_hudi_partition.read_text(),
+        content_type="text/plain",
+    )
     print(f"create glue job {job_name!r} from {s3path_artifact.uri}")
     print(f"preview etl script at: {s3path_artifact.console_url}")
     console_url = get_glue_job_console_url(
@@ -90,7 +105,7 @@ def create_hudi_glue_job(
     # necessary job parameters to use hudi
     default_arguments = {
         "--datalake-formats": "hudi",
-        "--conf": "spark.serializer=org.apache.spark.serializer.KryoSerializer --conf spark.sql.hive.convertMetastoreParquet=false",
+        "--conf": "spark.serializer=org.apache.spark.serializer.KryoSerializer --conf spark.sql.hive.convertMetastoreParquet=false --conf spark.scheduler.mode=FAIR",
         "--enable-metrics": "true",
         "--enable-spark-ui": "true",
         "--enable-job-insights": "false",
@@ -100,6 +115,7 @@ def create_hudi_glue_job(
         "--job-language": "python",
         "--spark-event-logs-path": f"s3://{config.s3_bucket_glue_assets}/sparkHistoryLogs/",
         "--TempDir": f"s3://{config.s3_bucket_glue_assets}/temporary/",
+        "--extra-py-files": s3path_hudi_partition_glue_lib.uri,
         "--CODE_ETAG": s3path_artifact.etag,
     }
     default_arguments.update(additional_params)
@@ -107,7 +123,7 @@ def create_hudi_glue_job(
         Name=job_name,
         LogUri="string",
         Role=glue_role_arn,
-        ExecutionProperty={"MaxConcurrentRuns": 1},
+        ExecutionProperty={"MaxConcurrentRuns": max_concurrent_runs},
         Command={
             "Name": "glueetl",
             "ScriptLocation": s3path_artifact.uri,
@@ -127,13 +143,78 @@ def run_initial_glue_job():
     )
 
 
-def run_incremental_glue_job():
-    cdc_tracker = CDCTracker.read(
+def run_repartition_glue_job(table: str):
+    """
+    Rewrite the hudi table with the partition scheme in
+    ``config.hudi_partition_scheme_mapper``, see ``glue_jobs/repartition.py``.
+    Deploy the new config first. From then on, the orchestrator doesn't run
+    the incremental glue job for the table group until the table is
+    rewritten, see
+    :meth:`~rds_to_datalake.incremental_load_orchestration.CDCTracker.get_table_to_repartition_list`.
+    Wait for the running incremental glue job of the table before you start
+    the repartition.
+    """
+    print(
+        f"repartition table {table!r} "
+        f"with scheme {config.get_hudi_partition_scheme(table)!r}"
+    )
+    bsm.glue_client.start_job_run(
+        JobName=config.glue_job_name_repartition,
+        Arguments={"--TABLE_NAME": table},
+    )
+
+
+def read_cdc_tracker() -> CDCTracker:
+    return CDCTracker.read(
         bsm=bsm,
         s3path_tracker=s3path_incremental_glue_job_tracker,
         s3dir_glue_job_input=s3dir_incremental_glue_job_input,
         s3dir_dms_output_database=s3dir_dms_output_database,
         glue_job_name=config.glue_job_name_incremental,
         epoch_processed_datetime=datetime(2023, 1, 1, tzinfo=timezone.utc),
+        s3path_listing_index=s3path_incremental_glue_job_listing_index,
+        batch_planner=BatchPlanner(
+            max_files_per_table=config.incremental_max_files_per_table,
+            max_bytes_per_table=config.incremental_max_bytes_per_table,
+            max_rows_per_table=config.incremental_max_rows_per_table,
+            max_bytes_per_run=config.incremental_max_bytes_per_run,
+            bytes_per_row=config.incremental_bytes_per_row,
+        ),
+        table_group_list=config.incremental_table_group_list,
+        max_concurrent_runs=config.incremental_max_concurrent_runs,
+        s3dir_database=s3dir_database,
+        compaction_glue_job_name=config.glue_job_name_compaction,
+        compaction_policy=CompactionPolicy(
+            max_delta_commits=config.compaction_max_delta_commits,
+            max_age=config.compaction_max_age,
+        ),
+        mor_table_list=config.hudi_mor_table_list,
+        partition_scheme_mapper=config.hudi_partition_scheme_mapper,
+    )
+
+
+def run_incremental_glue_job():
+    cdc_tracker = read_cdc_tracker()
+    cdc_tracker.try_to_run_glue_job(
+        bsm=bsm,
+        max_workers=config.incremental_discovery_max_workers,
+        timeout=config.incremental_discovery_timeout,
+    )
+
+
+def run_incremental_glue_job_on_s3_event(event: dict):
+    """
+    The event driven version of :func:`run_incremental_glue_job`, see
+    :meth:`~rds_to_datalake.incremental_load_orchestration.CDCTracker.handle_s3_event`.
+    """
+    cdc_tracker = read_cdc_tracker()
+    cdc_tracker.handle_s3_event(
+        bsm=bsm,
+        event=event,
+        trigger_policy=TriggerPolicy(
+            min_bytes=config.incremental_trigger_min_bytes,
+            max_age=config.incremental_trigger_max_age,
+        ),
+        max_workers=config.incremental_discovery_max_workers,
+        timeout=config.incremental_discovery_timeout,
     )
-    cdc_tracker.try_to_run_glue_job(bsm=bsm)
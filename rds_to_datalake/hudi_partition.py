@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+"""
+The partition scheme of the Hudi tables.
+
+A scheme is a comma separated string of at most one time granularity and at
+most one bucket spec:
+
+- ``"year"``, ``"month"``, ``"day"``, ``"hour"``, ``"minute"``: partition by
+  ``create_year``, ``create_month``, ... down to the granularity, derived
+  from ``create_at``.
+- ``"bucket:{column}:{n}"``: partition by ``{column}_bucket``, the hash of the
+  column modulo ``n``.
+- ``"none"``: not partitioned.
+
+For example ``"month,bucket:account_id:16"``. The scheme of each table is
+:meth:`~rds_to_datalake.config_define.Config.get_hudi_partition_scheme`.
+
+.. note::
+
+    The glue scripts in ``glue_jobs/`` import this module, it is uploaded
+    next to them and added with the ``--extra-py-files`` job parameter, see
+    :func:`rds_to_datalake.cdk_define.pre_app_synth`. So it only depends on
+    the standard library, pyspark is imported in the functions that need it.
+"""
+
+import typing as T
+
+default_partition_scheme = "minute"
+
+time_granularity_list = ["year", "month", "day", "hour", "minute"]
+time_partition_column_list = [
+    "create_year",
+    "create_month",
+    "create_day",
+    "create_hour",
+    "create_minute",
+]
+# the substring start (1-based) and length of ``create_at`` of each time
+# partition column
+time_partition_substring_list = [
+    (1, 4),
+    (6, 2),
+    (9, 2),
+    (12, 2),
+    (15, 2),
+]
+
+
+def parse_partition_scheme(
+    scheme: str,
+) -> T.Tuple[int, T.Optional[str], T.Optional[int]]:
+    """
+    :return: the number of time partition columns, the bucket column and the
+        number of buckets. Raise ``ValueError`` if the scheme is invalid.
+    """
+    n_time_column = 0
+    bucket_column = None
+    n_bucket = None
+    if scheme == "none":
+        return n_time_column, bucket_column, n_bucket
+    for part in scheme.split(","):
+        part = part.strip()
+        if part in time_granularity_list and n_time_column == 0:
+            n_time_column = time_granularity_list.index(part) + 1
+        elif part.startswith("bucket:") and bucket_column is None:
+            try:
+                _, bucket_column, n_bucket = part.split(":")
+                n_bucket = int(n_bucket)
+            except ValueError:
+                raise ValueError(f"invalid bucket spec {part!r} in {scheme!r}")
+            if n_bucket <= 0:
+                raise ValueError(f"invalid bucket spec {part!r} in {scheme!r}")
+        else:
+            raise ValueError(f"invalid partition scheme {scheme!r}")
+    return n_time_column, bucket_column, n_bucket
+
+
+def get_partition_columns(scheme: str) -> T.List[str]:
+    """
+    Get the partition columns of the scheme, in the partition path order.
+    """
+    n_time_column, bucket_column, _ = parse_partition_scheme(scheme)
+    columns = time_partition_column_list[:n_time_column]
+    if bucket_column is not None:
+        columns.append(f"{bucket_column}_bucket")
+    return columns
+
+
+def add_partition_columns(pdf, scheme: str):
+    """
+    Add the partition columns of the scheme to a ``pyspark.sql.DataFrame``.
+    """
+    from pyspark.sql import functions as F
+
+    n_time_column, bucket_column, n_bucket = parse_partition_scheme(scheme)
+    for column, (start, length) in zip(
+        time_partition_column_list[:n_time_column], time_partition_substring_list
+    ):
+        pdf = pdf.withColumn(column, F.substring(pdf.create_at, start, length))
+    if bucket_column is not None:
+        # zero padded, so the partitions are sorted by the bucket number
+        pdf = pdf.withColumn(
+            f"{bucket_column}_bucket",
+            F.lpad(
+                F.pmod(F.xxhash64(F.col(bucket_column)), F.lit(n_bucket)).cast(
+                    "string"
+                ),
+                len(str(n_bucket - 1)),
+                "0",
+            ),
+        )
+    return pdf
+
+
+def get_partition_options(scheme: str) -> T.Dict[str, str]:
+    """
+    Get the hudi write and hive sync options of the partition scheme.
+    """
+    columns = get_partition_columns(scheme)
+    if len(columns):
+        return {
+            "hoodie.datasource.write.partitionpath.field": ",".join(columns),
+            "hoodie.datasource.hive_sync.partition_fields": ",".join(columns),
+            "hoodie.datasource.hive_sync.partition_extractor_class": "org.apache.hudi.hive.MultiPartKeysValueExtractor",
+        }
+    else:
+        return {
+            "hoodie.datasource.write.partitionpath.field": "",
+            "hoodie.datasource.write.keygenerator.class": "org.apache.hudi.keygen.NonpartitionedKeyGenerator",
+            "hoodie.datasource.hive_sync.partition_extractor_class": "org.apache.hudi.hive.NonPartitionedExtractor",
+        }
+
+
+def parse_hudi_partition_fields(properties: str) -> T.List[str]:
+    """
+    Get the partition columns of a hudi table from the content of its
+    ``.hoodie/hoodie.properties`` file.
+    """
+    for line in properties.splitlines():
+        if line.startswith("hoodie.table.partition.fields="):
+            value = line.split("=", 1)[1].strip()
+            return [field for field in value.split(",") if field]
+    return []
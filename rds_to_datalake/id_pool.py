@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+
+"""
+Sample the ids of the rows to update for the fake data generator, without
+loading every id of the table.
+
+- :func:`sample_ids`: read a random sample of ids with ``TABLESAMPLE`` on
+  Postgres, the sample size doesn't depend on the table size.
+- :class:`IdPool`: a bounded pool of ids, the new ids are added with
+  reservoir sampling, ids are picked uniformly or with a Zipf skew, so the
+  CDC deduplication of hot keys can be load tested.
+"""
+
+import typing as T
+import random
+import bisect
+import itertools
+
+import sqlalchemy as sa
+
+
+def estimate_row_count(engine: sa.engine.Engine, table: sa.Table) -> int:
+    """
+    Estimate the number of rows of the table. On Postgres it reads the
+    planner statistics in ``pg_class``, -1 if the table is never analyzed.
+    Other databases use ``COUNT(*)``.
+    """
+    with engine.connect() as conn:
+        if engine.dialect.name == "postgresql":
+            stmt = sa.text(
+                "SELECT reltuples FROM pg_class WHERE oid = to_regclass(:name)"
+            )
+            value = conn.execute(stmt, {"name": table.name}).scalar()
+            return -1 if value is None else int(value)
+        else:
+            stmt = sa.select(sa.func.count()).select_from(table)
+            return conn.execute(stmt).scalar()
+
+
+def sample_ids(
+    engine: sa.engine.Engine,
+    table: sa.Table,
+    n: int,
+    n_row: T.Optional[int] = None,
+) -> T.List[str]:
+    """
+    Randomly sample about ``n`` ids of the table.
+
+    On Postgres, it uses ``TABLESAMPLE BERNOULLI`` with a percentage derived
+    from the estimated row count, only the sampled rows are returned. Other
+    databases use ``ORDER BY RANDOM()``, it is for tests.
+
+    :param n_row: the estimated number of rows, see :func:`estimate_row_count`.
+    """
+    if n_row is None:
+        n_row = estimate_row_count(engine, table)
+    with engine.connect() as conn:
+        if engine.dialect.name == "postgresql":
+            if n_row <= 0:
+                percent = 100.0
+            else:
+                # over sample a little, the sample size is random
+                percent = min(100.0, 100.0 * n * 1.2 / n_row)
+            stmt = sa.text(
+                f"SELECT id FROM {table.name} "
+                f"TABLESAMPLE BERNOULLI ({percent}) LIMIT {n}"
+            )
+        else:
+            stmt = sa.select(table.c.id).order_by(sa.func.random()).limit(n)
+        return [row[0] for row in conn.execute(stmt)]
+
+
+class IdPool:
+    """
+    A bounded pool of at most ``capacity`` ids.
+
+    :meth:`add` keeps the pool a uniform sample of all the ids seen so far
+    (reservoir sampling, counting the ``n_seen`` existing rows). :meth:`choice`
+    picks the id in slot ``i`` with a weight of ``1 / (i + 1) ** zipf_s``,
+    ``zipf_s = 0`` is uniform, the larger the more the first slots are hot.
+
+    :param n_seen: the number of ids the initial ids are sampled from.
+    """
+
+    def __init__(
+        self,
+        ids: T.Iterable[str] = None,
+        capacity: int = 100000,
+        zipf_s: float = 0.0,
+        n_seen: T.Optional[int] = None,
+        rnd: T.Optional[random.Random] = None,
+    ):
+        self.capacity = capacity
+        self.zipf_s = zipf_s
+        self.rnd = random.Random() if rnd is None else rnd
+        self.ids: T.List[str] = list()
+        if ids is not None:
+            self.ids.extend(itertools.islice(ids, capacity))
+        if n_seen is None:
+            n_seen = len(self.ids)
+        self.n_seen = max(n_seen, len(self.ids))
+        if zipf_s:
+            self.cum_weights = list(
+                itertools.accumulate(
+                    [1 / (ith + 1) ** zipf_s for ith in range(capacity)]
+                )
+            )
+        else:
+            self.cum_weights = None
+
+    @classmethod
+    def from_table(
+        cls,
+        engine: sa.engine.Engine,
+        table: sa.Table,
+        capacity: int = 100000,
+        zipf_s: float = 0.0,
+        rnd: T.Optional[random.Random] = None,
+    ) -> "IdPool":
+        """
+        Create a pool from a random sample of the ids of the table.
+        """
+        n_row = estimate_row_count(engine, table)
+        return cls(
+            ids=sample_ids(engine, table, capacity, n_row=n_row),
+            capacity=capacity,
+            zipf_s=zipf_s,
+            n_seen=n_row,
+            rnd=rnd,
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, id: str):
+        self.n_seen += 1
+        if len(self.ids) < self.capacity:
+            self.ids.append(id)
+        else:
+            ith = self.rnd.randrange(self.n_seen)
+            if ith < self.capacity:
+                self.ids[ith] = id
+
+    def extend(self, ids: T.Iterable[str]):
+        for id in ids:
+            self.add(id)
+
+    def choice(self) -> str:
+        """
+        Pick one id, raise ``IndexError`` if the pool is empty.
+        """
+        n = len(self.ids)
+        if n == 0:
+            raise IndexError("the id pool is empty")
+        if self.cum_weights is None:
+            return self.ids[self.rnd.randrange(n)]
+        ith = bisect.bisect(
+            self.cum_weights,
+            self.rnd.random() * self.cum_weights[n - 1],
+        )
+        return self.ids[min(ith, n - 1)]
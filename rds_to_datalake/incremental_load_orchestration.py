@@ -9,13 +9,26 @@ Incremental load orchestration logics.
 """
 
 import typing as T
+import copy
 import json
 import enum
+import math
+import time
+import bisect
 import dataclasses
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime, timedelta, timezone
+from botocore.config import Config
 from s3pathlib import S3Path
 from boto_session_manager import BotoSesManager
 
+from .hudi_partition import (
+    default_partition_scheme,
+    get_partition_columns,
+    parse_hudi_partition_fields,
+)
+
 
 # ------------------------------------------------------------------------------
 # Incremental Glue Job Input Data Model
@@ -98,6 +111,380 @@ max_incremental_interval = 3600 * 24 * 30 * 12 * 999  # seconds
 max_incremental_files = 2
 
 
+@dataclasses.dataclass
+class BatchPlanner:
+    """
+    Decide which cdc data files go to the next incremental glue job run. It
+    packs the files in commit time order until any of the budget is reached.
+    A table always gets at least one file if it has any, so a single big file
+    cannot block the table forever.
+
+    The row count is estimated from the object size returned by
+    ``ListObjectsV2``, so we don't need to read the parquet footer.
+
+    :param max_interval: the max commit time interval in seconds between
+        the last processed commit time and the last file in the batch.
+    :param max_files_per_table: max number of files per table per run.
+    :param max_bytes_per_table: max total object size per table per run,
+        None means no limit.
+    :param max_rows_per_table: max estimated number of rows per table per run,
+        None means no limit.
+    :param max_bytes_per_run: max total object size of all tables per run,
+        None means no limit. The budget is shared by the tables in round robin.
+    :param bytes_per_row: the estimated parquet bytes per row.
+    """
+
+    max_interval: int = dataclasses.field(default=max_incremental_interval)
+    max_files_per_table: int = dataclasses.field(default=max_incremental_files)
+    max_bytes_per_table: T.Optional[int] = dataclasses.field(default=None)
+    max_rows_per_table: T.Optional[int] = dataclasses.field(default=None)
+    max_bytes_per_run: T.Optional[int] = dataclasses.field(default=None)
+    bytes_per_row: int = dataclasses.field(default=100)
+
+    @property
+    def _max_bytes_per_table(self) -> T.Optional[int]:
+        limits = list()
+        if self.max_bytes_per_table is not None:
+            limits.append(self.max_bytes_per_table)
+        if self.max_rows_per_table is not None:
+            limits.append(self.max_rows_per_table * self.bytes_per_row)
+        if len(limits):
+            return min(limits)
+        return None
+
+    def plan_table(self, s3path_list: T.List[S3Path]) -> T.List[S3Path]:
+        """
+        Pick the files for one table from its candidate files.
+        """
+        max_bytes = self._max_bytes_per_table
+        batch = list()
+        total_size = 0
+        for s3path in s3path_list[: self.max_files_per_table]:
+            total_size += s3path.size
+            if len(batch) and (max_bytes is not None) and (total_size > max_bytes):
+                break
+            batch.append(s3path)
+        return batch
+
+    def plan_run(
+        self,
+        s3path_list_list: T.List[T.List[S3Path]],
+    ) -> T.List[T.List[S3Path]]:
+        """
+        Share the per run budget between tables, each table takes one file
+        per round. The input is the output of :meth:`plan_table` of each table.
+        """
+        if self.max_bytes_per_run is None:
+            return s3path_list_list
+        batch_list = [list() for _ in s3path_list_list]
+        remaining = self.max_bytes_per_run
+        is_first = True
+        for ith in range(max([len(lst) for lst in s3path_list_list], default=0)):
+            for s3path_list, batch in zip(s3path_list_list, batch_list):
+                # skip the table that already ran out of budget in previous round
+                if len(batch) < ith or ith >= len(s3path_list):
+                    continue
+                s3path = s3path_list[ith]
+                if is_first or s3path.size <= remaining:
+                    batch.append(s3path)
+                    remaining -= s3path.size
+                    is_first = False
+        return batch_list
+
+
+@dataclasses.dataclass
+class TriggerPolicy:
+    """
+    Decide whether to start a glue job run for a table group, based on the
+    pending cdc data files reported by the s3 events. It is used by the event
+    driven orchestrator, so the data freshness is bounded by the thresholds
+    instead of the polling interval.
+
+    :param min_bytes: start a run when the total size of the pending files
+        reaches this.
+    :param max_age: start a run when the oldest pending file is older than
+        this (in seconds).
+    """
+
+    min_bytes: int = dataclasses.field(default=64 * 1024 * 1024)
+    max_age: int = dataclasses.field(default=300)
+
+    def is_triggered(
+        self,
+        pending_file_list: T.List[T.Dict[str, T.Any]],
+        now: datetime,
+    ) -> bool:
+        """
+        :param pending_file_list: the pending files of all tables in the group,
+            see :attr:`TableListingIndex.pending_file_list`.
+        """
+        if len(pending_file_list) == 0:
+            return False
+        if sum([dct["size"] for dct in pending_file_list]) >= self.min_bytes:
+            return True
+        oldest = min(
+            [filename_to_datetime(S3Path(dct["key"]).fname) for dct in pending_file_list]
+        )
+        return (now - oldest).total_seconds() >= self.max_age
+
+
+def hudi_instant_to_datetime(instant: str) -> datetime:
+    """
+    Convert the hudi instant time ``yyyyMMddHHmmss[SSS]`` to datetime, the
+    glue job writes the instant time in UTC.
+    """
+    dt = datetime.strptime(instant[:14], "%Y%m%d%H%M%S").replace(tzinfo=timezone.utc)
+    if len(instant) > 14:
+        dt = dt + timedelta(milliseconds=int(instant[14:17]))
+    return dt
+
+
+def parse_hudi_timeline(filename_list: T.List[str]) -> T.Tuple[T.List[str], bool]:
+    """
+    Parse the file names in the ``.hoodie/`` folder of a MERGE_ON_READ table.
+
+    :return: the instants of the completed delta commits after the last
+        compaction, and whether there is a pending compaction. On a
+        MERGE_ON_READ table, a completed compaction is a ``.commit`` instant.
+    """
+    delta_commit_list = list()
+    compaction_set = set()
+    completed_compaction_set = set()
+    for filename in filename_list:
+        parts = filename.split(".")
+        if parts[1:] == ["deltacommit"]:
+            delta_commit_list.append(parts[0])
+        elif parts[1:] == ["compaction", "requested"]:
+            compaction_set.add(parts[0])
+        elif parts[1:] == ["commit"]:
+            completed_compaction_set.add(parts[0])
+    last_compaction = max(compaction_set | completed_compaction_set, default="")
+    delta_commit_list = sorted(
+        [instant for instant in delta_commit_list if instant > last_compaction]
+    )
+    has_pending_compaction = len(compaction_set - completed_compaction_set) > 0
+    return delta_commit_list, has_pending_compaction
+
+
+@dataclasses.dataclass
+class CompactionPolicy:
+    """
+    Decide whether to compact a MERGE_ON_READ hudi table, like the hudi
+    ``NUM_OR_TIME`` compaction trigger strategy. Each delta commit appends at
+    most one log file to a file group, so the number of delta commits since
+    the last compaction bounds the number of log files a real time query has
+    to merge.
+
+    :param max_delta_commits: compact when there are this many delta commits
+        since the last compaction.
+    :param max_age: compact when the oldest delta commit since the last
+        compaction is older than this (in seconds).
+    """
+
+    max_delta_commits: int = dataclasses.field(default=10)
+    max_age: int = dataclasses.field(default=3600)
+
+    def is_triggered(
+        self,
+        delta_commit_list: T.List[str],
+        now: datetime,
+    ) -> bool:
+        """
+        :param delta_commit_list: the delta commit instants since the last
+            compaction, see :func:`parse_hudi_timeline`.
+        """
+        if len(delta_commit_list) == 0:
+            return False
+        if len(delta_commit_list) >= self.max_delta_commits:
+            return True
+        oldest = hudi_instant_to_datetime(min(delta_commit_list))
+        return (now - oldest).total_seconds() >= self.max_age
+
+
+def parse_s3_event(event: dict) -> T.List[T.Tuple[str, str, int]]:
+    """
+    Parse the s3 ``ObjectCreated`` event notification.
+
+    Ref: https://docs.aws.amazon.com/AmazonS3/latest/userguide/notification-content-structure.html
+
+    :return: list of (bucket, key, size) of the created objects.
+    """
+    object_list = list()
+    for record in event.get("Records", []):
+        if record.get("eventSource") != "aws:s3":
+            continue
+        if record["eventName"].startswith("ObjectCreated") is False:
+            continue
+        object_list.append(
+            (
+                record["s3"]["bucket"]["name"],
+                urllib.parse.unquote_plus(record["s3"]["object"]["key"]),
+                record["s3"]["object"].get("size", 0),
+            )
+        )
+    return object_list
+
+
+@dataclasses.dataclass
+class TableListingIndex:
+    """
+    The persistent s3 listing cursor of a table's dms output folder. Since the
+    cdc data file name is the commit time, we only need to list the files
+    after the last listed key on every tick, instead of re-listing all the
+    files after the last processed commit time.
+
+    :param table: table name
+    :param last_listed_key: the s3 key of the last listed cdc data file,
+        the next listing starts after it.
+    :param pending_file_list: cdc data files that are listed but not processed
+        yet, in s3 key order. Each item is a ``{"key": ..., "size": ...}`` dict.
+    """
+
+    table: str = dataclasses.field()
+    last_listed_key: T.Optional[str] = dataclasses.field(default=None)
+    pending_file_list: T.List[T.Dict[str, T.Any]] = dataclasses.field(
+        default_factory=list
+    )
+
+    @property
+    def last_listed_hour(self) -> T.Optional[str]:
+        """
+        The latest hourly partition already seen, in ``YYYY/MM/DD/HH`` format.
+        """
+        if self.last_listed_key is None:
+            return None
+        return "/".join(self.last_listed_key.split("/")[-5:-1])
+
+    def add_file(self, key: str, size: int) -> bool:
+        """
+        Add a cdc data file to the pending files, keep the s3 key order.
+        It doesn't move the cursor, so the file reported by the s3 event is
+        still listed once, in case any s3 event is lost.
+
+        :return: a boolean flag to indicate if it is a new pending file.
+        """
+        if (len(self.pending_file_list) == 0) or (
+            key > self.pending_file_list[-1]["key"]
+        ):
+            self.pending_file_list.append(dict(key=key, size=size))
+            return True
+        key_list = [dct["key"] for dct in self.pending_file_list]
+        ith = bisect.bisect_left(key_list, key)
+        if key_list[ith] == key:
+            return False
+        self.pending_file_list.insert(ith, dict(key=key, size=size))
+        return True
+
+    def get_pending_file_list(
+        self,
+        start_from: datetime,
+    ) -> T.List[T.Dict[str, T.Any]]:
+        """
+        Get the pending files whose commit time is not before ``start_from``.
+        """
+        return [
+            dct
+            for dct in self.pending_file_list
+            if filename_to_datetime(S3Path(dct["key"]).fname) >= start_from
+        ]
+
+    def update(
+        self,
+        bucket: str,
+        s3path_list: T.List[S3Path],
+        start_from: datetime,
+    ) -> T.List[S3Path]:
+        """
+        Append the newly listed cdc data files to the pending files, drop the
+        pending files that are already processed (commit time before
+        ``start_from``) and move the cursor forward.
+
+        :return: the pending cdc data files.
+        """
+        for s3path in s3path_list:
+            self.add_file(key=s3path.key, size=s3path.size)
+        if len(s3path_list):
+            self.last_listed_key = s3path_list[-1].key
+        self.pending_file_list = self.get_pending_file_list(start_from)
+        s3path_list = list()
+        for dct in self.pending_file_list:
+            s3path = S3Path(bucket, dct["key"])
+            # pre-populate the metadata cache, so ``s3path.size`` doesn't
+            # need a head_object call
+            s3path._meta = {"ContentLength": dct["size"]}
+            s3path_list.append(s3path)
+        return s3path_list
+
+
+@dataclasses.dataclass
+class ListingIndex:
+    """
+    The s3 listing cursor of all tables. It is stored next to the
+    ``incremental_glue_job_tracker.json``. If you reset the tracker, you have
+    to delete this file as well.
+
+    :param s3path: where you store the listing index data.
+    :param table_listing_index_mapping: table name to :class:`TableListingIndex`
+    """
+
+    s3path: S3Path = dataclasses.field()
+    table_listing_index_mapping: T.Dict[str, TableListingIndex] = dataclasses.field(
+        default_factory=dict
+    )
+
+    @classmethod
+    def read(
+        cls,
+        bsm: BotoSesManager,
+        s3path: S3Path,
+    ):
+        """
+        Read the listing index data from s3. If not exists, create an empty one.
+        """
+        if s3path.exists(bsm=bsm) is False:
+            return cls(s3path=s3path)
+        data = json.loads(s3path.read_text(bsm=bsm))
+        return cls(
+            s3path=s3path,
+            table_listing_index_mapping={
+                dct["table"]: TableListingIndex(**dct)
+                for dct in data["table_listing_index_list"]
+            },
+        )
+
+    def write(
+        self,
+        bsm: BotoSesManager,
+    ):
+        """
+        Write the listing index data to s3.
+        """
+        self.s3path.write_text(
+            json.dumps(
+                {
+                    "table_listing_index_list": [
+                        dataclasses.asdict(table_listing_index)
+                        for table_listing_index in self.table_listing_index_mapping.values()
+                    ],
+                },
+                indent=4,
+            ),
+            content_type="application/json",
+            bsm=bsm,
+        )
+
+    def get(self, table: str) -> TableListingIndex:
+        """
+        Get the listing index of the table, create an empty one if not exists.
+        """
+        try:
+            return self.table_listing_index_mapping[table]
+        except KeyError:
+            table_listing_index = TableListingIndex(table=table)
+            self.table_listing_index_mapping[table] = table_listing_index
+            return table_listing_index
+
+
 @dataclasses.dataclass
 class TableTracker:
     """
@@ -126,41 +513,150 @@ class TableTracker:
     def last_processed_datetime_plus_1ms(self) -> datetime:
         return self.last_processed_datetime + timedelta(milliseconds=1)
 
+    def get_lag(self, now: datetime) -> float:
+        """
+        The end-to-end lag in seconds, i.e. how far the data in the data lake
+        is behind the ``now``.
+        """
+        return (now - self.last_processed_datetime).total_seconds()
+
     def get_todo(
         self,
         bsm: BotoSesManager,
         s3dir_dms_output_database: S3Path,
+        timeout: T.Optional[T.Union[int, float]] = None,
+        table_listing_index: T.Optional["TableListingIndex"] = None,
+        batch_planner: T.Optional[BatchPlanner] = None,
+        s3_client=None,
     ) -> T.Tuple[T.List[S3Path], datetime]:
+        """
+        Find the cdc data files to process in the next glue job run.
+
+        :param timeout: if the s3 listing takes longer than this (in seconds),
+            raise ``TimeoutError``. None means no timeout. The deadline is
+            checked as the listed objects are consumed, a hanging
+            ``ListObjectsV2`` call is cut by
+            :meth:`CDCTracker.prepare_glue_job_input`.
+        :param table_listing_index: if given, only list the cdc data files
+            after its ``last_listed_key``, and pick the todo files from its
+            pending files. The index is updated in place.
+        :param batch_planner: decide how many files to process, if None,
+            use the default :class:`BatchPlanner`.
+        :param s3_client: list the cdc data files with this client instead
+            of ``bsm.s3_client``.
+
+        :return: the list of cdc data files and the next processed datetime.
+        """
+        if batch_planner is None:
+            batch_planner = BatchPlanner()
         s3dir_table = s3dir_dms_output_database.joinpath("public", self.table).to_dir()
         last_processed_datetime_plus_1ms = self.last_processed_datetime_plus_1ms
+        deadline = None if timeout is None else time.time() + timeout
+
+        def is_in_time(s3path: S3Path) -> bool:
+            if deadline is not None and time.time() > deadline:
+                raise TimeoutError(
+                    f"list cdc data files of table {self.table!r} "
+                    f"timed out in {timeout} seconds!"
+                )
+            return True
+
+        start_after = s3dir_table.joinpath(
+            datetime_to_s3_key(last_processed_datetime_plus_1ms),
+        ).key
+        if (table_listing_index is not None) and (
+            table_listing_index.last_listed_key is not None
+        ):
+            start_after = max(start_after, table_listing_index.last_listed_key)
+
         s3path_list = (
             s3dir_table.iter_objects(
-                start_after=s3dir_table.joinpath(
-                    datetime_to_s3_key(last_processed_datetime_plus_1ms),
-                ).key,
-                bsm=bsm,
+                start_after=start_after,
+                bsm=bsm if s3_client is None else s3_client,
             )
             .filter(
+                is_in_time,
                 lambda s3path: "/LOAD" not in s3path.uri,  #
-                lambda s3path: (
-                    filename_to_datetime(s3path.fname)
-                    - last_processed_datetime_plus_1ms
-                ).total_seconds()
-                <= max_incremental_interval,
             )
             .all()
         )
+        if table_listing_index is not None:
+            s3path_list = table_listing_index.update(
+                bucket=s3dir_table.bucket,
+                s3path_list=s3path_list,
+                start_from=last_processed_datetime_plus_1ms,
+            )
+        s3path_list = [
+            s3path
+            for s3path in s3path_list
+            if (
+                filename_to_datetime(s3path.fname) - last_processed_datetime_plus_1ms
+            ).total_seconds()
+            <= batch_planner.max_interval
+        ]
         # print(s3path_list)
         if len(s3path_list) == 0:
             next_processed_datetime = last_processed_datetime_plus_1ms + timedelta(
-                seconds=max_incremental_interval
+                seconds=batch_planner.max_interval
             )
         else:
-            s3path_list = s3path_list[:max_incremental_files]
+            s3path_list = batch_planner.plan_table(s3path_list)
             next_processed_datetime = filename_to_datetime(s3path_list[-1].fname)
         return s3path_list, next_processed_datetime
 
 
+@dataclasses.dataclass
+class TableGroupTracker:
+    """
+    Represent the glue job run progress of a group of tables. Each group is
+    processed by its own glue job run, so a slow table only blocks the tables
+    in the same group.
+
+    :param table_list: the table names in this group.
+    :param last_glue_job_run_id: the last glue job run id of this group
+    :param last_glue_job_run_sequence_id: the glue job input sequence id of
+        the last glue job run of this group
+    :param ready_to_run_next_glue_job: whether the next glue job of this group
+        is ready to run. basically if the last glue job is not succeeded,
+        failed, stopped, then it is NOT ready.
+    :param last_compaction_job_run_id: the running compaction glue job run id
+        of this group, None if there is no running compaction. The group
+        doesn't run the incremental glue job until the compaction is finished.
+    """
+
+    table_list: T.List[str] = dataclasses.field()
+    last_glue_job_run_id: T.Optional[str] = dataclasses.field(default=None)
+    last_glue_job_run_sequence_id: T.Optional[int] = dataclasses.field(default=None)
+    ready_to_run_next_glue_job: bool = dataclasses.field(default=True)
+    last_compaction_job_run_id: T.Optional[str] = dataclasses.field(default=None)
+
+
+def new_table_group_tracker_list(
+    table_list: T.List[str],
+    table_group_list: T.Optional[T.List[T.List[str]]] = None,
+) -> T.List[TableGroupTracker]:
+    """
+    Create the initial table group trackers. The tables that are not in any
+    group are put into one extra group.
+
+    :param table_list: all table names.
+    :param table_group_list: list of table groups, None means all tables are
+        in one group.
+    """
+    if table_group_list is None:
+        table_group_list = [list(table_list)]
+    grouped_table_list = [table for group in table_group_list for table in group]
+    if len(grouped_table_list) != len(set(grouped_table_list)):
+        raise ValueError(f"table groups are not disjoint: {table_group_list}")
+    table_group_list = [group for group in table_group_list if len(group)]
+    ungrouped_table_list = [
+        table for table in table_list if table not in grouped_table_list
+    ]
+    if len(ungrouped_table_list):
+        table_group_list.append(ungrouped_table_list)
+    return [TableGroupTracker(table_list=list(group)) for group in table_group_list]
+
+
 @dataclasses.dataclass
 class CDCTracker:
     """
@@ -188,12 +684,33 @@ class CDCTracker:
         ${s3dir_dms_output_database}/...
 
     :param glue_job_name: the incremental glue job name.
+    :param s3path_listing_index: where you store the :class:`ListingIndex`
+        data. If None, it lists all the cdc data files after the last processed
+        commit time on every run.
+    :param batch_planner: decide which cdc data files go to the next run.
+    :param table_group_list: list of table groups, each group has its own
+        glue job run and progress. None means all tables are in one group.
+    :param max_concurrent_runs: max number of concurrent glue job runs,
+        it should not exceed the ``MaxConcurrentRuns`` of the glue job.
+    :param s3dir_database: the hudi tables location, it is used to read the
+        timeline of the MERGE_ON_READ tables.
+    :param compaction_glue_job_name: the compaction glue job name.
+    :param compaction_policy: decide when to compact a MERGE_ON_READ table,
+        None means never compact. It requires the ``s3dir_database``.
+    :param mor_table_list: the MERGE_ON_READ tables.
+    :param partition_scheme_mapper: the partition scheme per table, see
+        :mod:`rds_to_datalake.hudi_partition`. If given, a table whose hudi
+        partition fields don't match its scheme is waiting for the repartition
+        glue job, its table group doesn't run the incremental glue job until
+        the table is rewritten. None means never check. It requires the
+        ``s3dir_database``.
 
-    :param last_glue_job_run_id: the last glue job run id
-    :param last_glue_job_run_sequence_id: the last glue job run sequence id
-    :param ready_to_run_next_glue_job: whether the next glue job is ready to run.
-        basically if the last glue job is not succeeded, failed, stopped, then
-        it is NOT ready.
+    :param last_glue_job_run_sequence_id: the last glue job run sequence id,
+        it is shared by all table groups.
+    :param table_group_tracker_list: the glue job run progress of each table group.
+    :param partition_columns_mapper: the partition columns of each table that
+        are known to match its partition scheme, so the ``hoodie.properties``
+        is only read again after the scheme is changed.
     """
 
     # static attributes
@@ -201,13 +718,47 @@ class CDCTracker:
     s3dir_glue_job_input: S3Path = dataclasses.field()
     s3dir_dms_output_database: S3Path = dataclasses.field()
     glue_job_name: str = dataclasses.field()
+    s3path_listing_index: T.Optional[S3Path] = dataclasses.field(default=None)
+    batch_planner: BatchPlanner = dataclasses.field(default_factory=BatchPlanner)
+    table_group_list: T.Optional[T.List[T.List[str]]] = dataclasses.field(
+        default=None
+    )
+    max_concurrent_runs: int = dataclasses.field(default=1)
+    s3dir_database: T.Optional[S3Path] = dataclasses.field(default=None)
+    compaction_glue_job_name: T.Optional[str] = dataclasses.field(default=None)
+    compaction_policy: T.Optional[CompactionPolicy] = dataclasses.field(
+        default=None
+    )
+    mor_table_list: T.List[str] = dataclasses.field(default_factory=list)
+    partition_scheme_mapper: T.Optional[T.Dict[str, str]] = dataclasses.field(
+        default=None
+    )
 
     table_tracker_list: T.List[TableTracker] = dataclasses.field(default_factory=list)
 
     # dynamic attributes
-    last_glue_job_run_id: T.Optional[str] = dataclasses.field(default=None)
     last_glue_job_run_sequence_id: T.Optional[int] = dataclasses.field(default=None)
-    ready_to_run_next_glue_job: T.Optional[bool] = dataclasses.field(default=None)
+    table_group_tracker_list: T.List[TableGroupTracker] = dataclasses.field(
+        default_factory=list
+    )
+    partition_columns_mapper: T.Dict[str, T.List[str]] = dataclasses.field(
+        default_factory=dict
+    )
+
+    def __post_init__(self):
+        if (self.partition_scheme_mapper is not None) and (
+            self.s3dir_database is None
+        ):
+            raise ValueError("partition_scheme_mapper requires the s3dir_database!")
+        if (self.compaction_policy is not None) and (self.s3dir_database is None):
+            raise ValueError("compaction_policy requires the s3dir_database!")
+        if len(self.table_group_tracker_list) == 0:
+            self.table_group_tracker_list = new_table_group_tracker_list(
+                table_list=[
+                    table_tracker.table for table_tracker in self.table_tracker_list
+                ],
+                table_group_list=self.table_group_list,
+            )
 
     @classmethod
     def read(
@@ -218,11 +769,27 @@ class CDCTracker:
         s3dir_dms_output_database: S3Path,
         glue_job_name: str,
         epoch_processed_datetime: datetime,
+        s3path_listing_index: T.Optional[S3Path] = None,
+        batch_planner: T.Optional[BatchPlanner] = None,
+        table_group_list: T.Optional[T.List[T.List[str]]] = None,
+        max_concurrent_runs: int = 1,
+        s3dir_database: T.Optional[S3Path] = None,
+        compaction_glue_job_name: T.Optional[str] = None,
+        compaction_policy: T.Optional[CompactionPolicy] = None,
+        mor_table_list: T.Optional[T.List[str]] = None,
+        partition_scheme_mapper: T.Optional[T.Dict[str, str]] = None,
     ):
         """
         Read the tracker data from s3. If not exists, create a new one with
         initial value.
+
+        If the ``table_group_list`` is changed, the table groups are
+        re-created when there's no running glue job.
         """
+        if batch_planner is None:
+            batch_planner = BatchPlanner()
+        if mor_table_list is None:
+            mor_table_list = list()
         # set initial value if tracker not exists
         if s3path_tracker.exists(bsm=bsm) is False:
             tracker = cls(
@@ -230,6 +797,15 @@ class CDCTracker:
                 s3dir_glue_job_input=s3dir_glue_job_input,
                 s3dir_dms_output_database=s3dir_dms_output_database,
                 glue_job_name=glue_job_name,
+                s3path_listing_index=s3path_listing_index,
+                batch_planner=batch_planner,
+                table_group_list=table_group_list,
+                max_concurrent_runs=max_concurrent_runs,
+                s3dir_database=s3dir_database,
+                compaction_glue_job_name=compaction_glue_job_name,
+                compaction_policy=compaction_policy,
+                mor_table_list=mor_table_list,
+                partition_scheme_mapper=partition_scheme_mapper,
                 table_tracker_list=[
                     TableTracker(
                         table=table,
@@ -239,26 +815,70 @@ class CDCTracker:
                     )
                     for table in table_name_list
                 ],
-                last_glue_job_run_id=None,
                 last_glue_job_run_sequence_id=0,
-                ready_to_run_next_glue_job=True,
             )
             tracker.write(bsm=bsm)
             return tracker
         # read from s3 if tracker exists
         else:
             data = json.loads(s3path_tracker.read_text(bsm=bsm))
+            table_tracker_list = [
+                TableTracker(**dct) for dct in data["table_tracker_list"]
+            ]
+            if "table_group_tracker_list" in data:
+                table_group_tracker_list = [
+                    TableGroupTracker(**dct)
+                    for dct in data["table_group_tracker_list"]
+                ]
+            # the tracker data written before the table group is introduced
+            else:
+                table_group_tracker_list = [
+                    TableGroupTracker(
+                        table_list=[
+                            table_tracker.table for table_tracker in table_tracker_list
+                        ],
+                        last_glue_job_run_id=data["last_glue_job_run_id"],
+                        last_glue_job_run_sequence_id=data[
+                            "last_glue_job_run_sequence_id"
+                        ],
+                        ready_to_run_next_glue_job=data["ready_to_run_next_glue_job"],
+                    )
+                ]
+            new_table_group_trackers = new_table_group_tracker_list(
+                table_list=[table_tracker.table for table_tracker in table_tracker_list],
+                table_group_list=table_group_list,
+            )
+            if [
+                table_group_tracker.table_list
+                for table_group_tracker in table_group_tracker_list
+            ] != [
+                table_group_tracker.table_list
+                for table_group_tracker in new_table_group_trackers
+            ] and all(
+                [
+                    table_group_tracker.ready_to_run_next_glue_job
+                    for table_group_tracker in table_group_tracker_list
+                ]
+            ):
+                table_group_tracker_list = new_table_group_trackers
             return cls(
                 s3path_tracker=s3path_tracker,
                 s3dir_glue_job_input=s3dir_glue_job_input,
                 s3dir_dms_output_database=s3dir_dms_output_database,
                 glue_job_name=glue_job_name,
-                table_tracker_list=[
-                    TableTracker(**dct) for dct in data["table_tracker_list"]
-                ],
-                last_glue_job_run_id=data["last_glue_job_run_id"],
+                s3path_listing_index=s3path_listing_index,
+                batch_planner=batch_planner,
+                table_group_list=table_group_list,
+                max_concurrent_runs=max_concurrent_runs,
+                s3dir_database=s3dir_database,
+                compaction_glue_job_name=compaction_glue_job_name,
+                compaction_policy=compaction_policy,
+                mor_table_list=mor_table_list,
+                partition_scheme_mapper=partition_scheme_mapper,
+                table_tracker_list=table_tracker_list,
                 last_glue_job_run_sequence_id=data["last_glue_job_run_sequence_id"],
-                ready_to_run_next_glue_job=data["ready_to_run_next_glue_job"],
+                table_group_tracker_list=table_group_tracker_list,
+                partition_columns_mapper=data.get("partition_columns_mapper", {}),
             )
 
     def write(
@@ -275,9 +895,12 @@ class CDCTracker:
                         dataclasses.asdict(table_tracker)
                         for table_tracker in self.table_tracker_list
                     ],
-                    "last_glue_job_run_id": self.last_glue_job_run_id,
                     "last_glue_job_run_sequence_id": self.last_glue_job_run_sequence_id,
-                    "ready_to_run_next_glue_job": self.ready_to_run_next_glue_job,
+                    "table_group_tracker_list": [
+                        dataclasses.asdict(table_group_tracker)
+                        for table_group_tracker in self.table_group_tracker_list
+                    ],
+                    "partition_columns_mapper": self.partition_columns_mapper,
                 },
                 indent=4,
             ),
@@ -312,14 +935,175 @@ class CDCTracker:
             sequence_id=self.last_glue_job_run_sequence_id + 1,
         )
 
-    def run_glue_job(self, bsm: BotoSesManager):
-        print("prepare the glue job input data.")
-        glue_job_input = GlueJobInput()
-        for table_tracker in self.table_tracker_list:
-            s3path_list, next_processed_datetime = table_tracker.get_todo(
+    def _get_table_todo(
+        self,
+        bsm: BotoSesManager,
+        table_tracker: TableTracker,
+        timeout: T.Optional[T.Union[int, float]] = None,
+        table_listing_index: T.Optional[TableListingIndex] = None,
+        s3_client=None,
+    ) -> T.Optional[T.Tuple[T.List[S3Path], datetime]]:
+        """
+        Call :meth:`TableTracker.get_todo`, return None if it timed out.
+        """
+        try:
+            return table_tracker.get_todo(
                 bsm=bsm,
                 s3dir_dms_output_database=self.s3dir_dms_output_database,
+                timeout=timeout,
+                table_listing_index=table_listing_index,
+                batch_planner=self.batch_planner,
+                s3_client=s3_client,
             )
+        except TimeoutError as e:
+            print(f"{e}, skip table {table_tracker.table!r} in this run.")
+            return None
+
+    @staticmethod
+    def get_listing_s3_client(
+        bsm: BotoSesManager,
+        timeout: T.Union[int, float],
+    ):
+        """
+        Create the s3 client to list the cdc data files, a hanging
+        ``ListObjectsV2`` call fails after ``timeout`` seconds, instead of the
+        60 seconds default ``read_timeout`` and retries of botocore.
+        """
+        timeout = max(timeout, 1)
+        return bsm.boto_ses.client(
+            "s3",
+            config=Config(
+                connect_timeout=timeout,
+                read_timeout=timeout,
+                retries={"max_attempts": 1},
+            ),
+        )
+
+    def prepare_glue_job_input(
+        self,
+        bsm: BotoSesManager,
+        max_workers: int = 1,
+        timeout: T.Optional[T.Union[int, float]] = None,
+        table_list: T.Optional[T.List[str]] = None,
+        s3_client=None,
+    ) -> GlueJobInput:
+        """
+        Discover the cdc data files of all tables and build the glue job input.
+        It also updates the ``next_processed_time_str`` of each table tracker.
+
+        :param max_workers: number of tables to discover concurrently. 1 means
+            discover tables one by one in the current thread, unless
+            ``timeout`` is set.
+        :param timeout: per table s3 listing timeout in seconds. The tables
+            are listed in worker threads, and the discovery returns after
+            ``timeout`` x the number of tables per worker at most, the tables
+            still listing are left behind. The table that timed out is
+            skipped in this run, its progress and listing index don't move.
+            So is the table that gets no file because the per run budget of
+            the :class:`BatchPlanner` is used up.
+        :param table_list: only discover these tables, None means all tables.
+        :param s3_client: the s3 client to list the cdc data files, if None
+            and ``timeout`` is set, use :meth:`get_listing_s3_client`.
+        """
+        table_tracker_list = [
+            table_tracker
+            for table_tracker in self.table_tracker_list
+            if (table_list is None) or (table_tracker.table in table_list)
+        ]
+        if self.s3path_listing_index is None:
+            listing_index = None
+            table_listing_index_list = [None] * len(table_tracker_list)
+        else:
+            listing_index = ListingIndex.read(bsm=bsm, s3path=self.s3path_listing_index)
+            # each table updates a copy of its listing index, the copy is
+            # saved only if the listing finishes in time, so a listing thread
+            # left behind never touches the index we write
+            table_listing_index_list = [
+                copy.deepcopy(listing_index.get(table_tracker.table))
+                for table_tracker in table_tracker_list
+            ]
+
+        if (timeout is None) and (max_workers <= 1):
+            todo_list = [
+                self._get_table_todo(
+                    bsm, table_tracker, timeout, table_listing_index, s3_client
+                )
+                for table_tracker, table_listing_index in zip(
+                    table_tracker_list, table_listing_index_list
+                )
+            ]
+        else:
+            if (s3_client is None) and (timeout is not None):
+                s3_client = self.get_listing_s3_client(bsm, timeout)
+            # boto session manager creates the client lazily, make sure it is
+            # created before sharing it between threads
+            _ = bsm.s3_client
+            max_workers = max(max_workers, 1)
+            executor = ThreadPoolExecutor(max_workers=max_workers)
+            try:
+                future_list = [
+                    executor.submit(
+                        self._get_table_todo,
+                        bsm,
+                        table_tracker,
+                        timeout,
+                        table_listing_index,
+                        s3_client,
+                    )
+                    for table_tracker, table_listing_index in zip(
+                        table_tracker_list, table_listing_index_list
+                    )
+                ]
+                if timeout is None:
+                    wait_timeout = None
+                else:
+                    # each worker lists its tables one by one
+                    n_round = math.ceil(len(table_tracker_list) / max_workers)
+                    wait_timeout = max(timeout, 0) * n_round
+                done, _ = wait(future_list, timeout=wait_timeout)
+            finally:
+                # don't wait for the hanging listing
+                executor.shutdown(wait=False, cancel_futures=True)
+            todo_list = list()
+            for table_tracker, future in zip(table_tracker_list, future_list):
+                if future in done:
+                    todo_list.append(future.result())
+                else:
+                    print(
+                        f"list cdc data files of table {table_tracker.table!r} "
+                        f"timed out in {timeout} seconds!, "
+                        f"skip table {table_tracker.table!r} in this run."
+                    )
+                    todo_list.append(None)
+
+        if listing_index is not None:
+            for table_tracker, todo, table_listing_index in zip(
+                table_tracker_list, todo_list, table_listing_index_list
+            ):
+                if todo is not None:
+                    listing_index.table_listing_index_mapping[
+                        table_tracker.table
+                    ] = table_listing_index
+            listing_index.write(bsm=bsm)
+
+        # share the per run budget between tables
+        batch_list = self.batch_planner.plan_run(
+            [[] if todo is None else todo[0] for todo in todo_list]
+        )
+
+        glue_job_input = GlueJobInput()
+        for table_tracker, todo, s3path_list in zip(
+            table_tracker_list, todo_list, batch_list
+        ):
+            if todo is None or (len(todo[0]) and len(s3path_list) == 0):
+                table_tracker.next_processed_time_str = (
+                    table_tracker.last_processed_time_str
+                )
+                continue
+            if len(s3path_list) == len(todo[0]):
+                next_processed_datetime = todo[1]
+            else:
+                next_processed_datetime = filename_to_datetime(s3path_list[-1].fname)
             table_tracker.next_processed_time_str = next_processed_datetime.isoformat()
 
             glue_job_input.todo_list.append(
@@ -330,6 +1114,39 @@ class CDCTracker:
                     s3uri_list=[s3path.uri for s3path in s3path_list],
                 )
             )
+        return glue_job_input
+
+    def run_glue_job(
+        self,
+        bsm: BotoSesManager,
+        max_workers: int = 1,
+        timeout: T.Optional[T.Union[int, float]] = None,
+        table_group_tracker: T.Optional[TableGroupTracker] = None,
+    ):
+        """
+        Run a glue job for the tables in the table group.
+
+        :param table_group_tracker: which table group to run, it can be None
+            if there's only one table group.
+        """
+        if table_group_tracker is None:
+            if len(self.table_group_tracker_list) != 1:
+                raise ValueError(
+                    "table_group_tracker is required "
+                    "when there are multiple table groups!"
+                )
+            table_group_tracker = self.table_group_tracker_list[0]
+
+        print(
+            f"prepare the glue job input data "
+            f"for tables {table_group_tracker.table_list}."
+        )
+        glue_job_input = self.prepare_glue_job_input(
+            bsm=bsm,
+            max_workers=max_workers,
+            timeout=timeout,
+            table_list=table_group_tracker.table_list,
+        )
 
         s3path_glue_job_input = self.next_glue_job_input_s3path
         print(f"write glue job input data to s3: {s3path_glue_job_input.uri}")
@@ -351,9 +1168,12 @@ class CDCTracker:
             )
             job_run_id = res["JobRunId"]
             print(f"job run id = {job_run_id}")
-            self.last_glue_job_run_id = job_run_id
             self.last_glue_job_run_sequence_id += 1
-            self.ready_to_run_next_glue_job = False
+            table_group_tracker.last_glue_job_run_id = job_run_id
+            table_group_tracker.last_glue_job_run_sequence_id = (
+                self.last_glue_job_run_sequence_id
+            )
+            table_group_tracker.ready_to_run_next_glue_job = False
             self.write(bsm=bsm)
             return True
         except Exception as e:
@@ -364,51 +1184,397 @@ class CDCTracker:
                     f"didn't implement the error handling logic for exception: {e!r}"
                 )
 
-    def try_to_run_glue_job(self, bsm: BotoSesManager) -> bool:
+    def check_glue_job_run(
+        self,
+        bsm: BotoSesManager,
+        table_group_tracker: TableGroupTracker,
+    ) -> bool:
         """
-        Check the status of the last glue job run, if it is finished, then
-        update the tracker and run a new glue job.
+        Check the status of the last glue job run of the table group, if it is
+        finished, then update the progress of the tables in this group.
 
-        :return: a boolean flag to indicate if it runs the glue job,
+        :return: a boolean flag to indicate if the table group is ready to run
+            the next glue job.
         """
-        print("try to run incremental glue job.")
-        if self.ready_to_run_next_glue_job:
-            return self.run_glue_job(bsm=bsm)
-        else:
-            if self.last_glue_job_run_id is None:
-                raise ValueError
+        if table_group_tracker.ready_to_run_next_glue_job:
+            return True
+        if table_group_tracker.last_glue_job_run_id is None:
+            raise ValueError
 
-            # get job run status
-            # Ref: https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/glue/client/get_job_run.html
-            print("there is a running incremental glue job, check the status.")
-            res = bsm.glue_client.get_job_run(
-                JobName=self.glue_job_name,
-                RunId=self.last_glue_job_run_id,
-            )
-            state = res["JobRun"]["JobRunState"]
-
-            # if finished (succeeded or failed), update the tracker and run another job
-            if state in [
-                JobRunStateEnum.STOPPED.value,
-                JobRunStateEnum.SUCCEEDED.value,
-                JobRunStateEnum.FAILED.value,
-                JobRunStateEnum.TIMEOUT.value,
-                JobRunStateEnum.ERROR.value,
-            ]:
-                for table_tracker in self.table_tracker_list:
+        # get job run status
+        # Ref: https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/glue/client/get_job_run.html
+        print(
+            f"there is a running incremental glue job for tables "
+            f"{table_group_tracker.table_list}, check the status."
+        )
+        res = bsm.glue_client.get_job_run(
+            JobName=self.glue_job_name,
+            RunId=table_group_tracker.last_glue_job_run_id,
+        )
+        state = res["JobRun"]["JobRunState"]
+
+        # if finished (succeeded or failed), update the tracker
+        if state in [
+            JobRunStateEnum.STOPPED.value,
+            JobRunStateEnum.SUCCEEDED.value,
+            JobRunStateEnum.FAILED.value,
+            JobRunStateEnum.TIMEOUT.value,
+            JobRunStateEnum.ERROR.value,
+        ]:
+            for table_tracker in self.table_tracker_list:
+                if table_tracker.table in table_group_tracker.table_list:
                     table_tracker.last_processed_time_str = (
                         table_tracker.next_processed_time_str
                     )
                     table_tracker.next_processed_time_str = None
-                self.ready_to_run_next_glue_job = True
-                print(
-                    f"previous glue job finished, "
-                    f"status = {state!r}, run another one."
+            table_group_tracker.ready_to_run_next_glue_job = True
+            print(f"previous glue job finished, status = {state!r}.")
+            return True
+        else:
+            print(
+                f"there is a running incremental glue job, "
+                f"status = {state!r}, do nothing."
+            )
+            return False
+
+    def check_compaction_job_run(
+        self,
+        bsm: BotoSesManager,
+        table_group_tracker: TableGroupTracker,
+    ) -> bool:
+        """
+        Check the status of the compaction glue job run of the table group.
+
+        :return: a boolean flag to indicate if there's no running compaction.
+        """
+        if table_group_tracker.last_compaction_job_run_id is None:
+            return True
+        res = bsm.glue_client.get_job_run(
+            JobName=self.compaction_glue_job_name,
+            RunId=table_group_tracker.last_compaction_job_run_id,
+        )
+        state = res["JobRun"]["JobRunState"]
+        if state in [
+            JobRunStateEnum.STOPPED.value,
+            JobRunStateEnum.SUCCEEDED.value,
+            JobRunStateEnum.FAILED.value,
+            JobRunStateEnum.TIMEOUT.value,
+            JobRunStateEnum.ERROR.value,
+        ]:
+            table_group_tracker.last_compaction_job_run_id = None
+            print(f"previous compaction glue job finished, status = {state!r}.")
+            return True
+        else:
+            print(
+                f"there is a running compaction glue job for tables "
+                f"{table_group_tracker.table_list}, status = {state!r}."
+            )
+            return False
+
+    def get_table_to_compact_list(
+        self,
+        bsm: BotoSesManager,
+        table_group_tracker: TableGroupTracker,
+        now: datetime,
+    ) -> T.List[str]:
+        """
+        Find the MERGE_ON_READ tables in the table group that meet the
+        :attr:`compaction_policy`, or have a pending compaction.
+        """
+        table_list = list()
+        for table in table_group_tracker.table_list:
+            if table not in self.mor_table_list:
+                continue
+            s3dir_timeline = self.s3dir_database.joinpath(table, ".hoodie").to_dir()
+            filename_list = [
+                s3path.basename
+                for s3path in s3dir_timeline.iter_objects(bsm=bsm, recursive=False)
+            ]
+            delta_commit_list, has_pending_compaction = parse_hudi_timeline(
+                filename_list
+            )
+            if has_pending_compaction or self.compaction_policy.is_triggered(
+                delta_commit_list, now=now
+            ):
+                table_list.append(table)
+        return table_list
+
+    def get_table_to_repartition_list(
+        self,
+        bsm: BotoSesManager,
+        table_group_tracker: TableGroupTracker,
+    ) -> T.List[str]:
+        """
+        Find the tables in the table group whose hudi partition fields in
+        ``.hoodie/hoodie.properties`` don't match the
+        :attr:`partition_scheme_mapper`. The incremental glue job writes the
+        new partition path right away, a record already written to the old
+        partition path would be duplicated, so these tables have to be
+        rewritten by the repartition glue job first. A table without
+        ``hoodie.properties`` is not created yet, it is not included.
+
+        The table that matches is saved in :attr:`partition_columns_mapper`,
+        it is not checked again until its partition scheme is changed.
+        """
+        table_list = list()
+        for table in table_group_tracker.table_list:
+            scheme = self.partition_scheme_mapper.get(table, default_partition_scheme)
+            partition_columns = get_partition_columns(scheme)
+            if self.partition_columns_mapper.get(table) == partition_columns:
+                continue
+            s3path = self.s3dir_database.joinpath(table, ".hoodie", "hoodie.properties")
+            if s3path.exists(bsm=bsm) is False:
+                continue
+            partition_fields = parse_hudi_partition_fields(s3path.read_text(bsm=bsm))
+            if partition_fields == partition_columns:
+                self.partition_columns_mapper[table] = partition_columns
+            else:
+                table_list.append(table)
+        return table_list
+
+    def run_compaction_glue_job(
+        self,
+        bsm: BotoSesManager,
+        table_group_tracker: TableGroupTracker,
+        table_list: T.List[str],
+    ) -> bool:
+        """
+        Run the compaction glue job for the tables of the table group.
+
+        :return: a boolean flag to indicate if the glue job run is started.
+        """
+        print(f"start compaction glue job run for tables {table_list}.")
+        try:
+            res = bsm.glue_client.start_job_run(
+                JobName=self.compaction_glue_job_name,
+                Arguments={"--TABLE_NAMES": ",".join(table_list)},
+            )
+        except Exception as e:
+            if "concurrent runs exceeded" in str(e).lower():
+                return False
+            else:
+                raise NotImplementedError(
+                    f"didn't implement the error handling logic for exception: {e!r}"
                 )
-                return self.run_glue_job(bsm=bsm)
+        job_run_id = res["JobRunId"]
+        print(f"job run id = {job_run_id}")
+        table_group_tracker.last_compaction_job_run_id = job_run_id
+        return True
+
+    def _is_triggered(
+        self,
+        table_group_tracker: TableGroupTracker,
+        listing_index: ListingIndex,
+        trigger_policy: TriggerPolicy,
+        now: datetime,
+    ) -> bool:
+        pending_file_list = list()
+        for table_tracker in self.table_tracker_list:
+            if table_tracker.table in table_group_tracker.table_list:
+                pending_file_list.extend(
+                    listing_index.get(table_tracker.table).get_pending_file_list(
+                        start_from=table_tracker.last_processed_datetime_plus_1ms,
+                    )
+                )
+        return trigger_policy.is_triggered(pending_file_list, now=now)
+
+    def try_to_run_glue_job(
+        self,
+        bsm: BotoSesManager,
+        max_workers: int = 1,
+        timeout: T.Optional[T.Union[int, float]] = None,
+        trigger_policy: T.Optional[TriggerPolicy] = None,
+        now: T.Optional[datetime] = None,
+    ) -> bool:
+        """
+        Check the status of the last glue job run of each table group, if it
+        is finished, then update the tracker and run a new glue job for this
+        group, as long as the number of running glue jobs doesn't exceed the
+        ``max_concurrent_runs``.
+
+        :param max_workers: see :meth:`CDCTracker.prepare_glue_job_input`.
+        :param timeout: see :meth:`CDCTracker.prepare_glue_job_input`.
+        :param trigger_policy: if given, only run the glue job for the table
+            group whose pending cdc data files in the :class:`ListingIndex`
+            meet the threshold.
+        :param now: the current time for the ``trigger_policy`` and the
+            ``compaction_policy``, default is the current UTC time.
+
+        If the MERGE_ON_READ tables of a ready table group meet the
+        ``compaction_policy``, it runs the compaction glue job instead, the
+        group is paused until the compaction is finished. So the compaction
+        never runs concurrently with the writer of the same table.
+
+        If a table of a ready table group is waiting for the repartition glue
+        job, see :meth:`get_table_to_repartition_list`, the group is skipped
+        until the table is rewritten with the new partition scheme.
+
+        :return: a boolean flag to indicate if it runs any incremental glue job,
+        """
+        print("try to run incremental glue job.")
+        if now is None:
+            now = datetime.utcnow().replace(tzinfo=timezone.utc)
+        ready_table_group_tracker_list = list()
+        n_running = 0
+        is_changed = False
+        for table_group_tracker in self.table_group_tracker_list:
+            was_ready = table_group_tracker.ready_to_run_next_glue_job
+            was_compacting = table_group_tracker.last_compaction_job_run_id is not None
+            if self.check_glue_job_run(bsm, table_group_tracker):
+                is_changed = is_changed or (not was_ready)
+                if self.check_compaction_job_run(bsm, table_group_tracker):
+                    ready_table_group_tracker_list.append(table_group_tracker)
+                    is_changed = is_changed or was_compacting
             else:
-                print(
-                    f"there is a running incremental glue job, "
-                    f"status = {state!r}, do nothing."
+                n_running += 1
+
+        if (self.compaction_policy is not None) and len(self.mor_table_list):
+            for table_group_tracker in ready_table_group_tracker_list:
+                table_list = self.get_table_to_compact_list(
+                    bsm, table_group_tracker, now
                 )
-                return False
+                if len(table_list) and self.run_compaction_glue_job(
+                    bsm, table_group_tracker, table_list
+                ):
+                    is_changed = True
+            ready_table_group_tracker_list = [
+                table_group_tracker
+                for table_group_tracker in ready_table_group_tracker_list
+                if table_group_tracker.last_compaction_job_run_id is None
+            ]
+
+        if self.partition_scheme_mapper is not None:
+            table_group_tracker_list = list()
+            for table_group_tracker in ready_table_group_tracker_list:
+                partition_columns_mapper = dict(self.partition_columns_mapper)
+                table_list = self.get_table_to_repartition_list(
+                    bsm, table_group_tracker
+                )
+                is_changed = is_changed or (
+                    self.partition_columns_mapper != partition_columns_mapper
+                )
+                if len(table_list):
+                    print(
+                        f"tables {table_list} are waiting for the repartition "
+                        f"glue job, skip the table group."
+                    )
+                else:
+                    table_group_tracker_list.append(table_group_tracker)
+            ready_table_group_tracker_list = table_group_tracker_list
+
+        if trigger_policy is not None:
+            if self.s3path_listing_index is None:
+                raise ValueError("trigger_policy requires the s3path_listing_index!")
+            listing_index = ListingIndex.read(bsm=bsm, s3path=self.s3path_listing_index)
+            ready_table_group_tracker_list = [
+                table_group_tracker
+                for table_group_tracker in ready_table_group_tracker_list
+                if self._is_triggered(
+                    table_group_tracker, listing_index, trigger_policy, now
+                )
+            ]
+
+        # the table group that waits longest goes first, to avoid starvation
+        ready_table_group_tracker_list.sort(
+            key=lambda table_group_tracker: (
+                table_group_tracker.last_glue_job_run_sequence_id or 0
+            )
+        )
+        flag = False
+        for table_group_tracker in ready_table_group_tracker_list:
+            if n_running >= self.max_concurrent_runs:
+                break
+            if self.run_glue_job(
+                bsm=bsm,
+                max_workers=max_workers,
+                timeout=timeout,
+                table_group_tracker=table_group_tracker,
+            ):
+                n_running += 1
+                flag = True
+            else:
+                break
+
+        if is_changed and (flag is False):
+            self.write(bsm=bsm)
+        return flag
+
+    def add_s3_event(
+        self,
+        listing_index: ListingIndex,
+        event: dict,
+    ) -> int:
+        """
+        Add the cdc data files reported by the s3 event to the pending files
+        of the listing index. The initial load files and the files of
+        unknown tables are ignored.
+
+        :return: number of new pending files.
+        """
+        s3dir_public = self.s3dir_dms_output_database.joinpath("public").to_dir()
+        table_set = {table_tracker.table for table_tracker in self.table_tracker_list}
+        n_new = 0
+        for bucket, key, size in parse_s3_event(event):
+            if (bucket != s3dir_public.bucket) or (
+                key.startswith(s3dir_public.key) is False
+            ):
+                continue
+            parts = key[len(s3dir_public.key) :].split("/")
+            if (parts[0] not in table_set) or parts[-1].startswith("LOAD"):
+                continue
+            try:
+                filename_to_datetime(S3Path(key).fname)
+            except ValueError:
+                continue
+            if listing_index.get(parts[0]).add_file(key=key, size=size):
+                n_new += 1
+        return n_new
+
+    def handle_s3_event(
+        self,
+        bsm: BotoSesManager,
+        event: dict,
+        trigger_policy: TriggerPolicy,
+        max_workers: int = 1,
+        timeout: T.Optional[T.Union[int, float]] = None,
+        now: T.Optional[datetime] = None,
+    ) -> bool:
+        """
+        The event driven orchestration entry point. Add the new cdc data files
+        reported by the s3 ``ObjectCreated`` event to the listing index, then
+        run the glue job for the table groups that meet the ``trigger_policy``.
+
+        The event without s3 records, for example a scheduled event, only
+        checks the thresholds. It makes sure the ``max_age`` threshold is
+        met even if there's no new cdc data file.
+
+        The tracker and the listing index are read, modified and written back
+        to s3 without lock, the caller must not run it concurrently, e.g. the
+        lambda function has reserved concurrency 1. Otherwise two invocations
+        may start duplicated glue job runs and lose the listing index updates.
+
+        :return: a boolean flag to indicate if it runs any glue job,
+        """
+        if self.s3path_listing_index is None:
+            raise ValueError("handle_s3_event requires the s3path_listing_index!")
+        listing_index = ListingIndex.read(bsm=bsm, s3path=self.s3path_listing_index)
+        n_new = self.add_s3_event(listing_index, event)
+        print(f"got {n_new} new cdc data files from s3 event.")
+        if n_new:
+            listing_index.write(bsm=bsm)
+        return self.try_to_run_glue_job(
+            bsm=bsm,
+            max_workers=max_workers,
+            timeout=timeout,
+            trigger_policy=trigger_policy,
+            now=now,
+        )
+
+    def get_lag_report(self, now: datetime) -> T.Dict[str, float]:
+        """
+        Get the end-to-end lag in seconds of each table.
+        """
+        return {
+            table_tracker.table: table_tracker.get_lag(now)
+            for table_tracker in self.table_tracker_list
+        }
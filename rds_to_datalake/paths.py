@@ -8,6 +8,8 @@ from pathlib_mate import Path
 
 # git repo root directory
 dir_project_root = Path.dir_here(__file__).parent
+# the rds_to_datalake python library directory
+dir_python_lib = Path.dir_here(__file__)
 
 # virtualenv
 dir_venv = dir_project_root / ".venv"
@@ -33,14 +35,31 @@ dir_lbd_funcs = dir_project_root.joinpath("lambda_functions")
 path_lbd_func_dynamodb_stream_consumer = dir_lbd_funcs.joinpath("dynamodb_stream_consumer.py")
 path_lbd_func_dynamodb_export_to_s3_post_processor_coordinator = dir_lbd_funcs.joinpath("dynamodb_export_to_s3_post_processor_coordinator.py")
 path_lbd_func_dynamodb_export_to_s3_post_processor_worker = dir_lbd_funcs.joinpath("dynamodb_export_to_s3_post_processor_worker.py")
+path_lbd_func_incremental_glue_job_orchestrator = dir_lbd_funcs.joinpath("incremental_glue_job_orchestrator.py")
 
 # glue job source code
 dir_glue_jobs = dir_project_root.joinpath("glue_jobs")
 path_glue_script_initial_load = dir_glue_jobs.joinpath("initial_load.py")
 path_glue_script_incremental = dir_glue_jobs.joinpath("incremental.py")
+path_glue_script_repartition = dir_glue_jobs.joinpath("repartition.py")
+path_glue_script_compaction = dir_glue_jobs.joinpath("compaction.py")
+# the module imported by the glue scripts, see rds_to_datalake/hudi_partition.py
+path_glue_lib_hudi_partition = dir_python_lib.joinpath("hudi_partition.py")
 
 # lambda function deployment package build directory
 dir_build_lambda = dir_project_root.joinpath("build", "lambda")
+# lambda layer build directory, the dynamodb lambda functions use this layer
+dir_build_lambda_layer = dir_project_root.joinpath("build", "lambda_layer")
 
 # temp athena query result csv file
 path_query_result = dir_project_root.joinpath("query_result.csv")
+
+# temp athena query result parquet files
+dir_tmp = dir_project_root.joinpath("tmp")
+dir_athena_result = dir_tmp.joinpath("athena_result")
+# local athena query result cache
+dir_athena_cache = dir_tmp.joinpath("athena_cache")
+# rds vs hudi compare report
+path_compare_report = dir_tmp.joinpath("compare_report.json")
+# local cloudformation stack outputs cache
+dir_cdk_outputs_cache = dir_tmp.joinpath("cdk_outputs_cache")
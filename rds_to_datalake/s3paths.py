@@ -26,6 +26,18 @@ s3path_initial_load_glue_script = s3dir_glue_artifacts.joinpath(
 s3path_incremental_glue_script = s3dir_glue_artifacts.joinpath(
     paths.path_glue_script_incremental.basename
 )
+# s3 path to repartition glue script
+s3path_repartition_glue_script = s3dir_glue_artifacts.joinpath(
+    paths.path_glue_script_repartition.basename
+)
+# s3 path to compaction glue script
+s3path_compaction_glue_script = s3dir_glue_artifacts.joinpath(
+    paths.path_glue_script_compaction.basename
+)
+# s3 path to the module imported by the glue scripts
+s3path_hudi_partition_glue_lib = s3dir_glue_artifacts.joinpath(
+    paths.path_glue_lib_hudi_partition.basename
+)
 
 # s3 folder to store data
 s3dir_data = S3Path(
@@ -33,6 +45,10 @@ s3dir_data = S3Path(
 ).to_dir()
 # glue catalog database s3 location
 s3dir_database = s3dir_data.joinpath("databases", config.glue_database).to_dir()
+# s3 folder to store the rewritten tables during a repartition
+s3dir_database_staging = s3dir_data.joinpath(
+    "databases_staging", config.glue_database
+).to_dir()
 # s3 folder to store Athena query results
 s3dir_athena_result = s3dir_data.joinpath("athena", "results").to_dir()
 # s3 folder to store dms output for database
@@ -48,3 +64,8 @@ s3path_incremental_glue_job_tracker = s3dir_data.joinpath(
     "glue_jobs",
     "incremental_glue_job_tracker.json",
 )
+# s3 path to store incremental glue job s3 listing index
+s3path_incremental_glue_job_listing_index = s3dir_data.joinpath(
+    "glue_jobs",
+    "incremental_glue_job_listing_index.json",
+)
@@ -3,7 +3,8 @@
 import typing as T
 import sys
 import time
-import itertools
+import random
+import asyncio
 
 
 class Waiter:
@@ -12,6 +13,12 @@ class Waiter:
     if a long-running job is done every X seconds and timeout in Y seconds.
     This class allow you to customize the polling interval and timeout,.
 
+    The delay starts from ``delays`` and is multiplied by ``backoff`` after
+    each attempt, up to ``max_delay``, with a random ``jitter`` ratio. The
+    default ``backoff = 1`` polls at a fixed interval. The loop body can call
+    :meth:`Waiter.suggest` to use a state-aware delay for the next attempt,
+    for example based on the estimated remaining time of the job.
+
     Example:
 
     .. code-block:: python
@@ -29,6 +36,16 @@ class Waiter:
                 break
 
         print("after waiter")
+
+    :param delays: the delay before the first attempt.
+    :param timeout: raise ``TimeoutError`` after this many seconds.
+    :param backoff: the multiplier of the delay after each attempt.
+    :param max_delay: the upper bound of the delay, default is no limit.
+    :param jitter: the delay is randomly scaled by ``1 ± jitter``, so that
+        many concurrent waiters don't poll at the same time.
+    :param clock: the function to get the current time, for testing.
+    :param sleep: the function to sleep, for testing.
+    :param rnd: the random generator of the jitter, for testing.
     """
     def __init__(
         self,
@@ -36,14 +53,60 @@ class Waiter:
         timeout: T.Union[int, float],
         indent: int = 0,
         verbose: bool = True,
+        backoff: T.Union[int, float] = 1,
+        max_delay: T.Optional[T.Union[int, float]] = None,
+        jitter: float = 0.0,
+        clock: T.Callable[[], float] = time.time,
+        sleep: T.Callable[[float], T.Any] = time.sleep,
+        rnd: T.Optional[random.Random] = None,
     ):
+        if backoff < 1:
+            raise ValueError("backoff has to be greater than or equal to 1")
+        if not (0 <= jitter < 1):
+            raise ValueError("jitter has to be in [0, 1)")
         self._delays = delays
-        self.delays = itertools.repeat(delays)
         self.timeout = timeout
         self.tab = " " * indent
         self.verbose = verbose
+        self.backoff = backoff
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.clock = clock
+        self.sleep = sleep
+        self.rnd = random.Random() if rnd is None else rnd
+        self._delay = delays
+        self._suggested_delay: T.Optional[float] = None
 
-    def __iter__(self):
+    @property
+    def delay(self) -> float:
+        """
+        The backoff delay of the next attempt, without jitter.
+        """
+        return self._delay
+
+    def suggest(self, delay: T.Union[int, float]):
+        """
+        Use this delay (bounded by ``max_delay``) for the next attempt instead
+        of the backoff delay. The backoff continues from this delay.
+        """
+        self._suggested_delay = delay
+
+    def _clip(self, delay: float) -> float:
+        if self.max_delay is not None:
+            delay = min(delay, self.max_delay)
+        return max(delay, 0)
+
+    def _next_delay(self) -> float:
+        if self._suggested_delay is not None:
+            self._delay = self._clip(self._suggested_delay)
+            self._suggested_delay = None
+        delay = self._delay
+        self._delay = self._clip(self._delay * self.backoff)
+        if self.jitter:
+            delay = delay * (1 + self.rnd.uniform(-self.jitter, self.jitter))
+        return delay
+
+    def _start(self) -> float:
         if self.verbose: # pragma: no cover
             sys.stdout.write(
                 f"start waiter, polling every {self._delays} seconds, "
@@ -56,21 +119,85 @@ class Waiter:
                 f"remain {self.timeout} seconds ..."
             )
             sys.stdout.flush()
-        start = time.time()
+        self._delay = self._clip(self._delays)
+        self._suggested_delay = None
+        return self.clock()
+
+    def _remaining(self, end: float) -> float:
+        remaining = end - self.clock()
+        if remaining <= 0:
+            raise TimeoutError(f"timed out in {self.timeout} seconds!")
+        return remaining
+
+    def _report(self, attempt: int, start: float) -> int:
+        elapsed = int(self.clock() - start)
+        if self.verbose: # pragma: no cover
+            sys.stdout.write(
+                f"\r{self.tab}on {attempt} th attempt, "
+                f"elapsed {elapsed} seconds, "
+                f"remain {self.timeout - elapsed} seconds ..."
+            )
+            sys.stdout.flush()
+        return elapsed
+
+    def __iter__(self) -> T.Iterator[T.Tuple[int, int]]:
+        start = self._start()
+        end = start + self.timeout
+        attempt = 0
+        while True:
+            remaining = self._remaining(end)
+            attempt += 1
+            self.sleep(min(self._next_delay(), remaining))
+            yield attempt, self._report(attempt, start)
+
+
+class AsyncWaiter(Waiter):
+    """
+    The asyncio version of :class:`Waiter`, it sleeps with ``asyncio.sleep``,
+    so many jobs can be awaited concurrently in one process.
+
+    Example:
+
+    .. code-block:: python
+
+        async for attempt, elapse in AsyncWaiter(delays=1, timeout=10):
+            ...
+    """
+    def __init__(
+        self,
+        delays: T.Union[int, float],
+        timeout: T.Union[int, float],
+        indent: int = 0,
+        verbose: bool = True,
+        backoff: T.Union[int, float] = 1,
+        max_delay: T.Optional[T.Union[int, float]] = None,
+        jitter: float = 0.0,
+        clock: T.Callable[[], float] = time.time,
+        sleep: T.Callable[[float], T.Awaitable] = asyncio.sleep,
+        rnd: T.Optional[random.Random] = None,
+    ):
+        super().__init__(
+            delays=delays,
+            timeout=timeout,
+            indent=indent,
+            verbose=verbose,
+            backoff=backoff,
+            max_delay=max_delay,
+            jitter=jitter,
+            clock=clock,
+            sleep=sleep,
+            rnd=rnd,
+        )
+
+    def __iter__(self):
+        raise TypeError("use 'async for' with AsyncWaiter")
+
+    async def __aiter__(self) -> T.AsyncIterator[T.Tuple[int, int]]:
+        start = self._start()
         end = start + self.timeout
-        for attempt, delay in enumerate(self.delays, 1):
-            now = time.time()
-            remaining = end - now
-            if remaining < 0:
-                raise TimeoutError(f"timed out in {self.timeout} seconds!")
-            else:
-                time.sleep(min(delay, remaining))
-                elapsed = int(now - start + delay)
-                if self.verbose: # pragma: no cover
-                    sys.stdout.write(
-                        f"\r{self.tab}on {attempt} th attempt, "
-                        f"elapsed {elapsed} seconds, "
-                        f"remain {self.timeout - elapsed} seconds ..."
-                    )
-                    sys.stdout.flush()
-                yield attempt, int(elapsed)
+        attempt = 0
+        while True:
+            remaining = self._remaining(end)
+            attempt += 1
+            await self.sleep(min(self._next_delay(), remaining))
+            yield attempt, self._report(attempt, start)
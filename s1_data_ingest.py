@@ -10,7 +10,6 @@ from datetime import datetime, timezone
 
 from faker import Faker
 from fixa.timer import DateTimeTimer
-from ordered_set import OrderedSet
 import sqlalchemy as sa
 import sqlalchemy.orm as orm
 from rich import print as rprint
@@ -20,6 +19,8 @@ from rds_to_datalake.s3paths import s3dir_dms_output_database, s3dir_database
 from rds_to_datalake.boto_ses import bsm
 from rds_to_datalake.db_connect import create_engine_for_this_project
 from rds_to_datalake.db_orm import Base, Account, Transaction
+from rds_to_datalake.data_faker import EventMix, run_bulk_data_faker
+from rds_to_datalake.id_pool import IdPool
 
 engine = create_engine_for_this_project()
 Base.metadata.create_all(engine)
@@ -49,13 +50,9 @@ def rnd_account() -> str:
     )
 
 
-with engine.connect() as conn:
-    account_set = OrderedSet(
-        [row[0] for row in conn.execute(sa.text("SELECT id FROM accounts"))]
-    )
-    transaction_set = OrderedSet(
-        [row[0] for row in conn.execute(sa.text("SELECT id FROM transactions"))]
-    )
+# only a random sample of the existing ids is loaded
+account_set = IdPool.from_table(engine, Account.__table__, capacity=100000)
+transaction_set = IdPool.from_table(engine, Transaction.__table__, capacity=100000)
 
 
 def new_account():
@@ -77,7 +74,7 @@ def new_account():
 
 def update_account():
     with orm.Session(engine) as session:
-        account_id = random.choice(account_set)
+        account_id = account_set.choice()
         account = session.get(Account, account_id)
 
         now = get_utc_now()
@@ -91,7 +88,7 @@ def new_transaction():
     Simulate an event that create a new transaction.
     """
     with orm.Session(engine) as session:
-        account_id = random.choice(account_set)
+        account_id = account_set.choice()
         now = get_utc_now()
         transaction = Transaction(
             id=f"{account_id}={now.isoformat()}",
@@ -110,7 +107,7 @@ def new_transaction():
 
 def update_transaction():
     with orm.Session(engine) as session:
-        transaction_id = random.choice(transaction_set)
+        transaction_id = transaction_set.choice()
         transaction_id = session.get(Transaction, transaction_id)
 
         now = get_utc_now()
@@ -161,11 +158,27 @@ def run_data_faker():
 
     return ith + 2
 
+
+def run_bulk():
+    """
+    High throughput mode, see :mod:`rds_to_datalake.data_faker`.
+    """
+    run_bulk_data_faker(
+        engine_factory=create_engine_for_this_project,
+        n_event=100000,
+        batch_size=1000,
+        target_tps=1000,
+        mix=EventMix(),
+        n_worker=4,
+    )
+
+
 if __name__ == "__main__":
     # delete_all()
     # TPS ~= 10
     with DateTimeTimer() as timer:
         n = run_data_faker()
+    # run_bulk()
 
     # with orm.Session(engine) as session:
     #     for transaction in session.query(Transaction):
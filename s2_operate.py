@@ -12,6 +12,7 @@ from rds_to_datalake.api import (
     # run_athena_query,
     # preview_hudi_table,
     compare,
+    reconcile,
     cleanup,
 )
 
@@ -23,5 +24,6 @@ cdk_deploy_2_rds_database()
 # preview_hudi_table()
 # preview_hudi_table()
 # compare()
+# reconcile()
 # investigate()
 # cleanup()
@@ -33,9 +33,16 @@ def test():
     _ = config.dms_s3_target_endpoint_name
     _ = config.dms_replication_task_name
     _ = config.lambda_function_name_dynamodb_stream_consumer
+    _ = config.lambda_function_name_incremental_glue_job_orchestrator
     _ = config.glue_database
     _ = config.glue_job_name_initial_load
     _ = config.glue_job_name_incremental
+    _ = config.glue_job_name_repartition
+    _ = config.get_hudi_partition_scheme("transactions")
+    _ = config.glue_job_name_compaction
+    _ = config.get_hudi_table_type("transactions")
+    _ = config.hudi_mor_table_list
+    _ = config.get_athena_table_name("transactions")
     _ = config.s3_bucket_artifacts
     _ = config.s3_bucket_data
     _ = config.s3_bucket_glue_assets
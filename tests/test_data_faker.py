@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+
+import random
+import functools
+
+import sqlalchemy as sa
+
+from rds_to_datalake.db_orm import Base
+from rds_to_datalake.data_faker import (
+    EventMix,
+    FakeDataPool,
+    GeneratorReport,
+    BatchGenerator,
+    run_bulk_data_faker,
+)
+
+
+def count_rows(engine, table_name: str) -> int:
+    with engine.connect() as conn:
+        return conn.execute(sa.text(f"SELECT COUNT(*) FROM {table_name}")).scalar()
+
+
+def test_event_mix():
+    n_event = EventMix().sample(1000, random.Random(1))
+    assert sum(n_event.values()) == 1000
+    assert n_event["new_transaction"] > n_event["update_account"]
+
+    n_event = EventMix(update_account=0, update_transaction=0).sample(
+        100, random.Random(1)
+    )
+    assert n_event["update_account"] == 0
+    assert n_event["update_transaction"] == 0
+
+
+def test_batch_generator():
+    engine = sa.create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    generator = BatchGenerator(
+        engine,
+        data_pool=FakeDataPool(size=10, seed=1),
+        pool_size=50,
+        seed=1,
+    )
+    # the first batch has no row to update
+    n_event = generator.run_batch(10)
+    assert n_event["update_account"] == 0
+    assert n_event["update_transaction"] == 0
+
+    report = generator.run(n_event=500, batch_size=100)
+    assert report.total == 500
+    report.merge(GeneratorReport(n_event=n_event))
+    assert count_rows(engine, "accounts") == report.n_event["new_account"]
+    assert count_rows(engine, "transactions") == report.n_event["new_transaction"]
+    assert report.n_event["update_transaction"] > 0
+    assert len(generator.account_ids) <= 50
+    assert len(generator.transaction_ids) == 50
+
+    with engine.connect() as conn:
+        n_updated = conn.execute(
+            sa.text("SELECT COUNT(*) FROM transactions WHERE update_at > create_at")
+        ).scalar()
+    assert n_updated > 0
+
+
+def test_batch_generator_update_after_create():
+    """
+    An account can be created and updated in the same batch, the update must
+    be after the insert, otherwise the insert wins the latest version dedup.
+    """
+    engine = sa.create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    generator = BatchGenerator(
+        engine,
+        data_pool=FakeDataPool(size=10, seed=1),
+        pool_size=1000,
+        seed=1,
+    )
+    generator.run(n_event=3000, batch_size=500)
+    with engine.connect() as conn:
+        for table_name in ["accounts", "transactions"]:
+            n_invalid = conn.execute(
+                sa.text(
+                    f"SELECT COUNT(*) FROM {table_name} WHERE update_at < create_at"
+                )
+            ).scalar()
+            assert n_invalid == 0
+        n_updated = conn.execute(
+            sa.text("SELECT COUNT(*) FROM accounts WHERE update_at > create_at")
+        ).scalar()
+    assert n_updated > 0
+
+
+def test_batch_generator_id_collision():
+    """
+    A new row whose id already exists is skipped, the rest of the batch is
+    still written.
+    """
+    mix = EventMix(
+        new_account=1, update_account=0, new_transaction=0, update_transaction=0
+    )
+
+    def new_generator(engine) -> BatchGenerator:
+        Base.metadata.create_all(engine)
+        return BatchGenerator(
+            engine, mix=mix, data_pool=FakeDataPool(size=10, seed=1), seed=1
+        )
+
+    # the same seed generates the same account ids
+    engine = sa.create_engine("sqlite:///:memory:")
+    new_generator(engine).run_batch(20)
+    with engine.connect() as conn:
+        account_id = conn.execute(sa.text("SELECT id FROM accounts")).scalar()
+
+    engine = sa.create_engine("sqlite:///:memory:")
+    generator = new_generator(engine)
+    with engine.begin() as conn:
+        conn.execute(
+            sa.text(
+                "INSERT INTO accounts (id, email, create_at, update_at) "
+                "VALUES (:id, 'seeded', '2000-01-01', '2000-01-01')"
+            ),
+            {"id": account_id},
+        )
+    n_event = generator.run_batch(20)
+    assert n_event["new_account"] == 19
+    assert count_rows(engine, "accounts") == 20
+    with engine.connect() as conn:
+        email = conn.execute(
+            sa.text("SELECT email FROM accounts WHERE id = :id"), {"id": account_id}
+        ).scalar()
+    assert email == "seeded"
+
+
+def test_run_bulk_data_faker(tmp_path):
+    url = f"sqlite:///{tmp_path.joinpath('test.sqlite')}"
+    engine = sa.create_engine(url)
+    Base.metadata.create_all(engine)
+    report = run_bulk_data_faker(
+        engine_factory=functools.partial(sa.create_engine, url),
+        n_event=301,
+        batch_size=50,
+        n_worker=2,
+        seed=1,
+        verbose=False,
+    )
+    assert report.total == 301
+    assert report.tps > 0
+    assert count_rows(engine, "transactions") == report.n_event["new_transaction"]
+
+    # paced by the target TPS
+    report = run_bulk_data_faker(
+        engine_factory=functools.partial(sa.create_engine, url),
+        n_event=20,
+        batch_size=10,
+        target_tps=40,
+        verbose=False,
+    )
+    assert report.elapsed >= 0.25
+
+
+if __name__ == "__main__":
+    from rds_to_datalake.tests.helper import run_cov_test
+
+    run_cov_test(__file__, "rds_to_datalake.data_faker")
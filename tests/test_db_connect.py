@@ -1,10 +1,25 @@
 # -*- coding: utf-8 -*-
 
-from rds_to_datalake.db_connect import create_engine_for_this_project
+from rds_to_datalake.db_connect import create_engine, create_engine_for_this_project
+
+
+def test_create_engine():
+    engine = create_engine(
+        host="localhost",
+        port=5432,
+        database="postgres",
+        username="postgres",
+        password="password",
+        pool_size=3,
+    )
+    assert engine.pool.size() == 3
+    assert engine.pool._pre_ping is True
 
 
 def test_create_engine_for_this_proejct():
-    create_engine_for_this_project()
+    engine = create_engine_for_this_project()
+    assert create_engine_for_this_project() is engine
+    assert create_engine_for_this_project(use_cache=False) is not engine
 
 
 if __name__ == "__main__":
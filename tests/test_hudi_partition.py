@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from rds_to_datalake.hudi_partition import (
+    parse_partition_scheme,
+    get_partition_columns,
+    get_partition_options,
+    parse_hudi_partition_fields,
+)
+
+
+def test_parse_partition_scheme():
+    assert parse_partition_scheme("none") == (0, None, None)
+    assert parse_partition_scheme("minute") == (5, None, None)
+    assert parse_partition_scheme("month, bucket:account_id:16") == (
+        2,
+        "account_id",
+        16,
+    )
+    for scheme in [
+        "week",
+        "day,hour",
+        "bucket:account_id",
+        "bucket:account_id:0",
+        "bucket:account_id:x",
+    ]:
+        with pytest.raises(ValueError):
+            parse_partition_scheme(scheme)
+
+
+def test_get_partition_columns():
+    assert get_partition_columns("none") == []
+    assert get_partition_columns("day") == [
+        "create_year",
+        "create_month",
+        "create_day",
+    ]
+    assert get_partition_columns("bucket:account_id:16") == ["account_id_bucket"]
+    assert get_partition_columns("year,bucket:account_id:16") == [
+        "create_year",
+        "account_id_bucket",
+    ]
+    # the module level list is not mutated
+    assert get_partition_columns("year") == ["create_year"]
+
+
+def test_get_partition_options():
+    options = get_partition_options("month")
+    assert options["hoodie.datasource.write.partitionpath.field"] == (
+        "create_year,create_month"
+    )
+    assert "MultiPartKeysValueExtractor" in (
+        options["hoodie.datasource.hive_sync.partition_extractor_class"]
+    )
+    options = get_partition_options("none")
+    assert options["hoodie.datasource.write.partitionpath.field"] == ""
+    assert "NonpartitionedKeyGenerator" in (
+        options["hoodie.datasource.write.keygenerator.class"]
+    )
+
+
+def test_parse_hudi_partition_fields():
+    properties = "\n".join(
+        [
+            "#Properties saved on 2023-01-01T00:00:00.000Z",
+            "hoodie.table.name=accounts",
+            "hoodie.table.partition.fields=create_year,create_month",
+        ]
+    )
+    assert parse_hudi_partition_fields(properties) == ["create_year", "create_month"]
+    assert parse_hudi_partition_fields("hoodie.table.partition.fields=") == []
+    assert parse_hudi_partition_fields("hoodie.table.name=accounts") == []
+
+
+if __name__ == "__main__":
+    from rds_to_datalake.tests.helper import run_cov_test
+
+    run_cov_test(__file__, "rds_to_datalake.hudi_partition")
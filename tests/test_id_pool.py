@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+import random
+import collections
+
+import pytest
+import sqlalchemy as sa
+
+from rds_to_datalake.id_pool import (
+    estimate_row_count,
+    sample_ids,
+    IdPool,
+)
+
+metadata = sa.MetaData()
+table = sa.Table(
+    "accounts",
+    metadata,
+    sa.Column("id", sa.String, primary_key=True),
+)
+
+
+@pytest.fixture
+def engine():
+    engine = sa.create_engine("sqlite:///:memory:")
+    metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(
+            table.insert(), [{"id": f"a-{str(ith).zfill(4)}"} for ith in range(1000)]
+        )
+    return engine
+
+
+def test_sample_ids(engine):
+    assert estimate_row_count(engine, table) == 1000
+    ids = sample_ids(engine, table, 100)
+    assert len(ids) == len(set(ids)) == 100
+    assert ids != sorted(ids)
+
+
+def test_id_pool_from_table(engine):
+    pool = IdPool.from_table(engine, table, capacity=100, rnd=random.Random(1))
+    assert len(pool) == 100
+    assert pool.n_seen == 1000
+    assert pool.choice().startswith("a-")
+
+
+def test_id_pool_reservoir():
+    pool = IdPool(capacity=100, rnd=random.Random(1))
+    with pytest.raises(IndexError):
+        pool.choice()
+    pool.extend([f"a-{ith}" for ith in range(10000)])
+    assert len(pool) == 100
+    assert pool.n_seen == 10000
+    # the pool is a uniform sample, not only the first or last ids
+    n_recent = len([id for id in pool.ids if int(id[2:]) >= 5000])
+    assert 30 <= n_recent <= 70
+
+
+def test_id_pool_zipf():
+    ids = [f"a-{ith}" for ith in range(100)]
+    uniform = IdPool(ids, rnd=random.Random(1))
+    skewed = IdPool(ids, zipf_s=1.2, rnd=random.Random(1))
+    n = 10000
+    uniform_counter = collections.Counter([uniform.choice() for _ in range(n)])
+    skewed_counter = collections.Counter([skewed.choice() for _ in range(n)])
+    assert uniform_counter["a-0"] < n * 0.05
+    assert skewed_counter["a-0"] > n * 0.2
+    assert skewed_counter["a-0"] > skewed_counter["a-1"] > skewed_counter["a-50"]
+
+
+if __name__ == "__main__":
+    from rds_to_datalake.tests.helper import run_cov_test
+
+    run_cov_test(__file__, "rds_to_datalake.id_pool")
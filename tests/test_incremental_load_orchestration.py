@@ -1,11 +1,32 @@
 # -*- coding: utf-8 -*-
 
-from datetime import datetime, timezone
+import typing as T
+import json
+import time
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import moto
+from s3pathlib import S3Path
+from boto_session_manager import BotoSesManager
+
 from rds_to_datalake.incremental_load_orchestration import (
     datetime_to_s3_key,
     filename_to_datetime,
     PerTableTodo,
     GlueJobInput,
+    BatchPlanner,
+    TriggerPolicy,
+    hudi_instant_to_datetime,
+    parse_hudi_timeline,
+    CompactionPolicy,
+    parse_s3_event,
+    ListingIndex,
+    TableTracker,
+    TableGroupTracker,
+    new_table_group_tracker_list,
+    CDCTracker,
 )
 
 
@@ -46,6 +67,790 @@ def test_iso_format_seder():
     assert dt1.tzinfo == timezone.utc
 
 
+epoch = datetime(2023, 1, 1, tzinfo=timezone.utc)
+
+
+def make_s3path(key: str, size: int) -> S3Path:
+    s3path = S3Path("my-bucket", key)
+    s3path._meta = {"ContentLength": size}
+    return s3path
+
+
+class TestBatchPlanner:
+    def test_plan_table(self):
+        s3path_list = [make_s3path(f"{ith}.parquet", 100) for ith in range(10)]
+        assert len(BatchPlanner().plan_table(s3path_list)) == 2
+        assert len(BatchPlanner().plan_table([])) == 0
+
+        batch_planner = BatchPlanner(max_files_per_table=5, max_bytes_per_table=250)
+        assert len(batch_planner.plan_table(s3path_list)) == 2
+
+        batch_planner = BatchPlanner(
+            max_files_per_table=100,
+            max_bytes_per_table=1000,
+            max_rows_per_table=35,
+            bytes_per_row=10,
+        )
+        assert len(batch_planner.plan_table(s3path_list)) == 3
+
+        # always take at least one file
+        batch_planner = BatchPlanner(max_files_per_table=5, max_bytes_per_table=50)
+        assert len(batch_planner.plan_table(s3path_list)) == 1
+
+    def test_plan_run(self):
+        s3path_list_list = [
+            [make_s3path(f"a{ith}.parquet", 100) for ith in range(3)],
+            [],
+            [make_s3path(f"c{ith}.parquet", 300) for ith in range(3)],
+        ]
+        assert BatchPlanner().plan_run(s3path_list_list) == s3path_list_list
+
+        batch_list = BatchPlanner(max_bytes_per_run=800).plan_run(s3path_list_list)
+        assert [len(batch) for batch in batch_list] == [2, 0, 2]
+
+        batch_list = BatchPlanner(max_bytes_per_run=350).plan_run(s3path_list_list)
+        assert [len(batch) for batch in batch_list] == [3, 0, 0]
+
+        # always take at least one file
+        batch_list = BatchPlanner(max_bytes_per_run=10).plan_run(s3path_list_list)
+        assert [len(batch) for batch in batch_list] == [1, 0, 0]
+
+
+@pytest.fixture
+def bsm():
+    with moto.mock_aws():
+        bsm = BotoSesManager(region_name="us-east-1")
+        bsm.s3_client.create_bucket(Bucket="my-bucket")
+        yield bsm
+
+
+@pytest.fixture
+def s3dir_dms_output_database(bsm) -> S3Path:
+    s3dir = S3Path("s3://my-bucket/dms/").to_dir()
+    for table, n_files in [("accounts", 3), ("transactions", 5)]:
+        s3dir_table = s3dir.joinpath("public", table).to_dir()
+        s3dir_table.joinpath("LOAD00000001.parquet").write_bytes(b"", bsm=bsm)
+        for ith in range(1, 1 + n_files):
+            key = datetime_to_s3_key(epoch + timedelta(minutes=ith))
+            s3dir_table.joinpath(f"{key}.parquet").write_bytes(b"", bsm=bsm)
+    return s3dir
+
+
+def make_cdc_tracker(
+    s3dir_dms_output_database: S3Path,
+    s3path_listing_index: T.Optional[S3Path] = None,
+    batch_planner: T.Optional[BatchPlanner] = None,
+) -> CDCTracker:
+    if batch_planner is None:
+        batch_planner = BatchPlanner()
+    return CDCTracker(
+        s3path_tracker=S3Path("s3://my-bucket/tracker.json"),
+        s3dir_glue_job_input=S3Path("s3://my-bucket/glue_job_input/").to_dir(),
+        s3dir_dms_output_database=s3dir_dms_output_database,
+        glue_job_name="my-glue-job",
+        s3path_listing_index=s3path_listing_index,
+        batch_planner=batch_planner,
+        table_tracker_list=[
+            TableTracker(
+                table=table,
+                epoch_processed_time_str=epoch.isoformat(),
+                last_processed_time_str=epoch.isoformat(),
+            )
+            for table in ["accounts", "transactions", "not_exists"]
+        ],
+        last_glue_job_run_sequence_id=0,
+    )
+
+
+class BlockingS3Client:
+    """
+    The ``ListObjectsV2`` call of the prefix hangs until ``release`` is set.
+    """
+
+    def __init__(self, s3_client, prefix: str, release: threading.Event):
+        self.s3_client_ = s3_client
+        self.prefix = prefix
+        self.release = release
+
+    def __getattr__(self, name: str):
+        return getattr(self.s3_client_, name)
+
+    def get_paginator(self, operation_name: str):
+        paginator = self.s3_client_.get_paginator(operation_name)
+        client = self
+
+        class Paginator:
+            def paginate(self, **kwargs):
+                if client.prefix in kwargs["Prefix"]:
+                    client.release.wait(30)
+                return paginator.paginate(**kwargs)
+
+        return Paginator()
+
+
+class TestCDCTracker:
+    def test_prepare_glue_job_input(self, bsm, s3dir_dms_output_database):
+        serial = make_cdc_tracker(s3dir_dms_output_database)
+        glue_job_input = serial.prepare_glue_job_input(bsm=bsm)
+        assert [todo.table for todo in glue_job_input.todo_list] == [
+            "accounts",
+            "transactions",
+            "not_exists",
+        ]
+        assert len(glue_job_input.todo_list[0].s3uri_list) == 2
+        assert len(glue_job_input.todo_list[2].s3uri_list) == 0
+        for s3uri in glue_job_input.todo_list[0].s3uri_list:
+            assert "/LOAD" not in s3uri
+
+        concurrent = make_cdc_tracker(s3dir_dms_output_database)
+        assert (
+            concurrent.prepare_glue_job_input(bsm=bsm, max_workers=4, timeout=60)
+            == glue_job_input
+        )
+        assert concurrent.table_tracker_list == serial.table_tracker_list
+
+    def test_prepare_glue_job_input_timeout(self, bsm, s3dir_dms_output_database):
+        cdc_tracker = make_cdc_tracker(s3dir_dms_output_database)
+        glue_job_input = cdc_tracker.prepare_glue_job_input(
+            bsm=bsm, max_workers=4, timeout=-1
+        )
+        # the empty table has nothing to list, it may finish before the
+        # deadline
+        assert "accounts" not in [todo.table for todo in glue_job_input.todo_list]
+        table_tracker = cdc_tracker.table_tracker_list[0]
+        assert (
+            table_tracker.next_processed_time_str
+            == table_tracker.last_processed_time_str
+        )
+
+    def test_prepare_glue_job_input_hanging_listing(
+        self, bsm, s3dir_dms_output_database
+    ):
+        s3path_listing_index = S3Path("s3://my-bucket/listing_index.json")
+        cdc_tracker = make_cdc_tracker(
+            s3dir_dms_output_database,
+            s3path_listing_index=s3path_listing_index,
+        )
+        release = threading.Event()
+        s3_client = BlockingS3Client(bsm.s3_client, "/accounts/", release)
+        try:
+            start = time.time()
+            glue_job_input = cdc_tracker.prepare_glue_job_input(
+                bsm=bsm, max_workers=4, timeout=1, s3_client=s3_client
+            )
+            assert time.time() - start < 5
+        finally:
+            release.set()
+        assert [todo.table for todo in glue_job_input.todo_list] == [
+            "transactions",
+            "not_exists",
+        ]
+        table_tracker = cdc_tracker.table_tracker_list[0]
+        assert (
+            table_tracker.next_processed_time_str
+            == table_tracker.last_processed_time_str
+        )
+        # the listing left behind doesn't move the listing index
+        listing_index = ListingIndex.read(bsm=bsm, s3path=s3path_listing_index)
+        assert listing_index.get("accounts").last_listed_key is None
+        assert listing_index.get("transactions").last_listed_key is not None
+
+        # serial listing is cut as well
+        release.clear()
+        try:
+            glue_job_input = cdc_tracker.prepare_glue_job_input(
+                bsm=bsm, timeout=1, s3_client=s3_client
+            )
+        finally:
+            release.set()
+        assert "accounts" not in [todo.table for todo in glue_job_input.todo_list]
+
+    def test_prepare_glue_job_input_with_batch_planner(
+        self,
+        bsm,
+        s3dir_dms_output_database,
+    ):
+        s3dir_table = s3dir_dms_output_database.joinpath("public", "transactions")
+        key = datetime_to_s3_key(epoch + timedelta(seconds=30))
+        s3dir_table.joinpath(f"{key}.parquet").write_bytes(b"x" * 1000, bsm=bsm)
+
+        cdc_tracker = make_cdc_tracker(
+            s3dir_dms_output_database,
+            batch_planner=BatchPlanner(max_files_per_table=10, max_bytes_per_run=500),
+        )
+        glue_job_input = cdc_tracker.prepare_glue_job_input(bsm=bsm)
+        # the first file of transactions table doesn't fit the per run budget
+        assert [todo.table for todo in glue_job_input.todo_list] == [
+            "accounts",
+            "not_exists",
+        ]
+        assert len(glue_job_input.todo_list[0].s3uri_list) == 3
+        table_tracker = cdc_tracker.table_tracker_list[1]
+        assert (
+            table_tracker.next_processed_time_str
+            == table_tracker.last_processed_time_str
+        )
+
+        cdc_tracker = make_cdc_tracker(
+            s3dir_dms_output_database,
+            s3path_listing_index=S3Path("s3://my-bucket/listing_index.json"),
+            batch_planner=BatchPlanner(max_files_per_table=10, max_bytes_per_table=1),
+        )
+        for _ in range(2):
+            glue_job_input = cdc_tracker.prepare_glue_job_input(bsm=bsm)
+            # the empty files of accounts table fit the per table budget
+            assert len(glue_job_input.todo_list[0].s3uri_list) == 3
+            assert len(glue_job_input.todo_list[1].s3uri_list) == 1
+            assert glue_job_input.todo_list[1].s3uri_list[0].endswith(
+                "20230101-000030000.parquet"
+            )
+
+    def test_prepare_glue_job_input_with_listing_index(
+        self,
+        bsm,
+        s3dir_dms_output_database,
+    ):
+        s3path_listing_index = S3Path("s3://my-bucket/listing_index.json")
+        expected = make_cdc_tracker(s3dir_dms_output_database)
+        cdc_tracker = make_cdc_tracker(
+            s3dir_dms_output_database,
+            s3path_listing_index=s3path_listing_index,
+        )
+        for max_workers in [1, 4]:
+            assert cdc_tracker.prepare_glue_job_input(
+                bsm=bsm, max_workers=max_workers
+            ) == expected.prepare_glue_job_input(bsm=bsm)
+
+        listing_index = ListingIndex.read(bsm=bsm, s3path=s3path_listing_index)
+        table_listing_index = listing_index.get("transactions")
+        assert len(table_listing_index.pending_file_list) == 5
+        assert table_listing_index.last_listed_hour == "2023/01/01/00"
+        assert table_listing_index.last_listed_key.endswith(
+            "2023/01/01/00/20230101-000500000.parquet"
+        )
+
+        # the second run only lists the new files
+        list_kwargs = list()
+        bsm.s3_client.meta.events.register(
+            "provide-client-params.s3.ListObjectsV2",
+            lambda params, **kwargs: list_kwargs.append(dict(params)),
+        )
+        s3dir_table = s3dir_dms_output_database.joinpath("public", "transactions")
+        key = datetime_to_s3_key(epoch + timedelta(hours=1))
+        s3dir_table.joinpath(f"{key}.parquet").write_bytes(b"", bsm=bsm)
+
+        table_tracker = cdc_tracker.table_tracker_list[1]
+        table_tracker.last_processed_time_str = (
+            epoch + timedelta(minutes=2)
+        ).isoformat()
+        glue_job_input = cdc_tracker.prepare_glue_job_input(bsm=bsm)
+        assert [
+            S3Path(s3uri).fname for s3uri in glue_job_input.todo_list[1].s3uri_list
+        ] == ["20230101-000300000", "20230101-000400000"]
+        assert list_kwargs[1]["StartAfter"] == table_listing_index.last_listed_key
+
+        listing_index = ListingIndex.read(bsm=bsm, s3path=s3path_listing_index)
+        table_listing_index = listing_index.get("transactions")
+        assert len(table_listing_index.pending_file_list) == 4
+        assert table_listing_index.last_listed_hour == "2023/01/01/01"
+
+
+def test_new_table_group_tracker_list():
+    table_list = ["t1", "t2", "t3"]
+    assert new_table_group_tracker_list(table_list) == [
+        TableGroupTracker(table_list=["t1", "t2", "t3"])
+    ]
+    assert new_table_group_tracker_list(table_list, [["t3"], [], ["t1"]]) == [
+        TableGroupTracker(table_list=["t3"]),
+        TableGroupTracker(table_list=["t1"]),
+        TableGroupTracker(table_list=["t2"]),
+    ]
+    with pytest.raises(ValueError):
+        new_table_group_tracker_list(table_list, [["t1", "t2"], ["t2"]])
+
+
+class FakeClock:
+    def __init__(self, now: datetime):
+        self.now = now
+
+
+class FakeGlueClient:
+    """
+    Simulate the glue job runs, the run duration is the max duration of the
+    tables in the glue job input.
+    """
+
+    def __init__(
+        self,
+        clock: FakeClock,
+        s3_client,
+        table_duration_mapping: T.Dict[str, timedelta],
+        max_concurrent_runs: int,
+    ):
+        self.clock = clock
+        self.s3_client = s3_client
+        self.table_duration_mapping = table_duration_mapping
+        self.max_concurrent_runs = max_concurrent_runs
+        self.run_end_time_mapping: T.Dict[str, datetime] = dict()
+        self.compaction_run_mapping: T.Dict[str, T.Tuple[str, datetime]] = dict()
+
+    def start_job_run(self, JobName: str, Arguments: dict):
+        # the compaction glue job takes 1 minute
+        if "--TABLE_NAMES" in Arguments:
+            run_id = f"jr_compaction_{len(self.compaction_run_mapping) + 1}"
+            self.compaction_run_mapping[run_id] = (
+                Arguments["--TABLE_NAMES"],
+                self.clock.now + timedelta(minutes=1),
+            )
+            return {"JobRunId": run_id}
+        n_running = len(
+            [
+                end_time
+                for end_time in self.run_end_time_mapping.values()
+                if end_time > self.clock.now
+            ]
+        )
+        if n_running >= self.max_concurrent_runs:
+            raise Exception("ConcurrentRunsExceededException: Concurrent runs exceeded")
+        s3path = S3Path(Arguments["--S3URI_INCREMENTAL_GLUE_JOB_INPUT"])
+        glue_job_input = GlueJobInput.read(self.s3_client, s3path.bucket, s3path.key)
+        duration = max(
+            [
+                self.table_duration_mapping.get(todo.table, timedelta(minutes=1))
+                for todo in glue_job_input.todo_list
+            ],
+            default=timedelta(minutes=1),
+        )
+        run_id = f"jr_{len(self.run_end_time_mapping) + 1}"
+        self.run_end_time_mapping[run_id] = self.clock.now + duration
+        return {"JobRunId": run_id}
+
+    def get_job_run(self, JobName: str, RunId: str):
+        if RunId in self.compaction_run_mapping:
+            end_time = self.compaction_run_mapping[RunId][1]
+        else:
+            end_time = self.run_end_time_mapping[RunId]
+        if self.clock.now < end_time:
+            state = "RUNNING"
+        else:
+            state = "SUCCEEDED"
+        return {"JobRun": {"JobRunState": state}}
+
+
+class FakeGlueBotoSesManager(BotoSesManager):
+    fake_glue_client: FakeGlueClient
+
+    @property
+    def glue_client(self):
+        return self.fake_glue_client
+
+
+def simulate_lag(
+    table_group_list: T.Optional[T.List[T.List[str]]],
+    max_concurrent_runs: int,
+) -> T.Dict[str, float]:
+    """
+    DMS writes one cdc data file per table every minute, the orchestrator runs
+    every minute. The accounts table takes 10 minutes to process, the
+    transactions table takes 1 minute.
+    """
+    clock = FakeClock(now=epoch)
+    with moto.mock_aws():
+        bsm = FakeGlueBotoSesManager(region_name="us-east-1")
+        bsm.s3_client.create_bucket(Bucket="my-bucket")
+        bsm.fake_glue_client = FakeGlueClient(
+            clock=clock,
+            s3_client=bsm.s3_client,
+            table_duration_mapping={
+                "accounts": timedelta(minutes=10),
+                "transactions": timedelta(minutes=1),
+            },
+            max_concurrent_runs=max_concurrent_runs,
+        )
+        s3dir_dms_output_database = S3Path("s3://my-bucket/dms/").to_dir()
+        for _ in range(60):
+            clock.now = clock.now + timedelta(minutes=1)
+            for table in ["accounts", "transactions"]:
+                s3dir_table = s3dir_dms_output_database.joinpath("public", table)
+                key = datetime_to_s3_key(clock.now)
+                s3dir_table.joinpath(f"{key}.parquet").write_bytes(b"", bsm=bsm)
+            cdc_tracker = CDCTracker.read(
+                bsm=bsm,
+                s3path_tracker=S3Path("s3://my-bucket/tracker.json"),
+                s3dir_glue_job_input=S3Path("s3://my-bucket/glue_job_input/"),
+                s3dir_dms_output_database=s3dir_dms_output_database,
+                glue_job_name="my-glue-job",
+                epoch_processed_datetime=epoch,
+                batch_planner=BatchPlanner(max_files_per_table=100),
+                table_group_list=table_group_list,
+                max_concurrent_runs=max_concurrent_runs,
+            )
+            cdc_tracker.try_to_run_glue_job(bsm=bsm)
+        return cdc_tracker.get_lag_report(now=clock.now)
+
+
+def test_table_group_lag():
+    lag_report = simulate_lag(table_group_list=None, max_concurrent_runs=1)
+    # the slow table blocks the fast table
+    assert lag_report["transactions"] >= 600
+
+    lag_report = simulate_lag(
+        table_group_list=[["accounts"], ["transactions"]],
+        max_concurrent_runs=2,
+    )
+    assert lag_report["accounts"] >= 600
+    assert lag_report["transactions"] <= 180
+
+    # one glue job run at a time, the groups take turns
+    lag_report = simulate_lag(
+        table_group_list=[["accounts"], ["transactions"]],
+        max_concurrent_runs=1,
+    )
+    assert lag_report["transactions"] <= 900
+
+
+def test_read_legacy_tracker(bsm):
+    s3path_tracker = S3Path("s3://my-bucket/tracker.json")
+    s3path_tracker.write_text(
+        json.dumps(
+            {
+                "table_tracker_list": [
+                    {
+                        "table": table,
+                        "epoch_processed_time_str": epoch.isoformat(),
+                        "last_processed_time_str": epoch.isoformat(),
+                        "next_processed_time_str": epoch.isoformat(),
+                    }
+                    for table in ["accounts", "transactions"]
+                ],
+                "last_glue_job_run_id": "jr_1",
+                "last_glue_job_run_sequence_id": 1,
+                "ready_to_run_next_glue_job": False,
+            }
+        ),
+        bsm=bsm,
+    )
+    kwargs = dict(
+        bsm=bsm,
+        s3path_tracker=s3path_tracker,
+        s3dir_glue_job_input=S3Path("s3://my-bucket/glue_job_input/"),
+        s3dir_dms_output_database=S3Path("s3://my-bucket/dms/"),
+        glue_job_name="my-glue-job",
+        epoch_processed_datetime=epoch,
+    )
+    cdc_tracker = CDCTracker.read(
+        table_group_list=[["accounts"], ["transactions"]],
+        **kwargs,
+    )
+    # the table groups are not changed while the glue job is running
+    assert cdc_tracker.table_group_tracker_list == [
+        TableGroupTracker(
+            table_list=["accounts", "transactions"],
+            last_glue_job_run_id="jr_1",
+            last_glue_job_run_sequence_id=1,
+            ready_to_run_next_glue_job=False,
+        )
+    ]
+    cdc_tracker.table_group_tracker_list[0].ready_to_run_next_glue_job = True
+    cdc_tracker.write(bsm=bsm)
+    cdc_tracker = CDCTracker.read(
+        table_group_list=[["accounts"], ["transactions"]],
+        **kwargs,
+    )
+    assert len(cdc_tracker.table_group_tracker_list) == 2
+
+
+def make_s3_event(bucket: str, key_size_list: T.List[T.Tuple[str, int]]) -> dict:
+    return {
+        "Records": [
+            {
+                "eventSource": "aws:s3",
+                "eventName": "ObjectCreated:Put",
+                "s3": {
+                    "bucket": {"name": bucket},
+                    "object": {"key": key, "size": size},
+                },
+            }
+            for key, size in key_size_list
+        ]
+    }
+
+
+def test_parse_s3_event():
+    event = make_s3_event("my-bucket", [("dms/my+table/a%3Db.parquet", 10)])
+    event["Records"].append({"eventSource": "aws:sqs"})
+    event["Records"].append(
+        {"eventSource": "aws:s3", "eventName": "ObjectRemoved:Delete"}
+    )
+    assert parse_s3_event(event) == [("my-bucket", "dms/my table/a=b.parquet", 10)]
+    assert parse_s3_event({}) == []
+
+
+def test_trigger_policy():
+    trigger_policy = TriggerPolicy(min_bytes=1000, max_age=300)
+    key = f"dms/public/t1/{datetime_to_s3_key(epoch)}.parquet"
+    now = epoch + timedelta(seconds=60)
+    assert trigger_policy.is_triggered([], now=now) is False
+    assert trigger_policy.is_triggered([dict(key=key, size=10)], now=now) is False
+    assert trigger_policy.is_triggered([dict(key=key, size=1000)], now=now) is True
+    now = epoch + timedelta(seconds=300)
+    assert trigger_policy.is_triggered([dict(key=key, size=10)], now=now) is True
+
+
+def test_handle_s3_event():
+    clock = FakeClock(now=epoch)
+    with moto.mock_aws():
+        bsm = FakeGlueBotoSesManager(region_name="us-east-1")
+        bsm.s3_client.create_bucket(Bucket="my-bucket")
+        bsm.fake_glue_client = FakeGlueClient(
+            clock=clock,
+            s3_client=bsm.s3_client,
+            table_duration_mapping={"accounts": timedelta(minutes=1)},
+            max_concurrent_runs=1,
+        )
+        s3dir_dms_output_database = S3Path("s3://my-bucket/dms/").to_dir()
+        cdc_tracker = make_cdc_tracker(
+            s3dir_dms_output_database,
+            s3path_listing_index=S3Path("s3://my-bucket/listing_index.json"),
+        )
+        cdc_tracker.write(bsm=bsm)
+        trigger_policy = TriggerPolicy(min_bytes=1000, max_age=300)
+
+        # DMS writes a small file, not triggered yet
+        clock.now = epoch + timedelta(minutes=1)
+        s3path = s3dir_dms_output_database.joinpath(
+            "public", "accounts", f"{datetime_to_s3_key(clock.now)}.parquet"
+        )
+        s3path.write_bytes(b"x" * 10, bsm=bsm)
+        event = make_s3_event(
+            "my-bucket",
+            [
+                (s3path.key, 10),
+                ("dms/public/accounts/LOAD00000001.parquet", 10),
+                ("dms/public/unknown/20230101-000100000.parquet", 10),
+                ("dms/public/accounts/not-a-cdc-file.json", 10),
+            ],
+        )
+        assert (
+            cdc_tracker.handle_s3_event(
+                bsm=bsm, event=event, trigger_policy=trigger_policy, now=clock.now
+            )
+            is False
+        )
+        listing_index = ListingIndex.read(bsm, cdc_tracker.s3path_listing_index)
+        assert listing_index.get("accounts").pending_file_list == [
+            dict(key=s3path.key, size=10)
+        ]
+        # the file is not listed yet
+        assert listing_index.get("accounts").last_listed_key is None
+
+        # a duplicated event doesn't change anything
+        assert (
+            cdc_tracker.handle_s3_event(
+                bsm=bsm, event=event, trigger_policy=trigger_policy, now=clock.now
+            )
+            is False
+        )
+
+        # the scheduled event finds the pending file is too old
+        clock.now = epoch + timedelta(minutes=6)
+        assert (
+            cdc_tracker.handle_s3_event(
+                bsm=bsm, event={}, trigger_policy=trigger_policy, now=clock.now
+            )
+            is True
+        )
+        glue_job_input = GlueJobInput.read(
+            bsm.s3_client,
+            "my-bucket",
+            cdc_tracker.last_glue_job_input_s3path.key,
+        )
+        assert glue_job_input.todo_list[0].s3uri_list == [s3path.uri]
+        listing_index = ListingIndex.read(bsm, cdc_tracker.s3path_listing_index)
+        assert listing_index.get("accounts").pending_file_list == [
+            dict(key=s3path.key, size=10)
+        ]
+        assert listing_index.get("accounts").last_listed_key == s3path.key
+
+        # the glue job run finished, the processed file is not pending anymore
+        clock.now = epoch + timedelta(minutes=8)
+        assert (
+            cdc_tracker.handle_s3_event(
+                bsm=bsm, event={}, trigger_policy=trigger_policy, now=clock.now
+            )
+            is False
+        )
+        assert cdc_tracker.table_group_tracker_list[0].ready_to_run_next_glue_job
+
+
+def test_parse_hudi_timeline():
+    assert hudi_instant_to_datetime("20230101000102003") == epoch + timedelta(
+        seconds=62, milliseconds=3
+    )
+    assert hudi_instant_to_datetime("20230101000102") == epoch + timedelta(seconds=62)
+
+    assert parse_hudi_timeline([]) == ([], False)
+    filename_list = [
+        "hoodie.properties",
+        "20230101000000000.deltacommit.requested",
+        "20230101000000000.deltacommit.inflight",
+        "20230101000000000.deltacommit",
+        "20230101000100000.compaction.requested",
+        "20230101000100000.compaction.inflight",
+        "20230101000200000.deltacommit",
+        "20230101000300000.deltacommit.inflight",
+    ]
+    assert parse_hudi_timeline(filename_list) == (["20230101000200000"], True)
+    filename_list.append("20230101000100000.commit")
+    assert parse_hudi_timeline(filename_list) == (["20230101000200000"], False)
+
+
+def test_compaction_policy():
+    compaction_policy = CompactionPolicy(max_delta_commits=3, max_age=3600)
+    now = epoch + timedelta(minutes=10)
+    assert compaction_policy.is_triggered([], now=now) is False
+    delta_commit_list = ["20230101000000000", "20230101000100000"]
+    assert compaction_policy.is_triggered(delta_commit_list, now=now) is False
+    delta_commit_list.append("20230101000200000")
+    assert compaction_policy.is_triggered(delta_commit_list, now=now) is True
+    now = epoch + timedelta(hours=1)
+    assert compaction_policy.is_triggered(delta_commit_list[:1], now=now) is True
+
+
+def test_compaction():
+    clock = FakeClock(now=epoch)
+    with moto.mock_aws():
+        bsm = FakeGlueBotoSesManager(region_name="us-east-1")
+        bsm.s3_client.create_bucket(Bucket="my-bucket")
+        bsm.fake_glue_client = FakeGlueClient(
+            clock=clock,
+            s3_client=bsm.s3_client,
+            table_duration_mapping={},
+            max_concurrent_runs=1,
+        )
+        cdc_tracker = make_cdc_tracker(S3Path("s3://my-bucket/dms/").to_dir())
+        cdc_tracker.s3dir_database = S3Path("s3://my-bucket/hudi/").to_dir()
+        cdc_tracker.compaction_glue_job_name = "my-compaction-glue-job"
+        cdc_tracker.compaction_policy = CompactionPolicy(max_delta_commits=3)
+        cdc_tracker.mor_table_list = ["accounts"]
+        table_group_tracker = cdc_tracker.table_group_tracker_list[0]
+        s3dir_timeline = cdc_tracker.s3dir_database.joinpath("accounts", ".hoodie")
+
+        def write_instant(filename: str):
+            s3dir_timeline.joinpath(filename).write_text("", bsm=bsm)
+
+        # not triggered yet, run the incremental glue job
+        write_instant("hoodie.properties")
+        write_instant("20230101000000000.deltacommit")
+        assert cdc_tracker.try_to_run_glue_job(bsm=bsm, now=clock.now) is True
+        assert table_group_tracker.last_compaction_job_run_id is None
+
+        # too many delta commits, the table group is paused for the compaction
+        clock.now = epoch + timedelta(minutes=2)
+        write_instant("20230101000100000.deltacommit")
+        write_instant("20230101000200000.deltacommit")
+        assert cdc_tracker.try_to_run_glue_job(bsm=bsm, now=clock.now) is False
+        run_id = table_group_tracker.last_compaction_job_run_id
+        assert bsm.fake_glue_client.compaction_run_mapping[run_id][0] == "accounts"
+        tracker_data = json.loads(cdc_tracker.s3path_tracker.read_text(bsm=bsm))
+        assert (
+            tracker_data["table_group_tracker_list"][0]["last_compaction_job_run_id"]
+            == run_id
+        )
+
+        clock.now = epoch + timedelta(minutes=2, seconds=30)
+        assert cdc_tracker.try_to_run_glue_job(bsm=bsm, now=clock.now) is False
+        assert table_group_tracker.last_compaction_job_run_id == run_id
+
+        # the compaction is finished, resume the incremental glue job
+        write_instant("20230101000300000.compaction.requested")
+        write_instant("20230101000300000.commit")
+        clock.now = epoch + timedelta(minutes=4)
+        assert cdc_tracker.try_to_run_glue_job(bsm=bsm, now=clock.now) is True
+        assert table_group_tracker.last_compaction_job_run_id is None
+
+    with pytest.raises(ValueError):
+        CDCTracker(
+            s3path_tracker=S3Path("s3://my-bucket/tracker.json"),
+            s3dir_glue_job_input=S3Path("s3://my-bucket/glue_job_input/").to_dir(),
+            s3dir_dms_output_database=S3Path("s3://my-bucket/dms/").to_dir(),
+            glue_job_name="my-glue-job",
+            compaction_policy=CompactionPolicy(),
+            mor_table_list=["accounts"],
+        )
+
+
+def test_repartition():
+    clock = FakeClock(now=epoch)
+    with moto.mock_aws():
+        bsm = FakeGlueBotoSesManager(region_name="us-east-1")
+        bsm.s3_client.create_bucket(Bucket="my-bucket")
+        bsm.fake_glue_client = FakeGlueClient(
+            clock=clock,
+            s3_client=bsm.s3_client,
+            table_duration_mapping={},
+            max_concurrent_runs=1,
+        )
+        cdc_tracker = make_cdc_tracker(S3Path("s3://my-bucket/dms/").to_dir())
+        cdc_tracker.s3dir_database = S3Path("s3://my-bucket/hudi/").to_dir()
+        cdc_tracker.partition_scheme_mapper = {"accounts": "month"}
+        table_group_tracker = cdc_tracker.table_group_tracker_list[0]
+        s3path_properties = cdc_tracker.s3dir_database.joinpath(
+            "accounts", ".hoodie", "hoodie.properties"
+        )
+
+        def write_partition_fields(fields: str):
+            s3path_properties.write_text(
+                f"hoodie.table.partition.fields={fields}\n", bsm=bsm
+            )
+
+        # the table is not created yet
+        assert cdc_tracker.get_table_to_repartition_list(bsm, table_group_tracker) == []
+
+        # the scheme is changed, wait for the repartition glue job
+        write_partition_fields(
+            "create_year,create_month,create_day,create_hour,create_minute"
+        )
+        assert cdc_tracker.get_table_to_repartition_list(
+            bsm, table_group_tracker
+        ) == ["accounts"]
+        assert cdc_tracker.try_to_run_glue_job(bsm=bsm, now=clock.now) is False
+        assert table_group_tracker.last_glue_job_run_id is None
+
+        # the table is rewritten, resume the incremental glue job
+        write_partition_fields("create_year,create_month")
+        assert cdc_tracker.try_to_run_glue_job(bsm=bsm, now=clock.now) is True
+        assert cdc_tracker.partition_columns_mapper == {
+            "accounts": ["create_year", "create_month"]
+        }
+        tracker_data = json.loads(cdc_tracker.s3path_tracker.read_text(bsm=bsm))
+        assert tracker_data["partition_columns_mapper"] == {
+            "accounts": ["create_year", "create_month"]
+        }
+
+        # the matched table is not checked again
+        s3path_properties.delete(bsm=bsm)
+        write_partition_fields("create_year")
+        assert cdc_tracker.get_table_to_repartition_list(bsm, table_group_tracker) == []
+
+        # until its scheme is changed
+        cdc_tracker.partition_scheme_mapper = {"accounts": "year"}
+        assert cdc_tracker.get_table_to_repartition_list(bsm, table_group_tracker) == []
+        cdc_tracker.partition_scheme_mapper = {"accounts": "day"}
+        assert cdc_tracker.get_table_to_repartition_list(
+            bsm, table_group_tracker
+        ) == ["accounts"]
+
+    with pytest.raises(ValueError):
+        CDCTracker(
+            s3path_tracker=S3Path("s3://my-bucket/tracker.json"),
+            s3dir_glue_job_input=S3Path("s3://my-bucket/glue_job_input/").to_dir(),
+            s3dir_dms_output_database=S3Path("s3://my-bucket/dms/").to_dir(),
+            glue_job_name="my-glue-job",
+            partition_scheme_mapper={"accounts": "month"},
+        )
+
+
 if __name__ == "__main__":
     from rds_to_datalake.tests.helper import run_cov_test
 
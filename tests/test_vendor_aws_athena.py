@@ -0,0 +1,507 @@
+# -*- coding: utf-8 -*-
+
+import io
+import re
+import uuid
+import time
+import typing as T
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import moto
+import polars as pl
+from boto_session_manager import BotoSesManager
+
+from rds_to_datalake.vendor.aws_athena import (
+    split_s3_uri,
+    get_unload_sql,
+    normalize_sql,
+    scan_parquet_parts,
+    AthenaResultCache,
+    AthenaQueryStats,
+    get_query_execution_delay,
+    wait_query_execution,
+    wait_query_executions,
+    run_athena_query,
+)
+
+bucket = "my-bucket"
+s3uri_result = f"s3://{bucket}/athena/results/"
+
+df_account = pl.DataFrame(
+    {
+        "id": list(range(1, 11)),
+        "name": [f"a-{i}" for i in range(1, 11)],
+        "_hoodie_commit_time": ["20230101000000"] * 10,
+    }
+)
+
+
+class FakeAthenaClient:
+    """
+    Simulate the Athena client, it writes the ``df`` as the query result,
+    split into ``n_parts`` parquet files for the ``UNLOAD`` query.
+    """
+
+    def __init__(self, s3_client, df: pl.DataFrame, n_parts: int = 3):
+        self.s3_client = s3_client
+        self.df = df
+        self.n_parts = n_parts
+        self.start_query_execution_kwargs = list()
+        self.n_get_query_execution = dict()
+
+    def start_query_execution(self, **kwargs):
+        self.start_query_execution_kwargs.append(kwargs)
+        exec_id = uuid.uuid4().hex
+        sql = kwargs["QueryString"]
+        output_location = kwargs["ResultConfiguration"]["OutputLocation"]
+        match = re.search(r"TO '(s3://[^']+)'", sql)
+        _, prefix_result = split_s3_uri(output_location)
+        self.s3_client.put_object(
+            Bucket=bucket, Key=f"{prefix_result}{exec_id}.metadata", Body=b""
+        )
+        if match:
+            _, prefix = split_s3_uri(match.group(1))
+            size = -(-self.df.height // max(self.n_parts, 1))
+            for ith in range(self.n_parts):
+                buffer = io.BytesIO()
+                self.df.slice(ith * size, size).write_parquet(buffer)
+                self.s3_client.put_object(
+                    Bucket=bucket,
+                    Key=f"{prefix}{uuid.uuid4().hex}",
+                    Body=buffer.getvalue(),
+                )
+        else:
+            _, prefix = split_s3_uri(output_location)
+            buffer = io.BytesIO()
+            self.df.write_csv(buffer)
+            self.s3_client.put_object(
+                Bucket=bucket,
+                Key=f"{prefix}{exec_id}.csv",
+                Body=buffer.getvalue(),
+            )
+        return {"QueryExecutionId": exec_id}
+
+    def get_query_execution(self, QueryExecutionId: str):
+        n = self.n_get_query_execution.get(QueryExecutionId, 0)
+        self.n_get_query_execution[QueryExecutionId] = n + 1
+        state = "RUNNING" if n == 0 else "SUCCEEDED"
+        return {
+            "QueryExecution": {
+                "Status": {"State": state},
+                "Statistics": {
+                    "DataScannedInBytes": 1000,
+                    "EngineExecutionTimeInMillis": 10,
+                },
+            }
+        }
+
+
+@pytest.fixture
+def bsm():
+    with moto.mock_aws():
+        bsm = BotoSesManager(region_name="us-east-1")
+        bsm.s3_client.create_bucket(Bucket=bucket)
+        yield bsm
+
+
+def list_result_keys(bsm) -> T.List[str]:
+    res = bsm.s3_client.list_objects_v2(Bucket=bucket)
+    return [dct["Key"] for dct in res.get("Contents", [])]
+
+
+def test_get_unload_sql():
+    sql = get_unload_sql("SELECT * FROM t", "s3://my-bucket/result/")
+    assert sql.startswith("UNLOAD (SELECT * FROM t)")
+    assert "TO 's3://my-bucket/result/'" in sql
+    assert "format = 'parquet'" in sql
+
+
+def test_run_athena_query(bsm, tmp_path):
+    athena_client = FakeAthenaClient(bsm.s3_client, df_account)
+    kwargs = dict(
+        athena_client=athena_client,
+        s3_client=bsm.s3_client,
+        s3uri_result=s3uri_result,
+        database="my_database",
+        sql="SELECT * FROM account;",
+        verbose=False,
+        delays=0.01,
+    )
+
+    # unload, the result files are deleted after read
+    df = run_athena_query(**kwargs)
+    assert df.sort("id").frame_equal(df_account)
+    assert list_result_keys(bsm) == []
+
+    # the UNLOAD output folder is deleted, there is nothing to reuse
+    run_athena_query(cache_expire=60, **kwargs)
+    assert "ResultReuseConfiguration" not in (
+        athena_client.start_query_execution_kwargs[-1]
+    )
+    assert df["_hoodie_commit_time"].dtype == pl.Utf8
+    assert athena_client.start_query_execution_kwargs[-1]["QueryString"].startswith(
+        "UNLOAD (SELECT * FROM account)"
+    )
+
+    # lazy
+    lazy_df = run_athena_query(lazy=True, dir_result=tmp_path, **kwargs)
+    assert isinstance(lazy_df, pl.LazyFrame)
+    df = lazy_df.select(["id", "name"]).sort("id").collect()
+    assert df.frame_equal(df_account.select(["id", "name"]))
+    assert len(list(tmp_path.glob("*/*.parquet"))) == 3
+    assert list_result_keys(bsm) == []
+
+    # files
+    path_list = run_athena_query(files=True, dir_result=tmp_path, **kwargs)
+    assert len(path_list) == 3
+    df = pl.concat([pl.read_parquet(str(path)) for path in path_list])
+    assert df.select(["id", "name"]).sort("id").frame_equal(
+        df_account.select(["id", "name"])
+    )
+
+    # csv, it loses the data type
+    df = run_athena_query(unload=False, **kwargs)
+    assert df.shape == df_account.shape
+    assert df["_hoodie_commit_time"].dtype == pl.Int64
+    assert (
+        athena_client.start_query_execution_kwargs[-1]["QueryString"]
+        == "SELECT * FROM account"
+    )
+    assert list_result_keys(bsm) == []
+
+    # the csv result is kept for the Athena result reuse
+    run_athena_query(unload=False, cache_expire=60, **kwargs)
+    assert "ResultReuseConfiguration" in (
+        athena_client.start_query_execution_kwargs[-1]
+    )
+    assert len(list_result_keys(bsm)) == 2
+    bsm.s3_client.delete_objects(
+        Bucket=bucket,
+        Delete=dict(Objects=[dict(Key=key) for key in list_result_keys(bsm)]),
+    )
+
+    # empty result
+    athena_client.df = df_account.clear()
+    athena_client.n_parts = 0
+    assert run_athena_query(**kwargs).shape == (0, 0)
+    assert run_athena_query(
+        lazy=True, dir_result=tmp_path, **kwargs
+    ).collect().shape == (0, 0)
+
+    with pytest.raises(ValueError):
+        run_athena_query(lazy=True, **kwargs)
+
+
+class FakeQueryExecutionClient:
+    """
+    Each query runs ``n_running`` polls, the engine execution time grows by
+    ``ms_per_poll`` per poll, the query of the ``failed`` id fails.
+    """
+
+    def __init__(self, n_running: int, ms_per_poll: int = 10000, failed=None):
+        self.n_running = n_running
+        self.ms_per_poll = ms_per_poll
+        self.failed = failed
+        self.n_poll = dict()
+
+    def get_query_execution(self, QueryExecutionId: str):
+        n = self.n_poll.get(QueryExecutionId, 0) + 1
+        self.n_poll[QueryExecutionId] = n
+        if n <= self.n_running:
+            state = "RUNNING"
+        elif QueryExecutionId == self.failed:
+            state = "FAILED"
+        else:
+            state = "SUCCEEDED"
+        return {
+            "QueryExecution": {
+                "QueryExecutionId": QueryExecutionId,
+                "Status": {"State": state},
+                "Statistics": {"EngineExecutionTimeInMillis": n * self.ms_per_poll},
+            }
+        }
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = list()
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def test_get_query_execution_delay():
+    assert get_query_execution_delay({"Status": {"State": "QUEUED"}}) is None
+    assert (
+        get_query_execution_delay({"Statistics": {"EngineExecutionTimeInMillis": 8000}})
+        == 2
+    )
+
+
+def test_wait_query_execution():
+    athena_client = FakeQueryExecutionClient(n_running=4)
+    clock = FakeClock()
+    response = wait_query_execution(
+        athena_client,
+        "q1",
+        delays=0.5,
+        timeout=60,
+        verbose=False,
+        backoff=2,
+        max_delay=10,
+        jitter=0,
+        clock=clock,
+        sleep=clock.sleep,
+    )
+    assert response["QueryExecution"]["Status"]["State"] == "SUCCEEDED"
+    # 10, 20 seconds engine time suggests 2.5, 5 seconds delay, then the
+    # backoff from 5 seconds is longer than the suggested 7.5 seconds
+    assert clock.sleeps == [0.5, 2.5, 5, 10, 10]
+
+    with pytest.raises(TimeoutError):
+        wait_query_execution(
+            FakeQueryExecutionClient(n_running=100),
+            "q1",
+            timeout=60,
+            verbose=False,
+            clock=clock,
+            sleep=clock.sleep,
+        )
+
+    with pytest.raises(RuntimeError):
+        wait_query_execution(
+            FakeQueryExecutionClient(n_running=1, failed="q1"),
+            "q1",
+            delays=0.01,
+            verbose=False,
+        )
+
+
+def test_wait_query_executions():
+    athena_client = FakeQueryExecutionClient(n_running=2, ms_per_poll=10)
+    response_list = wait_query_executions(
+        athena_client, ["q1", "q2", "q3"], delays=0.01, max_delay=0.05
+    )
+    assert [
+        response["QueryExecution"]["QueryExecutionId"] for response in response_list
+    ] == ["q1", "q2", "q3"]
+    assert athena_client.n_poll == {"q1": 3, "q2": 3, "q3": 3}
+
+    with pytest.raises(RuntimeError):
+        wait_query_executions(
+            FakeQueryExecutionClient(n_running=1, failed="q2"),
+            ["q1", "q2"],
+            delays=0.01,
+        )
+
+
+def test_normalize_sql():
+    assert normalize_sql("SELECT *\n  FROM  t;") == "select * from t"
+    assert (
+        normalize_sql("SELECT * FROM t WHERE name = 'Alice  Bob'")
+        == "select * from t where name = 'Alice  Bob'"
+    )
+    assert normalize_sql("select 'it''s'  AS x") == "select 'it''s' as x"
+
+
+class TestAthenaResultCache:
+    def test_run_athena_query(self, bsm, tmp_path):
+        athena_client = FakeAthenaClient(bsm.s3_client, df_account)
+        clock = FakeClock()
+        cache = AthenaResultCache(dir_cache=tmp_path, ttl=60, clock=clock)
+        stats = AthenaQueryStats()
+        kwargs = dict(
+            athena_client=athena_client,
+            s3_client=bsm.s3_client,
+            s3uri_result=s3uri_result,
+            database="my_database",
+            verbose=False,
+            delays=0.01,
+            cache=cache,
+            stats=stats,
+        )
+
+        def n_query() -> int:
+            return len(athena_client.start_query_execution_kwargs)
+
+        # miss
+        df = run_athena_query(sql="SELECT * FROM account", **kwargs)
+        assert df.sort("id").frame_equal(df_account)
+        assert cache.stats == {"hits": 0, "misses": 1}
+        assert n_query() == 1
+
+        # hit, the normalized sql is the same
+        df = run_athena_query(sql="select *\nfrom account;", **kwargs)
+        assert df.sort("id").frame_equal(df_account)
+        lazy_df = run_athena_query(sql="SELECT * FROM account", lazy=True, **kwargs)
+        assert lazy_df.select("id").collect().height == 10
+        path_list = run_athena_query(sql="SELECT * FROM account", files=True, **kwargs)
+        assert sum(pl.read_parquet(str(path)).height for path in path_list) == 10
+        assert cache.stats == {"hits": 3, "misses": 1}
+        assert n_query() == 1
+
+        # different database
+        run_athena_query(
+            sql="SELECT * FROM account", **{**kwargs, "database": "another_database"}
+        )
+        assert cache.stats == {"hits": 3, "misses": 2}
+        assert n_query() == 2
+
+        # expired
+        clock.now = 61
+        run_athena_query(sql="SELECT * FROM account", **kwargs)
+        assert cache.stats == {"hits": 3, "misses": 3}
+        assert n_query() == 3
+
+        # new hudi commit
+        run_athena_query(
+            sql="SELECT * FROM account", cache_version="20230101000000", **kwargs
+        )
+        run_athena_query(
+            sql="SELECT * FROM account", cache_version="20230101000000", **kwargs
+        )
+        assert cache.stats == {"hits": 4, "misses": 4}
+        assert n_query() == 4
+
+        # invalidate
+        cache.invalidate(database="my_database")
+        run_athena_query(
+            sql="SELECT * FROM account", cache_version="20230101000000", **kwargs
+        )
+        assert cache.stats == {"hits": 4, "misses": 5}
+        assert n_query() == 5
+
+        # csv result is cached as parquet
+        df = run_athena_query(sql="SELECT 1", unload=False, **kwargs)
+        df = run_athena_query(sql="SELECT 1", unload=False, **kwargs)
+        assert df.shape == df_account.shape
+        assert cache.stats == {"hits": 5, "misses": 6}
+        assert n_query() == 6
+        assert list_result_keys(bsm) == []
+        assert stats.to_dict() == {
+            "n_query": 6,
+            "n_cache_hit": 5,
+            "data_scanned_bytes": 6000,
+            "engine_execution_time_ms": 60,
+        }
+
+    def test_evict(self, bsm, tmp_path):
+        athena_client = FakeAthenaClient(bsm.s3_client, df_account, n_parts=1)
+        clock = FakeClock()
+        cache = AthenaResultCache(dir_cache=tmp_path, clock=clock)
+        kwargs = dict(
+            athena_client=athena_client,
+            s3_client=bsm.s3_client,
+            s3uri_result=s3uri_result,
+            database="my_database",
+            verbose=False,
+            delays=0.01,
+            cache=cache,
+        )
+        for ith in range(1, 4):
+            clock.now = ith
+            run_athena_query(sql=f"SELECT {ith}", **kwargs)
+        size = sum([path.stat().st_size for path in tmp_path.glob("*/*/*.parquet")])
+        assert len(list(tmp_path.iterdir())) == 3
+
+        # access the first query, so the second query is the least recently used
+        clock.now = 4
+        run_athena_query(sql="SELECT 1", **kwargs)
+        cache.max_size = size * 2 // 3
+        clock.now = 5
+        run_athena_query(sql="SELECT 4", **kwargs)
+        assert len(list(tmp_path.iterdir())) == 2
+        assert cache.get("AwsDataCatalog", "my_database", "SELECT 1") is not None
+        assert cache.get("AwsDataCatalog", "my_database", "SELECT 2") is None
+        assert cache.get("AwsDataCatalog", "my_database", "SELECT 3") is None
+        assert cache.get("AwsDataCatalog", "my_database", "SELECT 4") is not None
+
+
+    def test_concurrent_access(self, tmp_path):
+        cache = AthenaResultCache(dir_cache=tmp_path)
+        buffer = io.BytesIO()
+        df_account.write_parquet(buffer)
+        parquet_bytes = buffer.getvalue()
+
+        def put(ith: int):
+            sql = f"SELECT {ith}"
+            dir_entry = cache.new_entry("AwsDataCatalog", "my_database", sql)
+            path = dir_entry.joinpath("0.parquet")
+            path.write_bytes(parquet_bytes)
+            cache.put("AwsDataCatalog", "my_database", sql, [path])
+
+        def get(ith: int):
+            return cache.get("AwsDataCatalog", "my_database", f"SELECT {ith % 40}")
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(put, range(20)))
+            list(executor.map(get, range(200)))
+        assert cache.stats == {"hits": 100, "misses": 100}
+        assert len(list(tmp_path.iterdir())) == 20
+
+
+    def test_pin(self, tmp_path):
+        cache = AthenaResultCache(dir_cache=tmp_path, max_size=0)
+        buffer = io.BytesIO()
+        df_account.write_parquet(buffer)
+        parquet_bytes = buffer.getvalue()
+
+        def put(sql: str):
+            dir_entry = cache.new_entry("AwsDataCatalog", "my_database", sql)
+            path = dir_entry.joinpath("000001.parquet")
+            path.write_bytes(parquet_bytes)
+            cache.put("AwsDataCatalog", "my_database", sql, [path])
+
+        def get(sql: str) -> T.Optional[pl.LazyFrame]:
+            path_list = cache.get("AwsDataCatalog", "my_database", sql)
+            if path_list is None:
+                return None
+            return scan_parquet_parts(path_list)
+
+        put("SELECT 1")
+        with cache.pin("AwsDataCatalog", "my_database", "SELECT 1"):
+            lazy_df = get("SELECT 1")
+            # max_size 0 evicts the other results, a new result of the same
+            # query and the invalidation don't remove the files in use
+            put("SELECT 2")
+            put("SELECT 1")
+            cache.invalidate()
+            assert get("SELECT 1") is None
+            assert lazy_df.collect().frame_equal(df_account)
+        cache.evict()
+        assert list(tmp_path.iterdir()) == []
+
+        def read(ith: int):
+            sql = f"SELECT {ith % 5}"
+            with cache.pin("AwsDataCatalog", "my_database", sql):
+                lazy_df = get(sql)
+                if lazy_df is None:
+                    put(sql)
+                    lazy_df = get(sql)
+                # other threads evict and rewrite before the frame is read
+                time.sleep(0.001)
+                return lazy_df.collect().height
+
+        def write(ith: int):
+            put(f"SELECT {ith % 5}")
+            return df_account.height
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            result = list(
+                executor.map(
+                    lambda ith: read(ith) if ith % 2 else write(ith), range(200)
+                )
+            )
+        assert result == [df_account.height] * 200
+
+
+if __name__ == "__main__":
+    from rds_to_datalake.tests.helper import run_cov_test
+
+    run_cov_test(__file__, "rds_to_datalake.vendor.aws_athena")
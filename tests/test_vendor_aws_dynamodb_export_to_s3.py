@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+
+import json
+import gzip
+import base64
+import hashlib
+
+import pytest
+import moto
+from boto_session_manager import BotoSesManager
+
+from rds_to_datalake.vendor.dynamodb_json import ItemDecoder
+from rds_to_datalake.vendor.aws_dynamodb_export_to_s3 import (
+    DataFile,
+    DataFileVerificationError,
+    get_size,
+    plan_work_units,
+    Export,
+)
+
+bucket = "my-bucket"
+n_files = 5
+n_items_per_file = 25
+
+decoder = ItemDecoder(schema={"id": "N", "name": "S"})
+
+
+@pytest.fixture
+def bsm():
+    with moto.mock_aws():
+        bsm = BotoSesManager(region_name="us-east-1")
+        bsm.s3_client.create_bucket(Bucket=bucket)
+        yield bsm
+
+
+def create_export(bsm: BotoSesManager, corrupt: bool = False) -> Export:
+    export = Export(
+        arn="arn:aws:dynamodb:us-east-1:111122223333:table/my-table/export/1672531200000-a1b2c3d4",
+        status="COMPLETED",
+        s3_bucket=bucket,
+        s3_prefix="exports",
+    )
+    prefix = f"exports/AWSDynamoDB/{export.export_short_id}"
+    manifest_lines = list()
+    for ith in range(n_files):
+        lines = [
+            json.dumps({"Item": {"id": {"N": str(id)}, "name": {"S": f"n-{id}"}}})
+            for id in range(ith * n_items_per_file, (ith + 1) * n_items_per_file)
+        ]
+        body = gzip.compress("\n".join(lines).encode("utf-8"))
+        key = f"{prefix}/data/{ith}.json.gz"
+        bsm.s3_client.put_object(Bucket=bucket, Key=key, Body=body)
+        md5 = base64.b64encode(hashlib.md5(body).digest()).decode("utf-8")
+        item_count = n_items_per_file
+        if corrupt and ith == 2:
+            item_count += 1
+        manifest_lines.append(
+            json.dumps(
+                {
+                    "itemCount": item_count,
+                    "md5Checksum": md5,
+                    "etag": hashlib.md5(body).hexdigest(),
+                    "dataFileS3Key": key,
+                }
+            )
+        )
+    bsm.s3_client.put_object(
+        Bucket=bucket,
+        Key=f"{prefix}/manifest-files.json",
+        Body="\n".join(manifest_lines),
+    )
+    return export
+
+
+def make_data_file(key: str, item_count: int, size: int = 0) -> DataFile:
+    return DataFile(
+        item_count=item_count,
+        md5="",
+        etag="",
+        s3_bucket=bucket,
+        s3_key=key,
+        size=size,
+    )
+
+
+def test_plan_work_units():
+    assert plan_work_units([], max_weight_per_unit=10) == []
+
+    # skewed item count, the big file is alone
+    data_file_list = [make_data_file("k0", 100)] + [
+        make_data_file(f"k{i}", 10) for i in range(1, 11)
+    ]
+    work_unit_list = plan_work_units(data_file_list, max_weight_per_unit=100)
+    assert [work_unit.ith for work_unit in work_unit_list] == [1, 2]
+    assert work_unit_list[0].key_list == ["k0"]
+    assert work_unit_list[0].weight == 100
+    assert work_unit_list[1].item_count == 100
+    assert len(work_unit_list[1].key_list) == 10
+
+    # balanced
+    data_file_list = [
+        make_data_file(f"k{i}", item_count)
+        for i, item_count in enumerate([50, 40, 30, 30, 20, 20, 10])
+    ]
+    work_unit_list = plan_work_units(data_file_list, max_weight_per_unit=100)
+    assert [work_unit.weight for work_unit in work_unit_list] == [100, 100]
+
+    # max files per work unit
+    data_file_list = [make_data_file(f"k{i}", 0) for i in range(5)]
+    work_unit_list = plan_work_units(
+        data_file_list,
+        max_weight_per_unit=100,
+        max_files_per_unit=2,
+    )
+    assert [len(work_unit.key_list) for work_unit in work_unit_list] == [2, 2, 1]
+    assert sorted(
+        [key for work_unit in work_unit_list for key in work_unit.key_list]
+    ) == [f"k{i}" for i in range(5)]
+
+    # by bytes
+    data_file_list = [
+        make_data_file("k0", 1, size=300),
+        make_data_file("k1", 100, size=100),
+        make_data_file("k2", 100, size=100),
+        make_data_file("k3", 100, size=100),
+    ]
+    work_unit_list = plan_work_units(
+        data_file_list,
+        max_weight_per_unit=300,
+        weight_func=get_size,
+    )
+    assert [work_unit.key_list for work_unit in work_unit_list] == [
+        ["k0"],
+        ["k1", "k2", "k3"],
+    ]
+
+
+def test_from_manifest_files():
+    content = "\n".join(
+        [
+            json.dumps(
+                {
+                    "itemCount": 3,
+                    "md5Checksum": "a",
+                    "etag": "b",
+                    "dataFileS3Key": "data/1.json.gz",
+                }
+            ),
+        ]
+    )
+    (data_file,) = DataFile.from_manifest_files(bucket=bucket, content=content)
+    assert data_file.item_count == 3
+    assert data_file.s3_key == "data/1.json.gz"
+    assert data_file.size is None
+
+
+class TestExport:
+    def test_read_items(self, bsm):
+        export = create_export(bsm)
+        expected = list(range(n_files * n_items_per_file))
+
+        # serial, the order is preserved
+        items = list(
+            export.read_items(
+                dynamodb_client=None,
+                s3_client=bsm.s3_client,
+                decoder=decoder,
+                verify=True,
+            )
+        )
+        assert [item["id"] for item in items] == expected
+
+        # concurrent
+        items = list(
+            export.read_items(
+                dynamodb_client=None,
+                s3_client=bsm.s3_client,
+                decoder=decoder,
+                max_workers=3,
+                max_buffered_batches=1,
+                verify=True,
+            )
+        )
+        assert sorted([item["id"] for item in items]) == expected
+
+        # raw DynamoDB json
+        data_file = export.get_data_files(None, bsm.s3_client)[0]
+        assert data_file.read_items(bsm.s3_client)[0] == {
+            "id": {"N": "0"},
+            "name": {"S": "n-0"},
+        }
+
+    def test_iter_batches(self, bsm):
+        export = create_export(bsm)
+        batches = list(
+            export.iter_batches(
+                dynamodb_client=None,
+                s3_client=bsm.s3_client,
+                batch_size=10,
+                max_workers=2,
+            )
+        )
+        assert sorted([len(batch) for batch in batches]) == [5] * n_files + [10] * (
+            2 * n_files
+        )
+
+        # the consumer stops early
+        for batch in export.iter_batches(
+            dynamodb_client=None,
+            s3_client=bsm.s3_client,
+            batch_size=1,
+            max_workers=2,
+            max_buffered_batches=1,
+        ):
+            break
+
+        df_list = list(
+            export.read_dataframes(
+                dynamodb_client=None,
+                s3_client=bsm.s3_client,
+                decoder=decoder,
+                max_workers=2,
+            )
+        )
+        assert sum([df.height for df in df_list]) == n_files * n_items_per_file
+        assert df_list[0].columns == ["id", "name"]
+
+    def test_verify(self, bsm):
+        export = create_export(bsm, corrupt=True)
+        for max_workers in [1, 3]:
+            with pytest.raises(DataFileVerificationError):
+                list(
+                    export.read_items(
+                        dynamodb_client=None,
+                        s3_client=bsm.s3_client,
+                        max_workers=max_workers,
+                        verify=True,
+                    )
+                )
+        # no verification
+        items = list(export.read_items(None, bsm.s3_client, max_workers=3))
+        assert len(items) == n_files * n_items_per_file
+
+
+if __name__ == "__main__":
+    from rds_to_datalake.tests.helper import run_cov_test
+
+    run_cov_test(__file__, "rds_to_datalake.vendor.aws_dynamodb_export_to_s3")
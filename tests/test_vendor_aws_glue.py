@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from rds_to_datalake.vendor.aws_glue import (
+    get_job_run_delay,
+    wait_job_run,
+    wait_job_runs,
+)
+
+
+class FakeGlueClient:
+    """
+    Each job run is running for ``n_running`` polls, the execution time grows
+    by ``seconds_per_poll`` per poll, then it ends with the ``final_state``.
+    """
+
+    def __init__(self, n_running: int, seconds_per_poll: int, final_state: dict):
+        self.n_running = n_running
+        self.seconds_per_poll = seconds_per_poll
+        self.final_state = final_state
+        self.n_poll = dict()
+
+    def get_job_run(self, JobName: str, RunId: str):
+        n = self.n_poll.get(RunId, 0) + 1
+        self.n_poll[RunId] = n
+        if n <= self.n_running:
+            state = "RUNNING"
+        else:
+            state = self.final_state.get(RunId, "SUCCEEDED")
+        return {
+            "JobRun": {
+                "Id": RunId,
+                "JobName": JobName,
+                "JobRunState": state,
+                "ExecutionTime": n * self.seconds_per_poll,
+            }
+        }
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = list()
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def test_get_job_run_delay():
+    assert get_job_run_delay({"JobRunState": "STARTING", "ExecutionTime": 0}) is None
+    assert get_job_run_delay({"ExecutionTime": 300}) == 30
+
+
+def test_wait_job_run():
+    glue_client = FakeGlueClient(n_running=3, seconds_per_poll=200, final_state={})
+    clock = FakeClock()
+    job_run = wait_job_run(
+        glue_client,
+        "my-job",
+        "jr_1",
+        delays=5,
+        verbose=False,
+        backoff=1.5,
+        max_delay=60,
+        jitter=0,
+        clock=clock,
+        sleep=clock.sleep,
+    )
+    assert job_run["JobRunState"] == "SUCCEEDED"
+    # 200, 400, 600 seconds execution time suggests 20, 40, 60 seconds delay
+    assert clock.sleeps == [5, 20, 40, 60]
+
+    with pytest.raises(TimeoutError):
+        wait_job_run(
+            FakeGlueClient(n_running=1000, seconds_per_poll=1, final_state={}),
+            "my-job",
+            "jr_1",
+            timeout=600,
+            verbose=False,
+            clock=clock,
+            sleep=clock.sleep,
+        )
+
+
+def test_wait_job_runs():
+    glue_client = FakeGlueClient(
+        n_running=2,
+        seconds_per_poll=0,
+        final_state={"jr_2": "FAILED"},
+    )
+    job_run_list = wait_job_runs(
+        glue_client,
+        [("job-1", "jr_1"), ("job-2", "jr_2")],
+        delays=0.01,
+        max_delay=0.05,
+    )
+    assert [job_run["JobRunState"] for job_run in job_run_list] == [
+        "SUCCEEDED",
+        "FAILED",
+    ]
+    assert glue_client.n_poll == {"jr_1": 3, "jr_2": 3}
+
+
+if __name__ == "__main__":
+    from rds_to_datalake.tests.helper import run_cov_test
+
+    run_cov_test(__file__, "rds_to_datalake.vendor.aws_glue")
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+from decimal import Decimal
+
+import pytest
+from boto3.dynamodb.types import TypeSerializer, TypeDeserializer
+
+from rds_to_datalake.vendor.dynamodb_json import (
+    parse_number,
+    decode_value,
+    decode_item,
+    ItemDecoder,
+)
+
+serializer = TypeSerializer()
+deserializer = TypeDeserializer()
+
+item = {
+    "account": "a-1",
+    "amount": 123,
+    "rate": Decimal("1.5"),
+    "is_active": True,
+    "nothing": None,
+    "binary": b"hello",
+    "map": {"key": "value", "nested": {"n": 1}},
+    "list": [1, "a", [True]],
+    "string_set": {"a", "b"},
+    "number_set": {1, 2},
+    "binary_set": {b"x"},
+}
+dynamodb_item = {k: serializer.serialize(v) for k, v in item.items()}
+
+
+def normalize(value):
+    # TypeDeserializer returns set, Binary and Decimal
+    if isinstance(value, dict):
+        return {k: normalize(v) for k, v in value.items()}
+    elif isinstance(value, (set, list)):
+        return sorted([normalize(v) for v in value], key=repr)
+    elif hasattr(value, "value") and isinstance(value.value, bytes):
+        return value.value
+    elif isinstance(value, Decimal) and value == int(value):
+        return int(value)
+    return value
+
+
+def test_parse_number():
+    assert parse_number("123") == 123
+    assert isinstance(parse_number("123"), int)
+    assert parse_number("1.5") == Decimal("1.5")
+    assert parse_number("1e3") == Decimal("1e3")
+
+
+def test_decode_value():
+    assert decode_value(None) is None
+    assert decode_value({"NULL": True}) is None
+    assert decode_value({"B": "aGVsbG8="}) == b"hello"
+
+
+def test_decode_item():
+    expected = normalize(
+        {k: deserializer.deserialize(v) for k, v in dynamodb_item.items()}
+    )
+    assert normalize(decode_item(dynamodb_item)) == expected
+
+
+class TestItemDecoder:
+    def test_decode_item(self):
+        schema = {
+            "account": "S",
+            "amount": "N",
+            "rate": "N",
+            "is_active": "BOOL",
+            "nothing": "NULL",
+            "binary": "B",
+            "map": "M",
+            "list": "L",
+            "string_set": "SS",
+            "number_set": "NS",
+            "binary_set": "BS",
+        }
+        decoder = ItemDecoder(schema=schema)
+        assert normalize(decoder.decode_item(dynamodb_item)) == normalize(
+            decode_item(dynamodb_item)
+        )
+
+        # missing attribute, null value and unexpected data type
+        decoder = ItemDecoder(
+            schema={"account": "S", "amount": "S", "nothing": "S", "missing": "N"}
+        )
+        assert decoder.decode_item(dynamodb_item) == {
+            "account": "a-1",
+            "amount": 123,
+            "nothing": None,
+            "missing": None,
+        }
+
+    def test_decode_columns(self):
+        decoder = ItemDecoder(schema={"account": "S", "amount": "N"})
+        items = [
+            {"account": {"S": "a-1"}, "amount": {"N": "1"}},
+            {"account": {"S": "a-2"}, "amount": {"N": "2"}},
+        ]
+        assert decoder.decode_columns(items) == {
+            "account": ["a-1", "a-2"],
+            "amount": [1, 2],
+        }
+
+        df = decoder.to_dataframe(items)
+        assert df.columns == ["account", "amount"]
+        assert df.to_dicts() == decoder.decode_items(items)
+
+        df = decoder.to_dataframe([])
+        assert df.shape == (0, 2)
+
+    def test_invalid_schema(self):
+        with pytest.raises(ValueError):
+            ItemDecoder(schema={"account": "STRING"})
+
+
+if __name__ == "__main__":
+    from rds_to_datalake.tests.helper import run_cov_test
+
+    run_cov_test(__file__, "rds_to_datalake.vendor.dynamodb_json")
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+import sqlalchemy as sa
+
+from rds_to_datalake.vendor.merkle_diff import (
+    postgresql,
+    register_sqlite_functions,
+    get_summary_sql,
+    Side,
+    reconcile,
+)
+
+metadata = sa.MetaData()
+table = sa.Table(
+    "transactions",
+    metadata,
+    sa.Column("id", sa.String, primary_key=True),
+    sa.Column("note", sa.String),
+    sa.Column("amount", sa.Integer),
+)
+columns = ["id", "note", "amount"]
+
+
+def make_rows(n: int):
+    return [
+        {"id": f"t-{str(ith).zfill(6)}", "note": f"note {ith}", "amount": ith % 100}
+        for ith in range(n)
+    ]
+
+
+def create_side(rows) -> Side:
+    """
+    A SQLite database with the athena functions as the stand-in.
+    """
+    engine = sa.create_engine("sqlite:///:memory:")
+    sa.event.listen(
+        engine,
+        "connect",
+        lambda dbapi_conn, _: register_sqlite_functions(dbapi_conn),
+    )
+    metadata.create_all(engine)
+    conn = engine.connect()
+    conn.execute(table.insert(), rows)
+
+    def query(sql: str):
+        return [dict(row) for row in conn.execute(sa.text(sql)).mappings()]
+
+    return Side(query=query, dialect="athena", table="transactions")
+
+
+def test_get_summary_sql():
+    sql = get_summary_sql(postgresql, "t", "id", ["id", "name"], 2, ["a", "b"])
+    assert "md5(CAST(id AS VARCHAR))" in sql
+    assert "COALESCE(CAST(name AS VARCHAR), '\\N')" in sql
+    assert "('x' || substr(row_hash, 1, 8))::bit(32)::bigint" in sql
+    assert "IN ('a', 'b')" in sql
+
+
+def test_reconcile_same():
+    left = create_side(make_rows(5000))
+    right = create_side(make_rows(5000))
+    report = reconcile(left, right, columns=columns)
+    assert report.is_same is True
+    assert report.n_left == report.n_right == report.n_same == 5000
+    # one summary query per side
+    assert report.n_query == 2
+    assert report.n_fetched == 0
+
+
+def test_reconcile_diff():
+    rows = make_rows(5000)
+    right_rows = [dict(row) for row in rows if row["id"] != "t-000100"]
+    right_rows[200]["note"] = "changed"  # t-000201
+    right_rows[300]["amount"] = None  # t-000301
+    right_rows.append({"id": "t-999999", "note": "extra", "amount": 1})
+    left = create_side(rows)
+    right = create_side(right_rows)
+    report = reconcile(left, right, columns=columns, leaf_size=20)
+    assert report.n_left == 5000
+    assert report.n_right == 5000
+    assert report.missing_keys == ["t-000100"]
+    assert report.extra_keys == ["t-999999"]
+    assert report.n_changed == 2
+    assert report.column_diff_count == {"note": 1, "amount": 1}
+    assert report.n_same == 4997
+    # 5000 / 16 / 16 ~ 20 rows per range at the second level,
+    # two summary queries and one fetch query per side
+    assert report.n_level == 2
+    assert report.n_query == 6
+    assert report.n_fetched < 200
+
+
+if __name__ == "__main__":
+    from rds_to_datalake.tests.helper import run_cov_test
+
+    run_cov_test(__file__, "rds_to_datalake.vendor.merkle_diff")
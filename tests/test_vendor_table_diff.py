@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+
+import random
+
+import pytest
+import polars as pl
+import sqlalchemy as sa
+
+from rds_to_datalake.vendor.aws_athena import scan_parquet_parts
+from rds_to_datalake.vendor.table_diff import (
+    iter_sqlalchemy_chunks,
+    iter_sqlalchemy_frames,
+    iter_keyset_pages,
+    iter_sorted_parquet_files,
+    iter_rows,
+    collect_sorted_rows,
+    merge_join,
+    diff_row,
+    compare_sorted,
+    compare_hash_buckets,
+    get_bucket,
+)
+
+
+def make_rows(n: int):
+    return [
+        {"id": f"id-{str(ith).zfill(4)}", "name": f"n-{ith}", "amount": ith}
+        for ith in range(n)
+    ]
+
+
+def make_right_rows(n: int):
+    """
+    Remove id-0003 and id-0050, change id-0010 and id-0020, add id-9999.
+    """
+    rows = make_rows(n)
+    rows = [row for row in rows if row["id"] not in ["id-0003", "id-0050"]]
+    rows[9]["name"] = "changed"  # id-0010
+    rows[18]["amount"] = -1  # id-0020
+    rows[18]["name"] = "changed"
+    rows.append({"id": "id-9999", "name": "n-9999", "amount": 9999})
+    return rows
+
+
+def check_report(report):
+    assert report.n_left == 100
+    assert report.n_right == 99
+    assert report.n_missing == 2
+    assert report.missing_keys == ["id-0003", "id-0050"]
+    assert report.n_extra == 1
+    assert report.extra_keys == ["id-9999"]
+    assert report.n_changed == 2
+    assert report.n_same == 96
+    assert report.column_diff_count == {"name": 2, "amount": 1}
+    assert report.changed_rows[0] == {
+        "key": "id-0010",
+        "diff": {"name": ["n-10", "changed"]},
+    }
+    assert report.is_same is False
+
+
+def test_merge_join():
+    left = [{"id": 1}, {"id": 3}, {"id": 4}]
+    right = [{"id": 2}, {"id": 3}, {"id": 5}]
+    assert [
+        (key, l is not None, r is not None) for key, l, r in merge_join(left, right)
+    ] == [
+        (1, True, False),
+        (2, False, True),
+        (3, True, True),
+        (4, True, False),
+        (5, False, True),
+    ]
+    assert list(merge_join([], [])) == []
+
+    with pytest.raises(ValueError):
+        list(merge_join([{"id": 2}, {"id": 1}], []))
+
+
+def test_diff_row():
+    assert diff_row({"a": 1, "b": 2}, {"a": 1, "b": 3}) == {"b": (2, 3)}
+    assert diff_row({"a": 1}, {"a": 1, "c": 3}) == {"c": (None, 3)}
+    assert diff_row({"a": 1, "b": 2}, {"a": 2, "b": 3}, columns=["b"]) == {"b": (2, 3)}
+
+
+def test_compare_sorted():
+    report = compare_sorted(make_rows(100), make_right_rows(100))
+    check_report(report)
+    assert report.to_dict()["n_changed"] == 2
+
+    report = compare_sorted(make_rows(100), make_right_rows(100), max_samples=1)
+    assert report.n_missing == 2
+    assert report.missing_keys == ["id-0003"]
+    assert len(report.changed_rows) == 1
+
+    report = compare_sorted(make_rows(100), make_rows(100))
+    assert report.is_same is True
+
+
+def test_compare_hash_buckets(tmp_path):
+    right_rows = make_right_rows(100)
+    random.Random(1).shuffle(right_rows)
+    report = compare_hash_buckets(
+        make_rows(100), right_rows, n_buckets=7, dir_tmp=tmp_path
+    )
+    report.missing_keys.sort()
+    report.changed_rows.sort(key=lambda dct: dct["key"])
+    check_report(report)
+    assert list(tmp_path.iterdir()) == []
+
+    # the buckets are split again until they fit max_rows_per_bucket
+    report = compare_hash_buckets(
+        make_rows(100),
+        right_rows,
+        n_buckets=2,
+        max_rows_per_bucket=5,
+        dir_tmp=tmp_path,
+    )
+    report.missing_keys.sort()
+    report.changed_rows.sort(key=lambda dct: dct["key"])
+    check_report(report)
+    assert list(tmp_path.iterdir()) == []
+
+    assert get_bucket("id-0001", 7) == get_bucket("id-0001", 7)
+    assert len({get_bucket(f"id-{ith}", 7) for ith in range(100)}) == 7
+    assert [get_bucket(f"id-{ith}", 7, "1") for ith in range(10)] != [
+        get_bucket(f"id-{ith}", 7) for ith in range(10)
+    ]
+
+
+def test_iter_sqlalchemy_chunks_and_keyset_pages():
+    engine = sa.create_engine("sqlite:///:memory:")
+    metadata = sa.MetaData()
+    table = sa.Table(
+        "t",
+        metadata,
+        sa.Column("id", sa.String, primary_key=True),
+        sa.Column("name", sa.String),
+        sa.Column("amount", sa.Integer),
+    )
+    metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(table.insert(), make_rows(100))
+
+    chunks = list(
+        iter_sqlalchemy_chunks(engine, sa.select(table).order_by(table.c.id), 30)
+    )
+    assert [len(chunk) for chunk in chunks] == [30, 30, 30, 10]
+    assert list(iter_rows(chunks)) == make_rows(100)
+
+    def read_page(last_id, limit):
+        stmt = sa.select(table).order_by(table.c.id).limit(limit)
+        if last_id is not None:
+            stmt = stmt.where(table.c.id > last_id)
+        with engine.connect() as conn:
+            return [dict(row) for row in conn.execute(stmt).mappings()]
+
+    pages = list(iter_keyset_pages(read_page, key="id", page_size=25))
+    assert [len(page) for page in pages] == [25, 25, 25, 25]
+    report = compare_sorted(iter_rows(chunks), iter_rows(pages))
+    assert report.is_same is True
+
+
+def test_iter_sqlalchemy_frames():
+    engine = sa.create_engine("sqlite:///:memory:")
+    metadata = sa.MetaData()
+    table = sa.Table(
+        "t",
+        metadata,
+        sa.Column("id", sa.String, primary_key=True),
+        sa.Column("name", sa.String),
+        sa.Column("amount", sa.Integer),
+    )
+    metadata.create_all(engine)
+    rows = make_rows(100)
+    for row in rows[90:]:
+        row["name"] = None
+    with engine.begin() as conn:
+        conn.execute(table.insert(), rows)
+
+    frames = list(
+        iter_sqlalchemy_frames(engine, sa.select(table).order_by(table.c.id), 30)
+    )
+    assert [frame.shape for frame in frames] == [(30, 3), (30, 3), (30, 3), (10, 3)]
+    # the last chunk is all null, the dtype comes from the table definition
+    assert frames[-1].schema == {"id": pl.Utf8, "name": pl.Utf8, "amount": pl.Int64}
+    assert pl.concat(frames).to_dicts() == rows
+
+
+def test_collect_sorted_rows(tmp_path):
+    # an empty hudi table, the unload result has no file
+    assert collect_sorted_rows(scan_parquet_parts([]), key="id") == []
+    assert (
+        collect_sorted_rows(
+            scan_parquet_parts([]), key="id", columns_to_drop=["_hoodie_commit_time"]
+        )
+        == []
+    )
+
+    # the row count is an exact multiple of the page size, the page after the
+    # last full page is empty
+    rows = make_rows(100)
+    n_query = 0
+
+    def read_page(last_id, limit):
+        nonlocal n_query
+        n_query += 1
+        page = [row for row in rows if (last_id is None) or (row["id"] > last_id)]
+        page = page[:limit]
+        # like unload, the result is split into files, and no file if empty
+        path_list = list()
+        for ith in range(0, len(page), 10):
+            path = tmp_path.joinpath(f"{n_query}-{ith}.parquet")
+            part = [{**row, "_hoodie_commit_time": "1"} for row in page[ith : ith + 10]]
+            pl.DataFrame(part[::-1]).write_parquet(path)
+            path_list.append(path)
+        return collect_sorted_rows(
+            scan_parquet_parts(path_list),
+            key="id",
+            columns_to_drop=["_hoodie_commit_time"],
+        )
+
+    pages = list(iter_keyset_pages(read_page, key="id", page_size=25))
+    assert [len(page) for page in pages] == [25, 25, 25, 25]
+    assert n_query == 5
+    assert list(iter_rows(pages)) == rows
+
+
+
+def test_iter_sorted_parquet_files(tmp_path):
+    dir_parts = tmp_path.joinpath("parts")
+    dir_parts.mkdir()
+    dir_spill = tmp_path.joinpath("spill")
+    dir_spill.mkdir()
+    assert list(iter_sorted_parquet_files([], key="id", dir_tmp=dir_spill)) == []
+
+    # like unload, the rows are shuffled across the files, one file is empty
+    rows = make_rows(100)
+    shuffled_rows = rows[:]
+    random.Random(1).shuffle(shuffled_rows)
+    path_list = list()
+    for ith in range(0, 100, 30):
+        path = dir_parts.joinpath(f"{ith}.parquet")
+        part = [
+            {**row, "_hoodie_commit_time": "1"} for row in shuffled_rows[ith : ith + 30]
+        ]
+        pl.DataFrame(part).write_parquet(path)
+        path_list.append(path)
+    path = dir_parts.joinpath("empty.parquet")
+    pl.DataFrame(part).head(0).write_parquet(path)
+    path_list.append(path)
+
+    chunks = list(
+        iter_sorted_parquet_files(
+            path_list,
+            key="id",
+            chunk_size=25,
+            columns_to_drop=["_hoodie_commit_time"],
+            dir_tmp=dir_spill,
+        )
+    )
+    assert [len(chunk) for chunk in chunks] == [25, 25, 25, 25]
+    assert list(iter_rows(chunks)) == rows
+    assert list(dir_spill.iterdir()) == []
+
+
+if __name__ == "__main__":
+    from rds_to_datalake.tests.helper import run_cov_test
+
+    run_cov_test(__file__, "rds_to_datalake.vendor.table_diff")
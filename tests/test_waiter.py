@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+
+import random
+import asyncio
+
+import pytest
+
+from rds_to_datalake.waiter import Waiter, AsyncWaiter
+
+
+class FakeClock:
+    """
+    The clock only moves when sleep, it records all the sleep durations.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = list()
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+    async def async_sleep(self, seconds: float):
+        self.sleep(seconds)
+        await asyncio.sleep(0)
+
+
+def test_fixed_delay():
+    clock = FakeClock()
+    for attempt, elapsed in Waiter(
+        delays=1, timeout=10, verbose=False, clock=clock, sleep=clock.sleep
+    ):
+        assert elapsed == attempt
+        if attempt == 3:
+            break
+    assert clock.sleeps == [1, 1, 1]
+
+
+def test_backoff():
+    clock = FakeClock()
+    with pytest.raises(TimeoutError):
+        for _ in Waiter(
+            delays=1,
+            timeout=100,
+            verbose=False,
+            backoff=2,
+            max_delay=30,
+            clock=clock,
+            sleep=clock.sleep,
+        ):
+            pass
+    # the last sleep is bounded by the remaining time
+    assert clock.sleeps == [1, 2, 4, 8, 16, 30, 30, 9]
+    assert clock.now == 100
+
+
+def test_jitter():
+    clock = FakeClock()
+    waiter = Waiter(
+        delays=10,
+        timeout=1000,
+        verbose=False,
+        jitter=0.2,
+        clock=clock,
+        sleep=clock.sleep,
+        rnd=random.Random(1),
+    )
+    for attempt, _ in waiter:
+        if attempt == 20:
+            break
+    assert all([8 <= seconds <= 12 for seconds in clock.sleeps])
+    assert len(set(clock.sleeps)) == 20
+
+    with pytest.raises(ValueError):
+        Waiter(delays=1, timeout=10, jitter=1)
+    with pytest.raises(ValueError):
+        Waiter(delays=1, timeout=10, backoff=0.5)
+
+
+def test_suggest():
+    clock = FakeClock()
+    waiter = Waiter(
+        delays=1,
+        timeout=1000,
+        verbose=False,
+        backoff=2,
+        max_delay=60,
+        clock=clock,
+        sleep=clock.sleep,
+    )
+    for attempt, _ in waiter:
+        if attempt == 2:
+            assert waiter.delay == 4
+            waiter.suggest(10)
+        if attempt == 3:
+            waiter.suggest(1000)
+        if attempt == 5:
+            break
+    # the backoff continues from the suggested delay
+    assert clock.sleeps == [1, 2, 10, 60, 60]
+
+
+def test_async_waiter():
+    clock = FakeClock()
+
+    async def wait(n: int) -> int:
+        async for attempt, _ in AsyncWaiter(
+            delays=1,
+            timeout=100,
+            verbose=False,
+            backoff=2,
+            clock=clock,
+            sleep=clock.async_sleep,
+        ):
+            if attempt == n:
+                return attempt
+
+    async def main():
+        return await asyncio.gather(wait(2), wait(3))
+
+    assert asyncio.run(main()) == [2, 3]
+    assert sorted(clock.sleeps) == [1, 1, 2, 2, 4]
+
+    with pytest.raises(TypeError):
+        iter(AsyncWaiter(delays=1, timeout=10))
+
+
+def test_async_waiter_timeout():
+    clock = FakeClock()
+
+    async def main():
+        async for _ in AsyncWaiter(
+            delays=1,
+            timeout=5,
+            verbose=False,
+            clock=clock,
+            sleep=clock.async_sleep,
+        ):
+            pass
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(main())
+    assert clock.now == 5
+
+
+if __name__ == "__main__":
+    from rds_to_datalake.tests.helper import run_cov_test
+
+    run_cov_test(__file__, "rds_to_datalake.waiter")